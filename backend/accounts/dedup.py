@@ -0,0 +1,319 @@
+"""
+Content-hash deduplication of uploaded files.
+
+A file's content is identified by its SHA-256 (``FileUpload.content_hash``,
+hex) and its ``file_size``. Each user has one ``StoredBlob`` per content,
+and every ``FileUpload`` of that content points at the blob's
+``blob_url``/``blob_key``. ``StoredBlob.ref_count`` counts the live (not
+deleted) uploads using the blob.
+
+- ``share_blobs`` runs when metadata is registered. An entry whose content
+  is already stored is pointed at the existing blob. The blob the client
+  just uploaded is then redundant and is reported back so it can be removed.
+- ``release_blob`` runs when an upload is deleted. The blob may only be
+  removed from storage once its last reference is gone.
+- ``ContentHashBackfill`` hashes existing uploads through the image storage
+  (listings.storage) in a thread pool. It then merges uploads of the same
+  content onto one blob and reports the bytes reclaimed.
+
+Uploads without a hash (clients that do not send one) are stored as before
+and never shared.
+"""
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from listings.storage import ImageStorageError, get_image_storage
+
+CONTENT_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def clean_content_hash(value):
+    """A hex SHA-256 in lower case, or ``''`` when none was sent"""
+    value = (value or '').strip().lower()
+    if value and not CONTENT_HASH_RE.match(value):
+        raise ValidationError({'content_hash': 'Expected the hex SHA-256 of the file.'})
+    return value
+
+
+def content_key(upload):
+    return upload.content_hash, upload.file_size
+
+
+def lock_blobs(user, keys):
+    """``{(content_hash, file_size): StoredBlob}`` for ``keys``, locked until the transaction ends"""
+    from .models import StoredBlob
+
+    query = Q()
+    for content_hash, file_size in keys:
+        query |= Q(content_hash=content_hash, file_size=file_size)
+    return {
+        (blob.content_hash, blob.file_size): blob
+        for blob in StoredBlob.objects.select_for_update().filter(query, user=user)
+    }
+
+
+def share_blobs(user, entries):
+    """
+    Point ``entries`` (validated ``FileUpload`` field dicts) whose content is
+    already stored at the existing blob, store the new contents and count a
+    reference per entry. Must run in the transaction that creates the
+    uploads. Returns ``{index: redundant blob_url}`` for the entries whose
+    own blob is no longer needed.
+    """
+    from .models import StoredBlob
+
+    hashed = [(index, entry) for index, entry in enumerate(entries) if entry.get('content_hash')]
+    if not hashed:
+        return {}
+    firsts = {}
+    for index, entry in hashed:
+        firsts.setdefault((entry['content_hash'], entry['file_size']), entry)
+
+    # Contents stored concurrently are skipped here and read back below
+    StoredBlob.objects.bulk_create([
+        StoredBlob(
+            user=user, content_hash=content_hash, file_size=file_size,
+            blob_url=entry['blob_url'], blob_key=entry.get('blob_key', ''),
+        )
+        for (content_hash, file_size), entry in firsts.items()
+    ], ignore_conflicts=True)
+    blobs = lock_blobs(user, firsts)
+
+    counts, redundant = {}, {}
+    for index, entry in hashed:
+        blob = blobs[(entry['content_hash'], entry['file_size'])]
+        counts[blob.id] = counts.get(blob.id, 0) + 1
+        if entry['blob_url'] != blob.blob_url:
+            redundant[index] = entry['blob_url']
+            entry['blob_url'], entry['blob_key'] = blob.blob_url, blob.blob_key
+    StoredBlob.objects.filter(id__in=counts).update(ref_count=F('ref_count') + Case(
+        *[When(id=blob_id, then=Value(count)) for blob_id, count in counts.items()], default=Value(0),
+    ))
+    return redundant
+
+
+def release_blob(upload):
+    """
+    Drop ``upload``'s reference to its blob. Returns ``{"references": n,
+    "delete_blob": bool}``: the blob may be removed from storage only when
+    ``delete_blob`` is true, i.e. no other live upload uses it.
+    """
+    from .models import FileUpload, StoredBlob
+
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(
+            user_id=upload.user_id, content_hash=upload.content_hash, file_size=upload.file_size,
+        ).first() if upload.content_hash else None
+        if blob is None:
+            # Not shared through a StoredBlob (no hash, or not backfilled yet)
+            references = FileUpload.objects.filter(
+                blob_url=upload.blob_url,
+            ).exclude(upload_status='deleted').exclude(id=upload.id).count()
+            return {'references': references, 'delete_blob': references == 0}
+        if blob.ref_count <= 1:
+            blob.delete()
+            return {'references': 0, 'delete_blob': True}
+        StoredBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') - 1)
+        return {'references': blob.ref_count - 1, 'delete_blob': False}
+
+
+def hash_job(job):
+    """``(url, (sha256 hex, size) or None, error or None)``; runs in the worker threads"""
+    storage, url = job
+    try:
+        data = storage.read(url)
+    except ImageStorageError as exc:
+        return url, None, str(exc)
+    return url, (hashlib.sha256(data).hexdigest(), len(data)), None
+
+
+class BackfillReport:
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        self.blobs = 0
+        self.duplicates = 0
+        self.bytes_reclaimed = 0
+        self.blobs_deleted = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed_seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'failed': self.failed,
+            'blobs': self.blobs,
+            'duplicates': self.duplicates,
+            'bytes_reclaimed': self.bytes_reclaimed,
+            'blobs_deleted': self.blobs_deleted,
+            'elapsed_seconds': round(self.elapsed_seconds, 2),
+            'files_per_second': round(self.files_per_second, 2),
+        }
+
+
+class ContentHashBackfill:
+    """
+    Hash the live uploads that have no ``content_hash`` yet, then merge the
+    uploads of each content onto one ``StoredBlob`` (the oldest upload's
+    blob, or the one already stored). Safe to re-run or interrupt: hashes are
+    committed per batch and merging recounts ``ref_count`` from the uploads.
+    """
+
+    def __init__(self, workers=None, batch_size=200, delete_redundant=False, storage=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.delete_redundant = delete_redundant
+        self.storage = storage or get_image_storage()
+
+    def run(self):
+        report = BackfillReport()
+        executor = ThreadPoolExecutor(self.workers) if self.workers != 0 else None
+        try:
+            self.hash_uploads(executor, report)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.merge_uploads(report)
+        return report
+
+    def hash_uploads(self, executor, report):
+        from .models import FileUpload
+
+        # Failed reads keep an empty hash; the id keyset moves past them, so a run reads each file once
+        pending = FileUpload.objects.filter(content_hash='').exclude(upload_status='deleted').exclude(blob_url='')
+        last_id = None
+        while True:
+            queryset = pending.order_by('id').only('id', 'blob_url', 'file_size')
+            if last_id is not None:
+                queryset = queryset.filter(id__gt=last_id)
+            batch = list(queryset[:self.batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            # Hashing releases the GIL, so threads read and hash in parallel
+            jobs = [(self.storage, url) for url in dict.fromkeys(upload.blob_url for upload in batch)]
+            hashed = executor.map(hash_job, jobs) if executor is not None else map(hash_job, jobs)
+            results = {url: result for url, result, error in hashed if error is None}
+
+            updated = []
+            for upload in batch:
+                if upload.blob_url not in results:
+                    report.failed += 1
+                    continue
+                # The stored bytes are authoritative for the size
+                upload.content_hash, upload.file_size = results[upload.blob_url]
+                updated.append(upload)
+            FileUpload.objects.bulk_update(updated, ['content_hash', 'file_size'])
+            report.files += len(updated)
+
+    def merge_uploads(self, report):
+        from .models import FileUpload
+
+        live = FileUpload.objects.exclude(content_hash='').exclude(upload_status='deleted').order_by(
+            'user_id', 'content_hash', 'file_size', 'uploaded_at', 'id',
+        ).only('id', 'user_id', 'content_hash', 'file_size', 'blob_url', 'blob_key', 'uploaded_at')
+        groups, size = [], 0
+        for key, uploads in groupby(live, key=lambda upload: (upload.user_id, *content_key(upload))):
+            uploads = list(uploads)
+            groups.append((key, uploads))
+            size += len(uploads)
+            if size >= self.batch_size:
+                self.merge_groups(groups, report)
+                groups, size = [], 0
+        if groups:
+            self.merge_groups(groups, report)
+
+    def merge_groups(self, groups, report):
+        """Point each group's uploads at one blob and set its ``ref_count``, in one transaction"""
+        from listings.models import ListingPhoto
+        from listings.photos import photos_changed
+
+        from .models import FileUpload, StoredBlob, UserProfile
+
+        redundant = {}
+        with transaction.atomic():
+            blobs = {}
+            for user_id in {user_id for (user_id, _, _), _ in groups}:
+                keys = [(content_hash, file_size) for (owner, content_hash, file_size), _ in groups if owner == user_id]
+                blobs.update({(user_id, *key): blob for key, blob in lock_blobs(user_id, keys).items()})
+
+            created, updated, repointed = [], [], []
+            for key, uploads in groups:
+                blob = blobs.get(key)
+                if blob is None:
+                    blob = StoredBlob(
+                        user_id=key[0], content_hash=key[1], file_size=key[2],
+                        blob_url=uploads[0].blob_url, blob_key=uploads[0].blob_key,
+                    )
+                    created.append(blob)
+                elif blob.ref_count != len(uploads):
+                    updated.append(blob)
+                blob.ref_count = len(uploads)
+                for upload in uploads:
+                    if upload.blob_url != blob.blob_url:
+                        redundant.setdefault(upload.blob_url, (blob.blob_url, upload.file_size))
+                        upload.blob_url, upload.blob_key = blob.blob_url, blob.blob_key
+                        repointed.append(upload)
+            StoredBlob.objects.bulk_create(created)
+            StoredBlob.objects.bulk_update(updated, ['ref_count'])
+            FileUpload.objects.bulk_update(repointed, ['blob_url', 'blob_key'])
+            report.blobs += len(created)
+            report.duplicates += len(repointed)
+
+            if repointed:
+                canonical = {upload.id: upload.blob_url for upload in repointed}
+                photos = list(ListingPhoto.objects.filter(file__in=canonical))
+                for photo in photos:
+                    photo.url = canonical[photo.file_id]
+                ListingPhoto.objects.bulk_update(photos, ['url'])
+                photos_changed(photo.listing_id for photo in photos)
+                UserProfile.objects.filter(avatar__in=redundant).update(avatar=Case(
+                    *[When(avatar=url, then=Value(target)) for url, (target, _) in redundant.items()],
+                    default=F('avatar'), output_field=CharField(),
+                ))
+
+        report.bytes_reclaimed += sum(file_size for _, file_size in redundant.values())
+        if self.delete_redundant:
+            self.delete_blobs(redundant, report)
+
+    def delete_blobs(self, redundant, report):
+        """Remove redundant blobs from storage, unless a listing still shows one of them"""
+        from listings.models import Listing
+        from listings.photos import SLOT_FIELDS
+
+        from .models import FileUpload
+
+        urls = set(redundant)
+        in_use = Q()
+        for field in SLOT_FIELDS:
+            in_use |= Q(**{f'{field}__in': urls})
+        for listing in Listing.objects.filter(in_use).values(*SLOT_FIELDS):
+            urls -= set(listing.values())
+        # Uploads deleted before the backfill may still point at them
+        urls -= set(FileUpload.objects.filter(blob_url__in=urls).values_list('blob_url', flat=True))
+        for url in urls:
+            try:
+                self.storage.delete(url)
+            except ImageStorageError:
+                continue
+            report.blobs_deleted += 1
+
+
+def backfill_content_hashes(workers=None, batch_size=200, delete_redundant=False):
+    """Run a ``ContentHashBackfill``; returns its report as a dict"""
+    backfill = ContentHashBackfill(workers=workers, batch_size=batch_size, delete_redundant=delete_redundant)
+    return backfill.run().as_dict()
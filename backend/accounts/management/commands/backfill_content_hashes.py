@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.dedup import backfill_content_hashes
+
+
+class Command(BaseCommand):
+    help = (
+        'Hash uploaded files that have no content hash yet and merge identical files of a user onto one shared '
+        'blob (one-off; safe to re-run or interrupt)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Threads reading and hashing files (default: chosen by Python; 0 hashes in this thread)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Files hashed or merged per committed batch (default: 200)'
+        )
+        parser.add_argument(
+            '--delete-redundant',
+            action='store_true',
+            help='Also remove the blobs no file uses any more from storage'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 0:
+            raise CommandError('--workers cannot be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        report = backfill_content_hashes(
+            workers=options['workers'], batch_size=options['batch_size'],
+            delete_redundant=options['delete_redundant'],
+        )
+        reclaimed = f"{report['bytes_reclaimed'] / (1024 * 1024):.2f} MB"
+        if options['delete_redundant']:
+            reclaimed += f" reclaimed ({report['blobs_deleted']} blobs deleted)"
+        else:
+            reclaimed += ' reclaimable (re-run with --delete-redundant to remove the blobs)'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {report['files']} files hashed in {report['elapsed_seconds']}s "
+            f"({report['files_per_second']} files/sec), {report['failed']} unreadable: "
+            f"{report['duplicates']} duplicates merged onto {report['blobs']} new shared blobs, {reclaimed}"
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "backend_accounts",
+            "0003_userprofile_google_email_userprofile_google_id_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tour",
+            index=models.Index(fields=["created_at"], name="tour_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="useractivity",
+            index=models.Index(
+                fields=["created_at"], name="useractivity_created_at_idx"
+            ),
+        ),
+    ]
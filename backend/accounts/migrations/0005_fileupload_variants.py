@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_accounts", "0004_activity_created_at_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileupload",
+            name="variants",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("backend_accounts", "0005_fileupload_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64)),
+                ("file_size", models.BigIntegerField()),
+                ("blob_url", models.URLField(max_length=500)),
+                ("blob_key", models.CharField(max_length=255)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="fileupload",
+            index=models.Index(
+                fields=["user", "content_hash", "file_size"],
+                name="fileupload_content_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="storedblob",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stored_blobs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="storedblob",
+            constraint=models.UniqueConstraint(
+                fields=("user", "content_hash", "file_size"),
+                name="stored_blob_unique_content",
+            ),
+        ),
+    ]
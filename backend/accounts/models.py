@@ -81,6 +81,12 @@ class Tour(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Range scans of the listing analytics rollup job
+            models.Index(fields=['created_at'], name='tour_created_at_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.confirmation_code:
             self.confirmation_code = f"XL{datetime.now().year}-{str(uuid.uuid4())[:6].upper()}"
@@ -250,6 +256,10 @@ class UserActivity(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Range scans of the listing analytics rollup job
+            models.Index(fields=['created_at'], name='useractivity_created_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.activity_type} ({self.created_at})"
@@ -293,6 +303,12 @@ class FileUpload(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, null=True, blank=True, related_name='uploaded_files')
     property_id = models.CharField(max_length=50, blank=True)  # For associating with properties
     
+    # Resized WebP versions of images, null until generated (see listings.derivatives)
+    variants = models.JSONField(null=True, blank=True, editable=False)
+    
+    # SHA-256 (hex) of the content; with file_size it identifies the content (see accounts.dedup)
+    content_hash = models.CharField(max_length=64, blank=True)
+    
     # Timestamps
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -304,6 +320,7 @@ class FileUpload(models.Model):
             models.Index(fields=['user', 'file_type']),
             models.Index(fields=['listing']),
             models.Index(fields=['upload_status']),
+            models.Index(fields=['user', 'content_hash', 'file_size'], name='fileupload_content_idx'),
         ]
     
     def __str__(self):
@@ -321,11 +338,37 @@ class FileUpload(models.Model):
     
     def soft_delete(self):
         """Mark file as deleted without removing record"""
+        if self.upload_status != 'deleted':
+            from .dedup import release_blob
+            release_blob(self)
         self.upload_status = 'deleted'
         self.deleted_at = datetime.now()
         self.save()
 
 
+class StoredBlob(models.Model):
+    """
+    One stored copy of a user's content, shared by every ``FileUpload`` of
+    the same content (see accounts.dedup)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stored_blobs')
+    content_hash = models.CharField(max_length=64)
+    file_size = models.BigIntegerField()
+    blob_url = models.URLField(max_length=500)
+    blob_key = models.CharField(max_length=255)
+    # Live (not deleted) uploads using this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_hash', 'file_size'], name='stored_blob_unique_content'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.content_hash[:12]} ({self.ref_count} refs)"
+
+
 class FileUploadSession(models.Model):
     """Track file upload sessions for bulk operations"""
     SESSION_STATUS_CHOICES = [
@@ -359,3 +402,15 @@ class FileUploadSession(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.upload_type} session ({self.session_status})"
+
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_delete, sender=FileUpload)
+def release_deleted_upload_blob(sender, instance, **kwargs):
+    """A removed upload row no longer holds its shared blob (soft deletes release it themselves)"""
+    if instance.upload_status != 'deleted':
+        from .dedup import release_blob
+        release_blob(instance)
@@ -2,8 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from listings.derivatives import srcset
 from listings.models import Listing
 from realtors.models import Realtor
+from .dedup import clean_content_hash
 from .models import (
     UserProfile, UserFavorite, Tour, Conversation, Message, 
     PropertyAlert, Document, Notification, UserActivity, FileUpload, FileUploadSession
@@ -432,6 +434,7 @@ class FileUploadSerializer(serializers.ModelSerializer):
     """
     file_size_mb = serializers.ReadOnlyField()
     is_image = serializers.ReadOnlyField()
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = FileUpload
@@ -439,9 +442,35 @@ class FileUploadSerializer(serializers.ModelSerializer):
             'id', 'file_name', 'original_name', 'file_type', 'mime_type', 
             'file_size', 'file_size_mb', 'blob_url', 'blob_key', 
             'upload_status', 'category', 'tags', 'listing', 'property_id',
-            'uploaded_at', 'updated_at', 'is_image'
+            'content_hash', 'uploaded_at', 'updated_at', 'is_image', 'srcset'
         ]
-        read_only_fields = ['id', 'uploaded_at', 'updated_at', 'file_size_mb', 'is_image']
+        read_only_fields = ['id', 'content_hash', 'uploaded_at', 'updated_at', 'file_size_mb', 'is_image']
+    
+    def get_srcset(self, obj):
+        """Resized WebP versions by width, once generated"""
+        return srcset(obj.variants)
+
+
+class FileMetadataSerializer(serializers.ModelSerializer):
+    """
+    One file of a batch metadata registration. ``listing_id`` is a plain
+    integer so a batch checks its listings in one query (see accounts.uploads)
+    """
+    listing_id = serializers.IntegerField(required=False, allow_null=True)
+    
+    class Meta:
+        model = FileUpload
+        fields = [
+            'file_name', 'original_name', 'file_type', 'mime_type', 'file_size',
+            'blob_url', 'blob_key', 'category', 'tags', 'property_id', 'listing_id', 'content_hash'
+        ]
+        extra_kwargs = {'file_size': {'min_value': 0}}
+    
+    def validate_content_hash(self, value):
+        try:
+            return clean_content_hash(value)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(exc.detail['content_hash'])
 
 
 class FileUploadSessionSerializer(serializers.ModelSerializer):
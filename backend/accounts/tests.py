@@ -1,3 +1,162 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from listings.models import Listing, ListingPhoto
+from listings.storage import reset_image_storage
+from realtors.models import Realtor
+
+from .dedup import backfill_content_hashes
+from .models import FileUpload, FileUploadSession, StoredBlob
+
+
+class FileMetadataBatchTests(TestCase):
+    """A batch of files is stored in one transaction and advances its session atomically"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', 'uploader@example.com', 'password')
+        realtor = Realtor.objects.create(user=cls.user, name='Uploader', phone='0800000000', email=cls.user.email)
+        cls.listing = Listing.objects.create(
+            realtor=realtor, title='Uploaded', address='1 Upload Road', city='Lekki', state='Lagos',
+            zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.session = FileUploadSession.objects.create(user=self.user, upload_type='property-images', total_files=5)
+
+    def files(self, count, **overrides):
+        return [{
+            'file_name': f'{index}.jpg', 'original_name': f'{index}.jpg', 'file_type': 'property-image',
+            'mime_type': 'image/jpeg', 'file_size': 1000, 'blob_url': f'https://blob.example.com/{index}.jpg',
+            'blob_key': f'{index}.jpg', 'listing_id': self.listing.id, **overrides,
+        } for index in range(count)]
+
+    def store(self, files, **extra):
+        return self.client.post(
+            reverse('accounts:store-file-metadata-batch'), {'files': files, **extra}, content_type='application/json',
+        )
+
+    def test_batches_advance_and_complete_the_session(self):
+        with CaptureQueriesContext(connection) as few:
+            response = self.store(self.files(1), session_id=str(self.session.id))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['session']['uploaded_files'], 1)
+
+        with CaptureQueriesContext(connection) as many:
+            response = self.store(self.files(3), session_id=str(self.session.id), failed=1)
+        self.assertEqual(len(many), len(few))
+        session = response.json()['session']
+        self.assertEqual((session['uploaded_files'], session['failed_files']), (4, 1))
+        self.assertEqual(session['session_status'], 'completed')
+        self.assertIsNotNone(session['completed_at'])
+        self.assertEqual(FileUpload.objects.filter(user=self.user).count(), 4)
+        # Property images become listing photos despite bulk_create
+        self.assertEqual(
+            list(ListingPhoto.objects.filter(listing=self.listing).values_list('position', flat=True)), [7, 8, 9, 10],
+        )
+        # A completed session takes no more files
+        self.assertEqual(self.store(self.files(1), session_id=str(self.session.id)).status_code, 400)
+
+    def test_invalid_batches_store_nothing(self):
+        self.assertEqual(self.store(self.files(2) + self.files(1, file_type='video')).status_code, 400)
+        self.assertEqual(self.store(self.files(1, listing_id=999999)).status_code, 400)
+        self.assertEqual(self.store(self.files(1), session_id='nope').status_code, 400)
+        other = FileUploadSession.objects.create(
+            user=User.objects.create_user('other', 'other@example.com', 'password'), upload_type='documents',
+        )
+        self.assertEqual(self.store(self.files(1), session_id=str(other.id)).status_code, 404)
+        self.assertFalse(FileUpload.objects.exists())
+
+
+class ContentDedupTests(TestCase):
+    """Identical files of a user share one reference-counted blob"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dedup', 'dedup@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def entry(self, name, content, **overrides):
+        return {
+            'file_name': name, 'original_name': name, 'file_type': 'document', 'mime_type': 'application/pdf',
+            'file_size': len(content), 'blob_url': f'https://blob.example.com/{name}', 'blob_key': name,
+            'content_hash': hashlib.sha256(content).hexdigest(), **overrides,
+        }
+
+    def delete(self, upload_id):
+        return self.client.delete(reverse('accounts:delete-user-file', args=[upload_id])).json()
+
+    def test_registration_shares_blobs_and_deletes_keep_shared_content(self):
+        response = self.client.post(reverse('accounts:store-file-metadata-batch'), {'files': [
+            self.entry('a.pdf', b'same'), self.entry('b.pdf', b'same'), self.entry('c.pdf', b'other'),
+        ]}, content_type='application/json').json()
+        self.assertEqual(response['redundant_blobs'], [{'index': 1, 'blob_url': 'https://blob.example.com/b.pdf'}])
+        self.assertEqual(response['files'][1]['blob_url'], 'https://blob.example.com/a.pdf')
+
+        single = self.client.post(
+            reverse('accounts:store-file-metadata'), self.entry('d.pdf', b'same'), content_type='application/json',
+        ).json()
+        self.assertEqual(single['redundant_blob_url'], 'https://blob.example.com/d.pdf')
+        self.assertEqual(single['file']['blob_url'], 'https://blob.example.com/a.pdf')
+        self.assertEqual(StoredBlob.objects.get(blob_url='https://blob.example.com/a.pdf').ref_count, 3)
+        bad = self.client.post(
+            reverse('accounts:store-file-metadata'), self.entry('e.pdf', b'x', content_hash='nope'),
+            content_type='application/json',
+        )
+        self.assertEqual(bad.status_code, 400)
+
+        shared = [file['id'] for file in response['files'][:2]] + [single['file']['id']]
+        self.assertEqual(self.delete(shared[0]), {
+            'success': True, 'message': 'File marked as deleted', 'blob_references': 2, 'delete_blob': False,
+        })
+        # Deleting twice does not release twice
+        self.assertFalse(self.delete(shared[0])['delete_blob'])
+        self.assertFalse(self.delete(shared[1])['delete_blob'])
+        self.assertTrue(self.delete(shared[2])['delete_blob'])
+        self.assertFalse(StoredBlob.objects.filter(blob_url='https://blob.example.com/a.pdf').exists())
+        # Removing a row releases it too
+        FileUpload.objects.get(id=response['files'][2]['id']).delete()
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_backfill_merges_existing_duplicates(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(IMAGE_STORAGE_ROOT=root.name, IMAGE_STORAGE_URL='/media/images/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_image_storage()
+        self.addCleanup(reset_image_storage)
+
+        uploads = []
+        for name, content in (('a.pdf', b'same'), ('b.pdf', b'same'), ('c.pdf', b'other'), ('gone.pdf', b'')):
+            if content:
+                path = os.path.join(root.name, 'originals', 'blob.example.com', name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as stream:
+                    stream.write(content)
+            uploads.append(FileUpload.objects.create(user=self.user, **{**self.entry(name, content), 'content_hash': ''}))
+
+        report = backfill_content_hashes(workers=2, batch_size=2, delete_redundant=True)
+        self.assertEqual(
+            {key: report[key] for key in ('files', 'failed', 'blobs', 'duplicates', 'bytes_reclaimed', 'blobs_deleted')},
+            {'files': 3, 'failed': 1, 'blobs': 2, 'duplicates': 1, 'bytes_reclaimed': 4, 'blobs_deleted': 1},
+        )
+        uploads[1].refresh_from_db()
+        self.assertEqual(uploads[1].blob_url, uploads[0].blob_url)
+        self.assertEqual(StoredBlob.objects.get(blob_url=uploads[0].blob_url).ref_count, 2)
+        self.assertFalse(os.path.exists(os.path.join(root.name, 'originals', 'blob.example.com', 'b.pdf')))
+
+        # Re-running finds nothing new and keeps the counts
+        report = backfill_content_hashes(workers=0)
+        self.assertEqual((report['files'], report['duplicates'], report['blobs']), (0, 0, 0))
+        self.assertEqual(StoredBlob.objects.get(blob_url=uploads[0].blob_url).ref_count, 2)
@@ -0,0 +1,83 @@
+"""
+File metadata registration and upload session progress.
+
+``register_files`` records a whole batch of uploaded files in one
+transaction. The batch's listings are checked with one query, the rows are
+written with one ``bulk_create``, and the session counters are advanced by a
+single ``UPDATE`` with ``F()`` expressions. That same ``UPDATE`` marks the
+session completed once every expected file is accounted for, so concurrent
+batches of one session can neither lose counts nor miss the completion.
+Files sent with a ``content_hash`` share the blob of identical content the
+user already stored (see accounts.dedup).
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from listings.models import Listing
+from listings.photos import add_upload_photos
+
+from .dedup import share_blobs
+from .models import FileUpload, FileUploadSession, UserProfile
+
+
+def record_session_progress(session_id, user, uploaded=0, failed=0):
+    """
+    Add ``uploaded``/``failed`` to the user's session and complete it when
+    the counts reach ``total_files`` (a total of 0 is never complete). Returns
+    the updated session.
+    """
+    now = timezone.now()
+    done = Q(total_files__gt=0, total_files__lte=F('uploaded_files') + F('failed_files') + (uploaded + failed))
+    updated = FileUploadSession.objects.filter(id=session_id, user=user, session_status='active').update(
+        uploaded_files=F('uploaded_files') + uploaded,
+        failed_files=F('failed_files') + failed,
+        session_status=Case(When(done, then=Value('completed')), default=F('session_status')),
+        completed_at=Case(When(done, then=Coalesce(F('completed_at'), Value(now))), default=F('completed_at')),
+        updated_at=now,
+    )
+    if not updated:
+        if FileUploadSession.objects.filter(id=session_id, user=user).exists():
+            raise ValidationError({'session_id': 'This upload session is no longer active.'})
+        raise NotFound('Upload session not found')
+    return FileUploadSession.objects.get(id=session_id)
+
+
+def check_listings(files):
+    """Reject listing IDs that do not exist, with one query for the batch"""
+    listing_ids = {entry['listing_id'] for entry in files if entry.get('listing_id')}
+    missing = listing_ids - set(Listing.objects.filter(id__in=listing_ids).values_list('id', flat=True))
+    if missing:
+        raise ValidationError({'files': [
+            {'listing_id': 'Listing not found.'} if entry.get('listing_id') in missing else {} for entry in files
+        ]})
+
+
+def register_files(user, files, session_id=None, failed=0):
+    """
+    Create a ``FileUpload`` per validated entry of ``files`` and advance the
+    session, all or nothing. Returns ``(uploads, session or None, redundant)``
+    where ``redundant`` maps entry indexes to blob URLs made unnecessary by
+    deduplication, for the client to remove.
+    """
+    check_listings(files)
+    files = [dict(entry) for entry in files]
+    with transaction.atomic():
+        redundant = share_blobs(user, files)
+        uploads = FileUpload.objects.bulk_create([
+            FileUpload(user=user, **{**entry, 'listing_id': entry.get('listing_id') or None}) for entry in files
+        ])
+        session = None
+        if session_id is not None:
+            session = record_session_progress(session_id, user, uploaded=len(uploads), failed=failed)
+        # bulk_create skips the receiver that turns property images into listing photos
+        add_upload_photos(uploads)
+
+        avatars = [upload for upload in uploads if upload.file_type == 'avatar']
+        if avatars:
+            profile, _ = UserProfile.objects.get_or_create(user=user)
+            profile.avatar = avatars[-1].blob_url
+            profile.save()
+    return uploads, session, redundant
@@ -44,6 +44,7 @@ urlpatterns = [
     
     # =================== FILE UPLOAD & RETRIEVAL ENDPOINTS ===================
     path('files/store-metadata/', views.store_file_metadata, name='store-file-metadata'),
+    path('files/store-metadata/batch/', views.store_file_metadata_batch, name='store-file-metadata-batch'),
     path('files/', views.get_user_files, name='get-user-files'),
     path('upload-sessions/', views.create_upload_session, name='create-upload-session'),
     path('upload-sessions/<uuid:session_id>/', views.get_upload_session, name='get-upload-session'),
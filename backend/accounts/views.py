@@ -1,15 +1,19 @@
 from rest_framework import generics, status, permissions, filters
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
 from django.contrib.auth import update_session_auth_hash
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
 from datetime import timedelta
 import logging
+import uuid
 
 from .models import (
     UserProfile, UserFavorite, Tour, Conversation, Message, 
@@ -33,10 +37,16 @@ from .serializers import (
     DashboardStatsSerializer,
     AdminUserRegistrationSerializer,
     AdminUserManagementSerializer,
-    FileUploadSerializer
+    FileMetadataSerializer,
+    FileUploadSerializer,
+    FileUploadSessionSerializer
 )
-from listings.models import Listing
-from listings.serializers import ListingSerializer
+from .dedup import clean_content_hash, release_blob, share_blobs
+from .uploads import record_session_progress, register_files
+from listings.models import Listing, ListingPhoto
+from listings.pagination import ListingPhotoPagination
+from listings.photos import get_photo_manifest, sync_upload_photo
+from listings.serializers import ListingPhotoSerializer, ListingSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -257,7 +267,8 @@ class UserFavoriteViewSet(ModelViewSet):
         UserActivity.objects.create(
             user=self.request.user,
             activity_type='favorite_added',
-            description=f'Added property "{favorite.property.title}" to favorites'
+            description=f'Added property "{favorite.listing.title}" to favorites',
+            listing=favorite.listing
         )
 
     def perform_destroy(self, instance):
@@ -265,7 +276,8 @@ class UserFavoriteViewSet(ModelViewSet):
         UserActivity.objects.create(
             user=self.request.user,
             activity_type='favorite_removed',
-            description=f'Removed property "{instance.property.title}" from favorites'
+            description=f'Removed property "{instance.listing.title}" from favorites',
+            listing=instance.listing
         )
         instance.delete()
 
@@ -388,7 +400,8 @@ class ConversationViewSet(ReadOnlyModelViewSet):
         UserActivity.objects.create(
             user=request.user,
             activity_type='message_sent',
-            description=f'Sent message in conversation'
+            description=f'Sent message in conversation',
+            listing_id=conversation.listing_id
         )
         
         serializer = MessageSerializer(message)
@@ -759,36 +772,46 @@ def dashboard(request):
 @permission_classes([IsAuthenticated])
 def store_file_metadata(request):
     """
-    Store file metadata after successful Vercel Blob upload
+    Store file metadata after successful Vercel Blob upload. With a
+    ``content_hash`` (hex SHA-256) the file shares the blob of identical
+    content already stored; ``redundant_blob_url`` is then the just-uploaded
+    blob, which the client should remove.
     """
     try:
         data = request.data
+        entry = {
+            'file_name': data.get('file_name'),
+            'original_name': data.get('original_name'),
+            'file_type': data.get('file_type'),
+            'mime_type': data.get('mime_type'),
+            'file_size': int(data.get('file_size', 0)),
+            'blob_url': data.get('blob_url'),
+            'blob_key': data.get('blob_key'),
+            'category': data.get('category', ''),
+            'property_id': data.get('property_id', ''),
+            'listing_id': data.get('listing_id') if data.get('listing_id') else None,
+            'content_hash': clean_content_hash(data.get('content_hash')),
+        }
         
-        # Create file upload record
-        file_upload = FileUpload.objects.create(
-            user=request.user,
-            file_name=data.get('file_name'),
-            original_name=data.get('original_name'),
-            file_type=data.get('file_type'),
-            mime_type=data.get('mime_type'),
-            file_size=int(data.get('file_size', 0)),
-            blob_url=data.get('blob_url'),
-            blob_key=data.get('blob_key'),
-            category=data.get('category', ''),
-            property_id=data.get('property_id', ''),
-            listing_id=data.get('listing_id') if data.get('listing_id') else None,
-        )
+        with transaction.atomic():
+            redundant = share_blobs(request.user, [entry])
+            # Create file upload record
+            file_upload = FileUpload.objects.create(user=request.user, **entry)
+            # Count it towards its upload session, if any
+            if data.get('session_id'):
+                record_session_progress(data.get('session_id'), request.user, uploaded=1)
         
         # Update user profile avatar if this is an avatar upload
         if data.get('file_type') == 'avatar':
             profile, created = UserProfile.objects.get_or_create(user=request.user)
-            profile.avatar = data.get('blob_url')
+            profile.avatar = file_upload.blob_url
             profile.save()
         
         serializer = FileUploadSerializer(file_upload)
         return Response({
             'success': True,
             'file': serializer.data,
+            'redundant_blob_url': redundant.get(0),
             'message': 'File metadata stored successfully'
         }, status=status.HTTP_201_CREATED)
         
@@ -799,6 +822,49 @@ def store_file_metadata(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def store_file_metadata_batch(request):
+    """
+    Store the metadata of many uploaded files at once, e.g. every photo of a
+    property. Body: ``{"files": [...], "session_id": ..., "failed": 0}``; each
+    file has the fields of ``store_file_metadata``. ``session_id`` (optional)
+    advances that upload session by the stored files and ``failed``, and
+    completes it once all of its ``total_files`` are accounted for. All files
+    are stored or none. ``redundant_blobs`` lists the uploaded blobs made
+    unnecessary by content-hash deduplication, by index in ``files``.
+    """
+    limit = getattr(settings, 'FILE_METADATA_BATCH_MAX', 100)
+    files = request.data.get('files')
+    if not isinstance(files, list) or not 1 <= len(files) <= limit:
+        raise ValidationError({'files': f'Expected a list of 1 to {limit} files.'})
+    serializer = FileMetadataSerializer(data=files, many=True)
+    serializer.is_valid(raise_exception=True)
+    try:
+        failed = int(request.data.get('failed') or 0)
+    except (TypeError, ValueError):
+        failed = -1
+    if failed < 0:
+        raise ValidationError({'failed': 'Expected a non-negative whole number.'})
+    session_id = request.data.get('session_id') or None
+    if session_id is not None:
+        try:
+            session_id = uuid.UUID(str(session_id))
+        except ValueError:
+            raise ValidationError({'session_id': 'Expected an upload session ID.'})
+
+    uploads, session, redundant = register_files(request.user, serializer.validated_data, session_id, failed)
+    response = {
+        'success': True,
+        'files': FileUploadSerializer(uploads, many=True).data,
+        'redundant_blobs': [{'index': index, 'blob_url': url} for index, url in sorted(redundant.items())],
+        'message': f'{len(uploads)} files stored successfully'
+    }
+    if session is not None:
+        response['session'] = FileUploadSessionSerializer(session).data
+    return Response(response, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_avatar(request):
@@ -867,110 +933,68 @@ def get_user_files(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-@api_view(['GET'])
 def get_property_images(request, property_id):
     """
-    Get all images for a specific property with pagination
+    A property's photos (its photo fields and uploaded images) in gallery
+    order, from ``ListingPhoto``. Pages by ``?page=`` or, with ``?cursor=``,
+    by keyset; either way one indexed query, with totals from the cached
+    photo manifest.
     """
     try:
-        # Get pagination parameters
         page = int(request.GET.get('page', 1))
-        limit = int(request.GET.get('limit', 10))
-        max_limit = 50  # Prevent excessive requests
-        limit = min(limit, max_limit)
-        
-        # Calculate offset
-        offset = (page - 1) * limit
-        
-        # Get all property images from FileUpload model with pagination
-        property_images_queryset = FileUpload.objects.filter(
-            property_id=property_id,
-            file_type='property-image',
-            upload_status='completed'
-        ).order_by('uploaded_at')
-        
-        # Get total count before applying pagination
-        total_uploaded_images = property_images_queryset.count()
-        
-        # Apply pagination to uploaded images
-        paginated_property_images = property_images_queryset[offset:offset + limit]
-        
-        # Also check if property exists in listings
-        traditional_photos = []
-        total_traditional_photos = 0
-        try:
-            from listings.models import Listing
-            property_obj = Listing.objects.get(id=property_id)
-            
-            # Get traditional photo fields as backup
-            all_traditional_photos = []
-            if property_obj.photo_main:
-                all_traditional_photos.append({
-                    'url': property_obj.photo_main,
-                    'is_main': True,
-                    'type': 'main'
-                })
-            
-            for i in range(1, 7):  # photo_1 through photo_6
-                photo_field = getattr(property_obj, f'photo_{i}', None)
-                if photo_field:
-                    all_traditional_photos.append({
-                        'url': photo_field,
-                        'is_main': False,
-                        'type': f'photo_{i}'
-                    })
-            
-            total_traditional_photos = len(all_traditional_photos)
-            
-            # If we need to include traditional photos in this page
-            remaining_slots = limit - len(paginated_property_images)
-            if remaining_slots > 0 and offset < total_uploaded_images + total_traditional_photos:
-                traditional_offset = max(0, offset - total_uploaded_images)
-                if traditional_offset < len(all_traditional_photos):
-                    traditional_photos = all_traditional_photos[traditional_offset:traditional_offset + remaining_slots]
-                    
-        except Exception as e:
-            logger.warning(f"Could not fetch traditional photos for property {property_id}: {e}")
-            traditional_photos = []
-            total_traditional_photos = 0
-        
-        uploaded_images = FileUploadSerializer(paginated_property_images, many=True).data
-        
-        # Calculate pagination metadata
-        total_images = total_uploaded_images + total_traditional_photos
-        total_pages = (total_images + limit - 1) // limit  # Ceiling division
-        has_next = page < total_pages
-        has_previous = page > 1
-        
-        return Response({
-            'uploaded_images': uploaded_images,
-            'traditional_photos': traditional_photos,
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total_images': total_images,
-                'total_uploaded_images': total_uploaded_images,
-                'total_traditional_photos': total_traditional_photos,
-                'total_pages': total_pages,
-                'has_next': has_next,
-                'has_previous': has_previous,
-                'next_page': page + 1 if has_next else None,
-                'previous_page': page - 1 if has_previous else None
-            },
-            'property_id': property_id
-        })
-    except ValueError as e:
+        limit = int(request.GET.get('limit', ListingPhotoPagination.page_size))
+    except ValueError:
         return Response({'error': 'Invalid pagination parameters'}, status=400)
-    except Exception as e:
-        logger.error(f"Error fetching property images: {e}")
-        return Response({'error': 'Failed to fetch property images'}, status=500)
+    if page < 1 or limit < 1:
+        return Response({'error': 'Invalid pagination parameters'}, status=400)
+    limit = min(limit, ListingPhotoPagination.max_page_size)
+
+    listing_id = int(property_id) if property_id.isdigit() else None
+    manifest = get_photo_manifest(listing_id) if listing_id is not None else None
+    total_images = manifest['count'] if manifest else 0
+    queryset = ListingPhoto.objects.filter(listing_id=listing_id).order_by('position', 'id')
+    paginator = ListingPhotoPagination()
+    next_cursor = previous_cursor = None
+    if not total_images:
+        photos, has_next, has_previous = [], False, page > 1
+    elif paginator.start_keyset(queryset, request):
+        photos = paginator.finish_keyset(list(paginator.keyset_page(queryset)))
+        page, has_next, has_previous = None, paginator.has_next, paginator.has_previous
+        next_cursor, previous_cursor = paginator.next_cursor, paginator.previous_cursor
+    else:
+        # Page numbers stay for existing clients: OFFSET on the same index, no COUNT
+        photos = list(queryset[(page - 1) * limit:page * limit])
+        has_next, has_previous = page * limit < total_images, page > 1
+    total_pages = (total_images + limit - 1) // limit
+
+    return Response({
+        'photos': ListingPhotoSerializer(photos, many=True).data,
+        'main_photo': manifest['main'] if manifest else None,
+        'pagination': {
+            'page': page,
+            'limit': limit,
+            'total_images': total_images,
+            'total_uploaded_images': manifest['uploads'] if manifest else 0,
+            'total_traditional_photos': manifest['slots'] if manifest else 0,
+            'total_pages': total_pages,
+            'has_next': has_next,
+            'has_previous': has_previous,
+            'next_page': page + 1 if page is not None and has_next else None,
+            'previous_page': page - 1 if page is not None and has_previous else None,
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+        },
+        'property_id': property_id
+    })
 
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_user_file(request, file_id):
     """
-    Delete a user's uploaded file (mark as deleted, don't actually delete from blob)
+    Delete a user's uploaded file (mark as deleted, don't actually delete from blob).
+    The blob may be shared by other files of the same content: the client
+    should only remove it from storage when ``delete_blob`` is true.
     """
     try:
         file_obj = FileUpload.objects.get(
@@ -978,13 +1002,21 @@ def delete_user_file(request, file_id):
             user=request.user
         )
         
-        # Mark as deleted instead of actual deletion
-        file_obj.upload_status = 'deleted'
-        file_obj.save()
+        with transaction.atomic():
+            # Mark as deleted instead of actual deletion; only the first delete releases the file's blob
+            released = FileUpload.objects.filter(id=file_obj.id).exclude(upload_status='deleted').update(
+                upload_status='deleted', deleted_at=timezone.now()
+            )
+            blob = release_blob(file_obj) if released else {'references': None, 'delete_blob': False}
+            # update() skips the receivers, so drop the file's listing photo here
+            file_obj.upload_status = 'deleted'
+            sync_upload_photo(file_obj)
         
         return Response({
             'success': True,
-            'message': 'File marked as deleted'
+            'message': 'File marked as deleted',
+            'blob_references': blob['references'],
+            'delete_blob': blob['delete_blob']
         })
     except FileUpload.DoesNotExist:
         return Response({'error': 'File not found'}, status=404)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+# Serve the hot read endpoints with async views (see listings.async_views)
+os.environ.setdefault("ASYNC_READ_VIEWS", "True")
 
 application = get_asgi_application()
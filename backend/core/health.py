@@ -1,10 +1,32 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.db import connection
 import json
 
 
+def _ping_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def _health_response(error=None):
+    if error is None:
+        return JsonResponse({
+            "status": "healthy",
+            "database": "connected",
+            "service": "xlideland-backend"
+        })
+    return JsonResponse({
+        "status": "unhealthy",
+        "database": "disconnected",
+        "error": str(error),
+        "service": "xlideland-backend"
+    }, status=503)
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def health_check(request):
@@ -13,19 +35,21 @@ def health_check(request):
     """
     try:
         # Test database connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-        
-        return JsonResponse({
-            "status": "healthy",
-            "database": "connected",
-            "service": "xlideland-backend"
-        })
+        _ping_database()
+        return _health_response()
     except Exception as e:
-        return JsonResponse({
-            "status": "unhealthy",
-            "database": "disconnected",
-            "error": str(e),
-            "service": "xlideland-backend"
-        }, status=503)
+        return _health_response(e)
+
+
+async def health_check_async(request):
+    """
+    Health check for ASGI deployments; the database ping runs off the event loop
+    (Django 4.2's view decorators are sync-only, hence the inline method check)
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        await sync_to_async(_ping_database)()
+        return _health_response()
+    except Exception as e:
+        return _health_response(e)
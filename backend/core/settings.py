@@ -82,6 +82,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
+
+# Async listing/realtor read views (listings.async_views); core.asgi turns this on.
+# Async views query from a new thread per request, so persistent connections
+# would never be reused and are disabled in that mode.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() in ('true', '1', 'yes')
 
 # Database Configuration - Optimized for free tier
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -92,7 +98,7 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.parse(
             DATABASE_URL,
-            conn_max_age=300,  # Reduced from 600 for free tier
+            conn_max_age=0 if ASYNC_READ_VIEWS else 300,  # Reduced from 600 for free tier
             conn_health_checks=True,
         )
     }
@@ -205,6 +211,55 @@ def str_to_bool(val):
 CORS_ALLOW_CREDENTIALS = str_to_bool(os.environ.get("CORS_ALLOW_CREDENTIALS", "False"))
 CORS_ALLOW_ALL_ORIGINS = str_to_bool(os.environ.get("CORS_ALLOW_ALL_ORIGINS", "True"))
 
+# Listing Search
+# 'memory' keeps a per-process inverted index, 'postgres' uses tsvector + GIN,
+# 'auto' picks postgres when DATABASE_URL points at PostgreSQL.
+LISTING_SEARCH_BACKEND = os.getenv('LISTING_SEARCH_BACKEND', 'auto')
+LISTING_SEARCH_FEATURED_BOOST = float(os.getenv('LISTING_SEARCH_FEATURED_BOOST', '0.25'))
+# Every match is returned; only the best this many get an exact search_rank (the rest rank by recency after them)
+LISTING_SEARCH_SCORED_RESULTS = int(os.getenv('LISTING_SEARCH_SCORED_RESULTS', '1000'))
+LISTING_SEARCH_REFRESH_SECONDS = int(os.getenv('LISTING_SEARCH_REFRESH_SECONDS', '60'))
+
+# Columnar listing snapshot (NumPy) for filter/sort requests on the listing list
+LISTING_SNAPSHOT_ENABLED = str_to_bool(os.getenv('LISTING_SNAPSHOT_ENABLED', 'True'))
+LISTING_SNAPSHOT_REFRESH_SECONDS = int(os.getenv('LISTING_SNAPSHOT_REFRESH_SECONDS', '30'))
+
+# Cached listing reads (invalidated on listing changes, see listings.cache)
+LISTING_FACETS_CACHE_SECONDS = int(os.getenv('LISTING_FACETS_CACHE_SECONDS', '300'))
+FEATURED_SLATE_SIZE = int(os.getenv('FEATURED_SLATE_SIZE', '60'))
+FEATURED_SLATE_CACHE_SECONDS = int(os.getenv('FEATURED_SLATE_CACHE_SECONDS', '3600'))
+# Anonymous GET responses of the listing/realtor list and detail views; 0 disables
+API_RESPONSE_CACHE_SECONDS = int(os.getenv('API_RESPONSE_CACHE_SECONDS', '300'))
+
+# Buffered listing view tracking (see listings.tracking)
+LISTING_VIEW_DEDUP_SECONDS = int(os.getenv('LISTING_VIEW_DEDUP_SECONDS', '1800'))
+LISTING_VIEW_FLUSH_SECONDS = int(os.getenv('LISTING_VIEW_FLUSH_SECONDS', '10'))
+LISTING_VIEW_BUFFER_MAX = int(os.getenv('LISTING_VIEW_BUFFER_MAX', '1000'))
+# Flush from a per-worker background thread; when off, the request that finds a flush due writes it
+LISTING_VIEW_BACKGROUND_FLUSH = str_to_bool(os.getenv('LISTING_VIEW_BACKGROUND_FLUSH', 'True'))
+# Reverse proxies in front of the app whose X-Forwarded-For entries are trusted
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+# Hourly/daily analytics rollups skip rows newer than this, in case their transaction commits late
+ANALYTICS_ROLLUP_LAG_SECONDS = int(os.getenv('ANALYTICS_ROLLUP_LAG_SECONDS', '300'))
+# Neighbours stored per listing by compute_similar_listings
+SIMILAR_LISTINGS_COUNT = int(os.getenv('SIMILAR_LISTINGS_COUNT', '8'))
+# Market stats per grouping are cached this long (and dropped on listing changes)
+MARKET_STATS_CACHE_SECONDS = int(os.getenv('MARKET_STATS_CACHE_SECONDS', '900'))
+# Moderation work queue: how long a claim holds an item, and the most items per claim
+MODERATION_LEASE_SECONDS = int(os.getenv('MODERATION_LEASE_SECONDS', '900'))
+MODERATION_CLAIM_MAX = int(os.getenv('MODERATION_CLAIM_MAX', '25'))
+# Most moderation IDs per bulk approve/reject/flag request
+MODERATION_BULK_MAX = int(os.getenv('MODERATION_BULK_MAX', '500'))
+# Per-listing photo manifests are cached this long (and dropped when the listing's photos change)
+LISTING_PHOTO_MANIFEST_CACHE_SECONDS = int(os.getenv('LISTING_PHOTO_MANIFEST_CACHE_SECONDS', '86400'))
+# Where manage.py generate_image_derivatives reads originals and writes WebP variants:
+# a BaseImageStorage subclass, by default a local filesystem stand-in for the blob store
+IMAGE_STORAGE_BACKEND = os.getenv('IMAGE_STORAGE_BACKEND', 'listings.storage.LocalImageStorage')
+IMAGE_STORAGE_ROOT = os.getenv('IMAGE_STORAGE_ROOT', os.path.join(MEDIA_ROOT, 'images'))
+IMAGE_STORAGE_URL = os.getenv('IMAGE_STORAGE_URL', MEDIA_URL + 'images/')
+# Most files per batch metadata registration request
+FILE_METADATA_BATCH_MAX = int(os.getenv('FILE_METADATA_BATCH_MAX', '100'))
+
 # API Documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'XlideLand Real Estate API',
@@ -11,11 +11,11 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView,
 )
-from .health import health_check
+from .health import health_check, health_check_async
 
 urlpatterns = [
     # Health Check
-    path('api/health/', health_check, name='health_check'),
+    path('api/health/', health_check_async if settings.ASYNC_READ_VIEWS else health_check, name='health_check'),
     
     # Admin
     path('admin/', admin.site.urls),
@@ -0,0 +1,171 @@
+"""
+Async (ASGI) counterparts of the hot read endpoints.
+
+Each view wraps the DRF view it mirrors and reuses its queryset, filters,
+pagination and serializer, so the JSON is identical; only the I/O differs.
+Authentication, permission checks and queryset construction run in one
+``sync_to_async`` step (filter validation, the featured slate, the search
+index and the snapshot may all read the database). Counts and pages are then
+fetched through the async ORM, and cached responses through the async cache
+API, so a cache hit never leaves the event loop. Serializers run on rows that
+are already loaded: a relation missing from ``setup_eager_loading`` raises
+``SynchronousOnlyOperation`` instead of quietly querying per row.
+
+``core.asgi`` sets ``ASYNC_READ_VIEWS``, which routes the URLs here through
+``as_read_view``; under WSGI the DRF views are served as before.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import exception_handler
+
+from . import views
+from .cache import (
+    CachedResponseMixin, aversioned_key, new_cache_entry, response_cache_parts,
+    response_cache_timeout, set_validators,
+)
+from .pagination import apaginate_queryset
+
+
+def has_credentials(request):
+    """Whether the request could authenticate; without credentials it is anonymous"""
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type='application/json', status=status, headers=headers,
+    )
+
+
+def as_read_view(async_view_class):
+    """The async view under ASGI (``ASYNC_READ_VIEWS``), otherwise the DRF view it mirrors"""
+    if getattr(settings, 'ASYNC_READ_VIEWS', False):
+        return async_view_class.as_view()
+    return async_view_class.api_view_class.as_view()
+
+
+class AsyncReadView(View):
+    """
+    Async GET for the DRF generic view ``api_view_class``. Anonymous responses
+    of views using ``CachedResponseMixin`` are cached under the same keys, so
+    sync and async workers share entries.
+    """
+    api_view_class = None
+    http_method_names = ['get', 'head', 'options']
+
+    def get_api_view(self, request):
+        api_view = self.api_view_class()
+        api_view.args, api_view.kwargs, api_view.format_kwarg = self.args, self.kwargs, None
+        api_view.headers = {}
+        api_view.request = api_view.initialize_request(request, *self.args, **self.kwargs)
+        return api_view
+
+    def prepare(self, api_view):
+        """Authentication, permissions and the (lazy) filtered queryset; may query"""
+        api_view.initial(api_view.request, *self.args, **self.kwargs)
+        return api_view.filter_queryset(api_view.get_queryset())
+
+    async def get_data(self, api_view):
+        raise NotImplementedError
+
+    async def render(self, request):
+        """``(response, data)``; ``data`` is None for error responses"""
+        api_view = self.get_api_view(request)
+        try:
+            data = await self.get_data(api_view)
+        except Exception as exc:
+            return self.handle_exception(api_view, exc), None
+        return json_response(data), data
+
+    def handle_exception(self, api_view, exc):
+        """Error responses as DRF's exception handler builds them"""
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            auth_header = api_view.get_authenticate_header(api_view.request)
+            if auth_header:
+                exc.auth_header = auth_header
+            else:
+                exc.status_code = 403
+        response = exception_handler(exc, {'view': api_view, 'request': api_view.request})
+        if response is None:
+            raise exc
+        headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+        return json_response(response.data, status=response.status_code, headers=headers)
+
+    async def get(self, request, *args, **kwargs):
+        timeout = response_cache_timeout()
+        cacheable = issubclass(self.api_view_class, CachedResponseMixin) and timeout
+        if not cacheable or has_credentials(request):
+            response, _ = await self.render(request)
+            return response
+
+        key = await aversioned_key(
+            'api-response', self.api_view_class.cache_namespaces,
+            *response_cache_parts(self.api_view_class.__name__, kwargs, request.GET),
+        )
+        entry = await cache.aget(key)
+        if entry is None:
+            response, data = await self.render(request)
+            if data is None:
+                return response
+            entry = new_cache_entry(key, data)
+            await cache.aset(key, entry, timeout)
+        else:
+            not_modified = get_conditional_response(
+                request, etag=entry['etag'], last_modified=entry['last_modified'],
+            )
+            if not_modified is not None:
+                return not_modified
+            response = json_response(entry['data'])
+
+        return set_validators(response, entry)
+
+
+class AsyncListView(AsyncReadView):
+    """Paginated list through ``apaginate_queryset``"""
+
+    async def get_data(self, api_view):
+        queryset = await sync_to_async(self.prepare)(api_view)
+        paginator = api_view.paginator
+        if paginator is None:
+            rows = [row async for row in queryset]
+            return api_view.get_serializer(rows, many=True).data
+        page = await apaginate_queryset(paginator, queryset, api_view.request, view=api_view)
+        return api_view.get_paginated_response(api_view.get_serializer(page, many=True).data).data
+
+
+class AsyncDetailView(AsyncReadView):
+    """Single object by the DRF view's lookup field"""
+
+    async def get_data(self, api_view):
+        queryset = await sync_to_async(self.prepare)(api_view)
+        lookup_url_kwarg = api_view.lookup_url_kwarg or api_view.lookup_field
+        try:
+            instance = await queryset.aget(**{api_view.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            # Same message as get_object_or_404
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        api_view.check_object_permissions(api_view.request, instance)
+        return api_view.get_serializer(instance).data
+
+
+class ListingListView(AsyncListView):
+    api_view_class = views.ListingListAPIView
+
+
+class ListingDetailView(AsyncDetailView):
+    api_view_class = views.ListingDetailAPIView
+
+
+class FeaturedListingsView(AsyncListView):
+    api_view_class = views.FeaturedListingsAPIView
+
+
+class SearchListingsView(AsyncListView):
+    api_view_class = views.SearchListingsAPIView
@@ -0,0 +1,231 @@
+"""
+Helpers shared by the listing benchmark management commands: a synthetic
+catalog generator, a throwaway-data context manager, latency summaries and
+WSGI/ASGI app factories that can simulate a slow database.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+CITIES = [
+    ('Lagos', 'Lagos'), ('Lekki', 'Lagos'), ('Ikeja', 'Lagos'), ('Victoria Island', 'Lagos'),
+    ('Abuja', 'FCT - Abuja'), ('Maitama', 'FCT - Abuja'), ('Port Harcourt', 'Rivers'),
+    ('Ibadan', 'Oyo'), ('Enugu', 'Enugu'), ('Kano', 'Kano'), ('Benin City', 'Edo'),
+    ('Abeokuta', 'Ogun'), ('Calabar', 'Cross River'), ('Jos', 'Plateau'),
+]
+
+# Approximate city centres, listings are scattered within ~8km
+CITY_COORDINATES = {
+    'Lagos': (6.4550, 3.3841), 'Lekki': (6.4698, 3.5852), 'Ikeja': (6.6018, 3.3515),
+    'Victoria Island': (6.4281, 3.4219), 'Abuja': (9.0765, 7.3986), 'Maitama': (9.0882, 7.4934),
+    'Port Harcourt': (4.8156, 7.0498), 'Ibadan': (7.3775, 3.9470), 'Enugu': (6.4584, 7.5464),
+    'Kano': (12.0022, 8.5920), 'Benin City': (6.3350, 5.6037), 'Abeokuta': (7.1475, 3.3619),
+    'Calabar': (4.9757, 8.3417), 'Jos': (9.8965, 8.8583),
+}
+
+ADJECTIVES = [
+    'Luxury', 'Modern', 'Spacious', 'Cozy', 'Elegant', 'Serviced', 'Newly Built',
+    'Waterfront', 'Furnished', 'Contemporary', 'Classic', 'Executive',
+]
+
+STREETS = [
+    'Admiralty Way', 'Awolowo Road', 'Ahmadu Bello Way', 'Allen Avenue', 'Adeola Odeku',
+    'Aminu Kano Crescent', 'Ring Road', 'Independence Layout', 'Trans Amadi', 'Bourdillon Road',
+]
+
+DESCRIPTION_PHRASES = [
+    'with swimming pool', 'close to the marina', 'gated estate with 24/7 security',
+    'fitted kitchen and walk-in closets', 'rooftop terrace with panoramic city views',
+    'ample parking space', 'boys quarters included', 'steady power supply',
+    'smart home technology throughout', 'minutes from the airport', 'quiet neighbourhood',
+]
+
+PROPERTY_TYPES = ['house', 'condo', 'townhouse', 'apartment', 'loft', 'villa', 'penthouse', 'commercial']
+
+
+def synthetic_listing_rows(count, seed=42):
+    """Yield field dicts for ``count`` plausible listings"""
+    from .geo import encode_geohash
+    from .metrics import price_per_sqft
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    for index in range(count):
+        city, state = rng.choice(CITIES)
+        centre_lat, centre_lng = CITY_COORDINATES[city]
+        latitude = centre_lat + rng.uniform(-0.07, 0.07)
+        longitude = centre_lng + rng.uniform(-0.07, 0.07)
+        property_type = rng.choice(PROPERTY_TYPES)
+        bedrooms = rng.randint(1, 7)
+        sqft = rng.randint(450, 9000)
+        price = rng.randint(40, 2500) * 100000
+        yield {
+            'title': f'{rng.choice(ADJECTIVES)} {bedrooms} Bedroom {property_type.title()} in {city}',
+            'address': f'{rng.randint(1, 250)} {rng.choice(STREETS)}',
+            'city': city,
+            'state': state,
+            'zipcode': f'{rng.randint(100000, 999999)}',
+            'description': ', '.join(rng.sample(DESCRIPTION_PHRASES, 3)).capitalize() + '.',
+            'price': price,
+            'listing_type': rng.choice(['sale', 'sale', 'sale', 'rent']),
+            'property_type': property_type,
+            'bedrooms': bedrooms,
+            'bathrooms': rng.randint(1, bedrooms + 1),
+            'sqft': sqft,
+            'is_featured': rng.random() < 0.03,
+            'is_published': rng.random() < 0.95,
+            'list_date': now - timedelta(minutes=index),
+            'latitude': latitude,
+            'longitude': longitude,
+            # bulk_create skips the pre_save receivers that normally fill these
+            'geohash': encode_geohash(latitude, longitude),
+            'price_per_sqft': price_per_sqft(price, sqft),
+        }
+
+
+def seed_listings(count, seed=42, batch_size=2000):
+    """
+    Bulk insert ``count`` synthetic listings under a placeholder realtor.
+    Signals are bypassed, so in-process indexes must be rebuilt afterwards.
+    """
+    from realtors.models import Realtor
+    from .models import Listing
+
+    # bulk_create skips Realtor.save, which would otherwise create a user and send mail
+    realtor = Realtor.objects.bulk_create([Realtor(
+        name='Benchmark Realtor', email='benchmark@example.com', phone='0000000000',
+    )])[0]
+    if realtor.pk is None:
+        realtor = Realtor.objects.filter(email='benchmark@example.com').latest('id')
+
+    batch = []
+    for row in synthetic_listing_rows(count, seed):
+        batch.append(Listing(realtor=realtor, **row))
+        if len(batch) >= batch_size:
+            Listing.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Listing.objects.bulk_create(batch)
+    return realtor
+
+
+def seed_listing_features(listing_ids, feature_count, seed=42, per_listing=(2, 14), batch_size=20000):
+    """
+    Create ``feature_count`` synthetic features and link each listing to a
+    random subset, skewed so some features are common and others rare.
+    Links and masks are bulk written, like the feed ingestor does.
+    """
+    from .featurebits import free_bits, mask_of
+    from .models import Listing, PropertyFeature
+
+    rng = random.Random(seed)
+    bits = free_bits(feature_count) + [None] * feature_count
+    features = PropertyFeature.objects.bulk_create([
+        PropertyFeature(name=f'Benchmark Feature {index}', category='benchmark', bit=bit)
+        for index, bit in zip(range(feature_count), bits)
+    ])
+    if any(feature.pk is None for feature in features):
+        features = list(PropertyFeature.objects.filter(category='benchmark').order_by('id'))
+    weights = [1 / (rank + 1) for rank in range(len(features))]
+
+    through = Listing.features.through
+    links, masks = [], []
+    for listing_id in listing_ids:
+        chosen = set(rng.choices(features, weights, k=rng.randint(*per_listing)))
+        links.extend(through(listing_id=listing_id, propertyfeature_id=feature.pk) for feature in chosen)
+        masks.append(Listing(id=listing_id, feature_mask=mask_of(feature.bit for feature in chosen)))
+        if len(links) >= batch_size:
+            through.objects.bulk_create(links)
+            links = []
+    through.objects.bulk_create(links)
+    Listing.objects.bulk_update(masks, ['feature_mask'], batch_size=2000)
+    return features
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def throwaway_data():
+    """Run the body in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def simulate_db_latency(milliseconds):
+    """Delay every query of this process by ``milliseconds``, e.g. to mimic a remote database"""
+    def delay(execute, sql, params, many, context):
+        time.sleep(milliseconds / 1000)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # Fires on every reconnect of the same wrapper object
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+
+
+def _latency_from_env():
+    milliseconds = float(os.getenv('BENCHMARK_DB_LATENCY_MS') or 0)
+    if milliseconds:
+        simulate_db_latency(milliseconds)
+
+
+def wsgi_application():
+    """``core.wsgi`` with ``BENCHMARK_DB_LATENCY_MS`` applied (gunicorn app factory)"""
+    _latency_from_env()
+    from core.wsgi import application
+    return application
+
+
+def asgi_application():
+    """``core.asgi`` with ``BENCHMARK_DB_LATENCY_MS`` applied (uvicorn ``--factory``)"""
+    _latency_from_env()
+    from core.asgi import application
+    return application
+
+
+def timed(func, *args, **kwargs):
+    """Return ``(result, elapsed milliseconds)``"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    return {
+        'n': len(samples),
+        'mean': sum(samples) / len(samples) if samples else 0.0,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
+
+
+def format_summary(label, samples):
+    stats = summarize(samples)
+    return (
+        f"{label:<28} n={stats['n']:<5} mean={stats['mean']:8.2f}ms "
+        f"p50={stats['p50']:8.2f}ms p95={stats['p95']:8.2f}ms p99={stats['p99']:8.2f}ms"
+    )
@@ -0,0 +1,153 @@
+"""
+Versioned cache keys for listing reads.
+
+Each namespace ('listings', ...) has a counter stored in the Django cache.
+Cached entries embed the current counter in their key, so bumping it from a
+save/delete signal invalidates every entry of that namespace at once without
+having to enumerate keys; superseded entries simply expire.
+``CachedResponseMixin`` applies the same scheme to whole API responses.
+
+Works with any cache backend. With the default per-process locmem cache,
+invalidation is only seen by the process that made the change, so multi-worker
+deployments should point CACHES at a shared backend (file, database or Redis).
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY = 'cache-version:{}'
+
+
+def get_cache_version(namespace):
+    """Current version counter for a namespace"""
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a counter lost to eviction never reuses an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(namespace):
+    """Invalidate everything cached under a namespace"""
+    key = VERSION_KEY.format(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_cache_version(namespace)
+        return cache.incr(key)
+
+
+async def aget_cache_version(namespace):
+    """``get_cache_version`` through the async cache API"""
+    key = VERSION_KEY.format(namespace)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), None)
+        version = await cache.aget(key)
+    return version
+
+
+def normalize_query_params(query_params, ignore=()):
+    """Stable string for a QueryDict: sorted keys and values, blanks and ``ignore`` dropped"""
+    items = []
+    for key in sorted(query_params.keys()):
+        if key in ignore:
+            continue
+        values = sorted(value.strip() for value in query_params.getlist(key) if value.strip())
+        items.extend((key, value) for value in values)
+    return urlencode(items)
+
+
+def versioned_key(prefix, namespaces, *parts):
+    """Cache key tied to the current version of each namespace"""
+    versions = '.'.join(str(get_cache_version(namespace)) for namespace in namespaces)
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'{prefix}:{versions}:{digest}'
+
+
+async def aversioned_key(prefix, namespaces, *parts):
+    """``versioned_key`` through the async cache API"""
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    found = await cache.aget_many(keys)
+    versions = '.'.join([
+        str(found[key] if key in found else await aget_cache_version(namespace))
+        for key, namespace in zip(keys, namespaces)
+    ])
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'{prefix}:{versions}:{digest}'
+
+
+def response_cache_timeout():
+    return getattr(settings, 'API_RESPONSE_CACHE_SECONDS', 300)
+
+
+def response_cache_parts(view_name, kwargs, query_params):
+    """Key parts shared by the sync views and their async counterparts"""
+    kwargs = sorted((key, str(value)) for key, value in kwargs.items())
+    return view_name, kwargs, normalize_query_params(query_params)
+
+
+def new_cache_entry(key, data):
+    last_modified = int(time.time())
+    return {
+        'data': data,
+        'etag': quote_etag(hashlib.sha1(f'{key}:{last_modified}'.encode()).hexdigest()),
+        'last_modified': last_modified,
+    }
+
+
+def set_validators(response, entry):
+    """``ETag``/``Last-Modified`` of a cached entry; clients must revalidate"""
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Cache anonymous GET responses of a generic view under a versioned key.
+
+    Entries are keyed on the view, its URL kwargs and the normalized query
+    params, and live until any of ``cache_namespaces`` is bumped. Responses
+    carry ``ETag``/``Last-Modified``, so clients revalidating an unchanged
+    entry get a 304 without the queryset or serializer running.
+    """
+    cache_namespaces = ('listings',)
+
+    def get_response_cache_key(self, request):
+        return versioned_key(
+            'api-response', self.cache_namespaces,
+            *response_cache_parts(type(self).__name__, self.kwargs, request.query_params),
+        )
+
+    def get(self, request, *args, **kwargs):
+        timeout = response_cache_timeout()
+        if not timeout or request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = new_cache_entry(key, response.data)
+            cache.set(key, entry, timeout)
+        else:
+            not_modified = get_conditional_response(
+                request, etag=entry['etag'], last_modified=entry['last_modified'],
+            )
+            if not_modified is not None:
+                return not_modified
+            response = Response(entry['data'])
+
+        return set_validators(response, entry)
@@ -0,0 +1,235 @@
+"""
+Resized WebP variants of listing photos and uploaded images.
+
+``generate_derivatives`` finds images without variants: ``ListingPhoto`` rows
+and completed ``FileUpload`` rows of type ``property-image`` or ``avatar``.
+It reads each distinct URL once through the image storage
+(listings.storage) and decodes, resizes and encodes it in a
+``ProcessPoolExecutor``. It then writes the variants back through the
+storage. URLs and dimensions are recorded in each row's ``variants``
+(``{name: {"url", "width", "height"}}`` for ``original`` and every variant,
+or ``{"error": ...}`` when the image could not be processed).
+
+Variant files are named after a hash of the source URL, so re-running
+rewrites the same files. Rows are taken in ``id`` order, one committed batch
+at a time, so an interrupted run resumes where it stopped. Rows that already
+have variants are skipped. Failed images are only retried with
+``retry_failed``. Variants are never upscaled.
+
+``srcset`` turns ``variants`` into the ``{"<width>w": url}`` map the
+serializers expose.
+"""
+import hashlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .storage import ImageStorageError, get_image_storage
+
+VARIANTS = (('large', 1600), ('medium', 768), ('thumbnail', 320))
+WEBP_QUALITY = 80
+UPLOAD_TYPES = ('property-image', 'avatar')
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def render_variants(data):
+    """
+    ``((width, height), {name: (webp bytes, width, height)})`` for an encoded
+    image. Runs in the worker processes, so it only touches Pillow.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # JPEGs can be decoded at a reduced scale; both sides stay at least the
+        # largest variant's width, whichever way the image is rotated
+        image.draft('RGB', (VARIANTS[0][1], VARIANTS[0][1]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+        outputs = {}
+        # Largest first, each variant resized from the previous one
+        for name, max_width in VARIANTS:
+            if image.width > max_width:
+                image = image.resize((max_width, max(1, round(image.height * max_width / image.width))), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+            outputs[name] = (buffer.getvalue(), image.width, image.height)
+    return (width, height), outputs
+
+
+def render_job(job):
+    """``(url, result or None, error or None)``; errors are returned so one bad image cannot stop the pool"""
+    url, data = job
+    try:
+        return url, render_variants(data), None
+    except Exception as exc:
+        return url, None, f'{type(exc).__name__}: {exc}'
+
+
+def variant_key(url, name):
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return f'derivatives/{digest[:2]}/{digest}/{name}.webp'
+
+
+def srcset(variants):
+    """``{"320w": url, ...}`` from a row's ``variants``, narrowest first; empty until generated"""
+    if not variants or 'error' in variants:
+        return {}
+    widths = {}
+    for name, _ in VARIANTS:
+        variant = variants.get(name)
+        if variant:
+            widths.setdefault(variant['width'], variant['url'])
+    return {f'{width}w': widths[width] for width in sorted(widths)}
+
+
+def pending_photos(retry_failed=False):
+    from .models import ListingPhoto
+
+    queryset = ListingPhoto.objects.all()
+    if retry_failed:
+        return queryset.filter(Q(variants__isnull=True) | Q(variants__has_key='error'))
+    return queryset.filter(variants__isnull=True)
+
+
+def pending_uploads(retry_failed=False):
+    from accounts.models import FileUpload
+
+    queryset = FileUpload.objects.filter(file_type__in=UPLOAD_TYPES, upload_status='completed').exclude(blob_url='')
+    if retry_failed:
+        return queryset.filter(Q(variants__isnull=True) | Q(variants__has_key='error'))
+    return queryset.filter(variants__isnull=True)
+
+
+class DerivativeReport:
+    def __init__(self):
+        self.images = 0
+        self.variants = 0
+        self.failed = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed_seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def images_per_second(self):
+        return self.images / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'images': self.images,
+            'variants': self.variants,
+            'failed': self.failed,
+            'rows': self.rows,
+            'elapsed_seconds': round(self.elapsed_seconds, 2),
+            'images_per_second': round(self.images_per_second, 2),
+        }
+
+
+class DerivativeGenerator:
+    def __init__(self, workers=None, batch_size=50, retry_failed=False, storage=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_failed = retry_failed
+        self.storage = storage or get_image_storage()
+
+    def run(self, limit=None):
+        """Process pending rows until none are left (or ``limit`` images were handled)"""
+        report = DerivativeReport()
+        executor = ProcessPoolExecutor(self.workers) if self.workers != 0 else None
+        try:
+            for pending in (pending_uploads, pending_photos):
+                last_id = None
+                while limit is None or report.images < limit:
+                    queryset = pending(self.retry_failed).order_by('id')
+                    if last_id is not None:
+                        queryset = queryset.filter(id__gt=last_id)
+                    batch = list(queryset[:self.batch_size])
+                    if not batch:
+                        break
+                    last_id = batch[-1].id
+                    self.process_batch(batch, executor, report)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return report
+
+    def process_batch(self, rows, executor, report):
+        urls = list(dict.fromkeys(self.source_url(row) for row in rows))
+        results, jobs = {}, []
+        for url in urls:
+            try:
+                jobs.append((url, self.storage.read(url)))
+            except ImageStorageError as exc:
+                results[url] = {'error': str(exc)}
+        rendered = executor.map(render_job, jobs) if executor is not None else map(render_job, jobs)
+        for url, result, error in rendered:
+            results[url] = {'error': error} if error else self.store(url, result, report)
+
+        report.images += len(urls)
+        report.failed += sum(1 for variants in results.values() if 'error' in variants)
+        report.rows += self.save(rows, results)
+
+    def store(self, url, result, report):
+        (width, height), outputs = result
+        variants = {'original': {'url': url, 'width': width, 'height': height}}
+        for name, (data, variant_width, variant_height) in outputs.items():
+            try:
+                stored = self.storage.write(variant_key(url, name), data, 'image/webp')
+            except ImageStorageError as exc:
+                return {'error': str(exc)}
+            variants[name] = {'url': stored, 'width': variant_width, 'height': variant_height}
+            report.variants += 1
+        return variants
+
+    @staticmethod
+    def source_url(row):
+        return getattr(row, 'blob_url', None) or row.url
+
+    def save(self, rows, results):
+        """
+        Record the variants on the batch rows and on the rows sharing their
+        image (an upload and its listing photo); returns the rows written.
+        """
+        from accounts.models import FileUpload
+        from .cache import bump_cache_version
+        from .models import ListingPhoto
+        from .photos import photos_changed
+
+        uploads = [row for row in rows if isinstance(row, FileUpload)]
+        photos = [row for row in rows if isinstance(row, ListingPhoto)]
+        photos += ListingPhoto.objects.filter(file__in=[upload.id for upload in uploads])
+        uploads += FileUpload.objects.filter(
+            id__in=[photo.file_id for photo in photos if photo.file_id],
+        ).exclude(id__in=[upload.id for upload in uploads])
+        uploads = [upload for upload in uploads if upload.blob_url in results]
+        photos = [photo for photo in {photo.id: photo for photo in photos}.values() if photo.url in results]
+
+        for upload in uploads:
+            upload.variants = results[upload.blob_url]
+        for photo in photos:
+            photo.variants = results[photo.url]
+            original = photo.variants.get('original')
+            if original:
+                photo.width, photo.height = original['width'], original['height']
+        FileUpload.objects.bulk_update(uploads, ['variants'])
+        ListingPhoto.objects.bulk_update(photos, ['variants', 'width', 'height'])
+        if photos:
+            photos_changed(photo.listing_id for photo in photos)
+            # List cards embed the main photo's srcset
+            bump_cache_version('listings')
+        return len(uploads) + len(photos)
+
+
+def generate_derivatives(workers=None, batch_size=50, retry_failed=False, limit=None):
+    """Run a ``DerivativeGenerator``; returns its report as a dict"""
+    generator = DerivativeGenerator(workers=workers, batch_size=batch_size, retry_failed=retry_failed)
+    return generator.run(limit=limit).as_dict()
@@ -0,0 +1,96 @@
+"""
+Streaming catalog export (CSV or JSON Lines).
+
+Rows are read with a chunked ``.iterator()`` (relations joined or prefetched
+per chunk) and written out one line at a time, so memory use does not grow
+with the size of the catalog.
+
+Under ASGI, Django reads a synchronous iterator given to
+``StreamingHttpResponse`` into memory before sending it, so ASGI requests
+stream ``aexport_lines`` instead: the same lines, pulled a chunk at a time in
+a worker thread.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+LISTING_FIELDS = [
+    'id', 'title', 'address', 'city', 'state', 'zipcode', 'neighborhood', 'latitude', 'longitude',
+    'price', 'listing_type', 'property_type', 'bedrooms', 'bathrooms', 'sqft', 'lot_size',
+    'year_built', 'is_published', 'is_featured', 'photo_main', 'list_date', 'updated_at',
+]
+RELATED_FIELDS = ['realtor', 'realtor_email', 'category', 'features']
+EXPORT_FIELDS = LISTING_FIELDS + RELATED_FIELDS
+
+
+def export_queryset(queryset):
+    """Load only what the export reads; features are prefetched per iterator chunk"""
+    return (
+        queryset.select_related('realtor', 'category')
+        .only(*LISTING_FIELDS, 'realtor__name', 'realtor__email', 'category__name', 'realtor', 'category')
+        .prefetch_related('features')
+    )
+
+
+def listing_record(listing):
+    record = {field: getattr(listing, field) for field in LISTING_FIELDS}
+    record['realtor'] = listing.realtor.name
+    record['realtor_email'] = listing.realtor.email
+    record['category'] = listing.category.name if listing.category else None
+    record['features'] = sorted(feature.name for feature in listing.features.all())
+    return record
+
+
+def iter_records(queryset, chunk_size=CHUNK_SIZE):
+    for listing in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield listing_record(listing)
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        record['features'] = '; '.join(record['features'])
+        yield writer.writerow(['' if record[field] is None else record[field] for field in EXPORT_FIELDS])
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_lines(queryset, export_format):
+    """Lines of the export for ``queryset`` in ``export_format`` ('csv' or 'jsonl')"""
+    records = iter_records(queryset)
+    if export_format == 'csv':
+        return csv_lines(records)
+    return jsonl_lines(records)
+
+
+async def aexport_lines(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """``export_lines`` as an async iterator of ``chunk_size``-line strings, for ASGI responses"""
+    lines = export_lines(queryset, export_format)
+    # Thread-sensitive, so every chunk reads through the same database connection and cursor
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)), thread_sensitive=True)
+    while True:
+        chunk = await next_chunk()
+        if not chunk:
+            break
+        yield chunk
@@ -0,0 +1,139 @@
+"""
+Facet counts for the property search form.
+
+Counts are disjunctive: each facet family is counted with every active filter
+except its own, so the form can show what picking another value would yield.
+Each family costs one grouped query, and the whole result is cached per
+normalized filter set until the listing cache version changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import normalize_query_params, versioned_key
+from .models import Listing
+
+PRICE_BUCKETS = [
+    (None, 10000000, 'Under ₦10M'),
+    (10000000, 25000000, '₦10M - ₦25M'),
+    (25000000, 50000000, '₦25M - ₦50M'),
+    (50000000, 100000000, '₦50M - ₦100M'),
+    (100000000, 250000000, '₦100M - ₦250M'),
+    (250000000, None, '₦250M+'),
+]
+
+# Facet family -> query params that filter on it (dropped when counting that family)
+FACET_PARAMS = {
+    'property_type': ('property_type',),
+    'listing_type': ('listing_type',),
+    'city': ('city',),
+    'bedrooms': ('bedrooms',),
+    'category': (),
+    'price': ('min_price', 'max_price'),
+}
+
+# Params that don't change which listings match
+IGNORED_PARAMS = ('page', 'limit', 'cursor', 'with_count', 'ordering', 'format')
+
+CITY_FACET_LIMIT = 25
+
+
+def _grouped(queryset, field, limit=None):
+    rows = queryset.order_by().values(field).annotate(count=Count('id')).order_by('-count', field)
+    if limit:
+        rows = rows[:limit]
+    return rows
+
+
+def count_property_types(queryset):
+    labels = dict(Listing.PROPERTY_TYPE_CHOICES)
+    return [
+        {'value': row['property_type'], 'label': labels.get(row['property_type'], row['property_type']), 'count': row['count']}
+        for row in _grouped(queryset, 'property_type')
+    ]
+
+
+def count_listing_types(queryset):
+    labels = dict(Listing.LISTING_TYPE_CHOICES)
+    return [
+        {'value': row['listing_type'], 'label': labels.get(row['listing_type'], row['listing_type']), 'count': row['count']}
+        for row in _grouped(queryset, 'listing_type')
+    ]
+
+
+def count_cities(queryset):
+    return [{'value': row['city'], 'count': row['count']} for row in _grouped(queryset, 'city', CITY_FACET_LIMIT)]
+
+
+def count_bedrooms(queryset):
+    rows = queryset.order_by().values('bedrooms').annotate(count=Count('id')).order_by('bedrooms')
+    return [{'value': row['bedrooms'], 'count': row['count']} for row in rows]
+
+
+def count_categories(queryset):
+    rows = (
+        queryset.filter(category__isnull=False).order_by()
+        .values('category__id', 'category__slug', 'category__name')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'category__name')
+    )
+    return [
+        {'value': row['category__slug'], 'id': row['category__id'], 'label': row['category__name'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def count_price_buckets(queryset):
+    """All buckets in a single aggregate using filtered counts"""
+    aggregates = {}
+    for index, (low, high, _) in enumerate(PRICE_BUCKETS):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+    counts = queryset.order_by().aggregate(**aggregates)
+    return [
+        {'min': low, 'max': high, 'label': label, 'count': counts[f'bucket_{index}']}
+        for index, (low, high, label) in enumerate(PRICE_BUCKETS)
+    ]
+
+
+FACET_COUNTERS = {
+    'property_type': count_property_types,
+    'listing_type': count_listing_types,
+    'city': count_cities,
+    'bedrooms': count_bedrooms,
+    'category': count_categories,
+    'price': count_price_buckets,
+}
+
+
+def compute_facets(query_params, queryset_for):
+    """
+    Build the facet payload. ``queryset_for(params)`` must return the listings
+    matching a QueryDict of search filters.
+    """
+    full_queryset = queryset_for(query_params)
+    facets = {}
+    for family, params in FACET_PARAMS.items():
+        if any(param in query_params for param in params):
+            relaxed = query_params.copy()
+            for param in params:
+                relaxed.pop(param, None)
+            queryset = queryset_for(relaxed)
+        else:
+            queryset = full_queryset
+        facets[family] = FACET_COUNTERS[family](queryset)
+    return {'total': full_queryset.order_by().count(), 'facets': facets}
+
+
+def get_facets(query_params, queryset_for):
+    """Cached ``compute_facets`` keyed on the normalized filter set"""
+    key = versioned_key('listing-facets', ['listings'], normalize_query_params(query_params, IGNORED_PARAMS))
+    result = cache.get(key)
+    if result is None:
+        result = compute_facets(query_params, queryset_for)
+        cache.set(key, result, getattr(settings, 'LISTING_FACETS_CACHE_SECONDS', 300))
+    return result
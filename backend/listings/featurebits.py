@@ -0,0 +1,184 @@
+"""
+Per-listing feature bitmasks for multi-feature AND filters.
+
+Every ``PropertyFeature`` gets a ``bit`` (the lowest free one of 63 when it
+is created) and ``Listing.feature_mask`` ORs the bits of the listing's
+features. "Has Pool, Smart Home and 24/7 Security" then takes one join
+whatever the number of features: the first feature's links (through the
+join-table index) give the candidates and ``feature_mask & m = m`` checks the
+rest on each candidate row, instead of a join per feature or a
+``GROUP BY ... HAVING COUNT``. The columnar snapshot answers the whole
+predicate from an int64 array.
+
+``m2m_changed`` applies each feature edit as one bitwise ``UPDATE`` of the
+listings involved. Bulk writes of the through table (the feed ingestor) set
+the masks themselves, and ``refresh_feature_masks`` rebuilds them from the
+links. Features beyond the 63rd have no bit; filters on them fall back to a
+join.
+"""
+from django.db.models import F
+from django.utils import timezone
+
+MASK_BITS = 63  # a signed 64-bit column
+
+
+def free_bits(count):
+    """The ``count`` lowest bits not held by a feature (fewer when they run out)"""
+    from .models import PropertyFeature
+
+    taken = set(PropertyFeature.objects.filter(bit__isnull=False).values_list('bit', flat=True))
+    return [bit for bit in range(MASK_BITS) if bit not in taken][:count]
+
+
+def mask_of(bits):
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def assign_feature_bits():
+    """
+    Give features without a bit a free one, then fix the masks of their
+    listings. Returns the number of features assigned.
+    """
+    from .models import Listing, PropertyFeature
+
+    features = list(PropertyFeature.objects.filter(bit__isnull=True).order_by('id'))
+    assigned = []
+    for feature, bit in zip(features, free_bits(len(features))):
+        feature.bit = bit
+        assigned.append(feature)
+    PropertyFeature.objects.bulk_update(assigned, ['bit'])
+    through = Listing.features.through
+    listing_ids = set(through.objects.filter(propertyfeature__in=assigned).values_list('listing_id', flat=True))
+    if listing_ids:
+        refresh_feature_masks(listing_ids)
+    return len(assigned)
+
+
+def listing_masks(listing_ids=None):
+    """``{listing_id: mask}`` computed from the feature links"""
+    from .models import Listing
+
+    links = Listing.features.through.objects.filter(propertyfeature__bit__isnull=False)
+    if listing_ids is not None:
+        links = links.filter(listing_id__in=listing_ids)
+    masks = {}
+    for listing_id, bit in links.values_list('listing_id', 'propertyfeature__bit'):
+        masks[listing_id] = masks.get(listing_id, 0) | 1 << bit
+    return masks
+
+
+def refresh_feature_masks(listing_ids=None):
+    """Rebuild stored masks from the links (all listings, or ``listing_ids``); returns rows changed"""
+    from .models import Listing
+
+    masks = listing_masks(listing_ids)
+    listings = Listing.objects.only('id', 'feature_mask')
+    if listing_ids is not None:
+        listings = listings.filter(pk__in=listing_ids)
+    now = timezone.now()
+    changed = []
+    for listing in listings.iterator(chunk_size=2000):
+        mask = masks.get(listing.id, 0)
+        if listing.feature_mask != mask:
+            listing.feature_mask = mask
+            listing.updated_at = now
+            changed.append(listing)
+    Listing.objects.bulk_update(changed, ['feature_mask', 'updated_at'], batch_size=1000)
+    return len(changed)
+
+
+def feature_links_changed(instance, action, reverse, pk_set):
+    """
+    Apply a ``post_add``/``post_remove``/``post_clear`` of ``Listing.features``
+    to the stored masks; the listings' ``updated_at`` is touched either way.
+    """
+    from .models import Listing, PropertyFeature
+
+    if reverse:
+        # instance is a feature; clearing it reports no IDs, so they are captured on pre_clear
+        listing_ids = getattr(instance, '_cleared_listing_ids', []) if action == 'post_clear' else pk_set
+        bits = [instance.bit]
+    else:
+        listing_ids = [instance.pk]
+        bits = PropertyFeature.objects.filter(pk__in=pk_set or ()).values_list('bit', flat=True)
+    if not listing_ids:
+        return
+    mask = mask_of(bits) if action != 'post_clear' or reverse else 0
+
+    listings = Listing.objects.filter(pk__in=list(listing_ids))
+    now = timezone.now()
+    if action == 'post_clear' and not reverse:
+        listings.update(feature_mask=0, updated_at=now)
+    elif not mask:
+        listings.update(updated_at=now)
+    elif action == 'post_add':
+        listings.update(feature_mask=F('feature_mask').bitor(mask), updated_at=now)
+    else:
+        listings.update(feature_mask=F('feature_mask').bitand(~mask), updated_at=now)
+
+
+def feature_deleted(feature):
+    """
+    Clear a deleted feature's bit (its links are gone with it) and hand the
+    bit to a feature that has none.
+    """
+    from .models import Listing, PropertyFeature
+
+    if feature.bit is None:
+        return
+    mask = 1 << feature.bit
+    Listing.objects.alias(has_feature=F('feature_mask').bitand(mask)).filter(has_feature=mask).update(
+        feature_mask=F('feature_mask').bitand(~mask), updated_at=timezone.now(),
+    )
+    if PropertyFeature.objects.filter(bit__isnull=True).exists():
+        assign_feature_bits()
+
+
+def feature_values(query_params):
+    """``?features=Pool,Gym`` and/or repeated ``?features=``, as IDs or names"""
+    getlist = getattr(query_params, 'getlist', None)
+    raw = getlist('features') if getlist else [query_params.get('features')]
+    return [value.strip() for item in raw if item for value in item.split(',') if value.strip()]
+
+
+def resolve_features(values):
+    """
+    ``[(feature_id, bit), ...]`` for feature IDs or names (case-insensitive),
+    in request order without repeats, or None when one of them does not exist.
+    """
+    from .models import PropertyFeature
+
+    by_id, by_name = {}, {}
+    for feature_id, name, bit in PropertyFeature.objects.values_list('id', 'name', 'bit'):
+        by_id[str(feature_id)] = by_name[name.lower()] = (feature_id, bit)
+    features = []
+    for value in values:
+        feature = by_id.get(value) or by_name.get(value.lower())
+        if feature is None:
+            return None
+        if feature not in features:
+            features.append(feature)
+    return features
+
+
+def filter_features(queryset, query_params):
+    """Listings having every feature in ``?features=``"""
+    values = feature_values(query_params)
+    if not values:
+        return queryset
+    features = resolve_features(values)
+    if features is None:
+        return queryset.none()
+    (driving_id, _), rest = features[0], features[1:]
+    queryset = queryset.filter(features=driving_id)
+    mask = mask_of(bit for _, bit in rest)
+    if mask:
+        queryset = queryset.alias(matched_features=F('feature_mask').bitand(mask)).filter(matched_features=mask)
+    for feature_id, bit in rest:
+        if bit is None:
+            queryset = queryset.filter(features=feature_id)
+    return queryset
@@ -0,0 +1,67 @@
+"""
+Featured listings slate for the home page.
+
+Listings are ranked featured -> MVP realtor -> latest in a single annotated
+query. When there are enough featured listings the slate is featured-only;
+otherwise it is topped up from the lower tiers. The ordered ID list is cached
+until a listing or realtor changes (which covers ``is_featured`` and
+``is_mvp`` flips).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+from .cache import versioned_key
+from .models import Listing
+
+TIER_FEATURED, TIER_MVP, TIER_LATEST = 0, 1, 2
+
+# Fewer featured listings than this and the slate is topped up with MVP/latest ones
+MIN_FEATURED = 6
+
+
+def slate_size():
+    return getattr(settings, 'FEATURED_SLATE_SIZE', 60)
+
+
+def compute_featured_slate(limit=None):
+    """Ordered listing IDs for the featured slate (one query)"""
+    limit = limit or slate_size()
+    rows = list(
+        Listing.objects.filter(is_published=True)
+        .annotate(tier=Case(
+            When(is_featured=True, then=Value(TIER_FEATURED)),
+            When(realtor__is_mvp=True, then=Value(TIER_MVP)),
+            default=Value(TIER_LATEST),
+            output_field=IntegerField(),
+        ))
+        .order_by('tier', '-list_date', '-id')
+        .values_list('id', 'tier')[:limit]
+    )
+    featured = [listing_id for listing_id, tier in rows if tier == TIER_FEATURED]
+    if len(featured) >= MIN_FEATURED:
+        return featured
+    return [listing_id for listing_id, _ in rows]
+
+
+def get_featured_slate():
+    """Cached ``compute_featured_slate``"""
+    key = versioned_key('featured-slate', ['listings', 'realtors'], slate_size())
+    slate = cache.get(key)
+    if slate is None:
+        slate = compute_featured_slate()
+        cache.set(key, slate, getattr(settings, 'FEATURED_SLATE_CACHE_SECONDS', 3600))
+    return slate
+
+
+def featured_queryset(ids=None):
+    """Published listings of the slate, in slate order"""
+    if ids is None:
+        ids = get_featured_slate()
+    if not ids:
+        return Listing.objects.none()
+    position = Case(
+        *[When(id=listing_id, then=Value(index)) for index, listing_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return Listing.objects.filter(id__in=ids, is_published=True).order_by(position)
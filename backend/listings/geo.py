@@ -0,0 +1,203 @@
+"""
+Map search without PostGIS.
+
+Every listing with coordinates stores a geohash. A geohash names a grid cell
+and shares its prefix with every smaller cell inside it, so "listings in this
+area" becomes a handful of indexed string range scans over the cells covering
+the area. The exact bounding-box or great-circle check then only runs on the
+rows that survived that pruning. Plain B-tree indexes and Django's math
+functions are all it needs, so it behaves the same on SQLite and PostgreSQL.
+"""
+import math
+
+from django.db.models import Avg, Count, F, FloatField, Max, Min, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt, Substr
+from rest_framework.exceptions import ValidationError
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5m cells
+
+# Upper bound on cells (OR'ed range scans) used to cover a search area
+MAX_COVER_CELLS = 32
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_RADIUS_KM = 500
+
+# Map zoom level -> geohash precision used for marker clusters
+ZOOM_PRECISION = [(3, 1), (6, 2), (9, 3), (12, 4), (15, 5), (18, 6)]
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """The finest set of at most ``max_cells`` geohash cells covering a box"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((south + 90) / height), math.floor((min(north, 90 - 1e-9) + 90) / height) + 1)
+        cols = range(math.floor((west + 180) / width), math.floor((min(east, 180 - 1e-9) + 180) / width) + 1)
+        if len(rows) * len(cols) <= max_cells or precision == 1:
+            return sorted({
+                encode_geohash((row + 0.5) * height - 90, (col + 0.5) * width - 180, precision)
+                for row in rows for col in cols
+            })
+
+
+def next_cell(cell):
+    """
+    The first cell after every hash under ``cell``: ``'s14z'`` -> ``'s150'``,
+    or None past the last cell. Digits and lowercase letters sort the same
+    way in every collation, unlike a symbol bound such as ``cell + '{'``.
+    """
+    head = cell.rstrip(BASE32[-1])
+    if not head:
+        return None
+    return (head[:-1] + BASE32[BASE32.index(head[-1]) + 1]).ljust(len(cell), BASE32[0])
+
+
+def geohash_prefix_q(cells, field='geohash'):
+    """Index-friendly prefix match: ``prefix <= geohash < next_cell(prefix)``"""
+    condition = Q()
+    for cell in cells:
+        upper = next_cell(cell)
+        bounds = {f'{field}__gte': cell}
+        if upper is not None:
+            bounds[f'{field}__lt'] = upper
+        condition |= Q(**bounds)
+    return condition
+
+
+def _floats(raw, count, param):
+    try:
+        values = [float(part) for part in raw.split(',')]
+    except (AttributeError, ValueError):
+        values = []
+    if len(values) != count or not all(math.isfinite(value) for value in values):
+        raise ValidationError({param: f'Expected {count} comma-separated numbers.'})
+    return values
+
+
+def parse_bbox(raw, param='bbox'):
+    """``west,south,east,north`` in degrees -> (south, west, north, east)"""
+    west, south, east, north = _floats(raw, 4, param)
+    if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValidationError({param: 'Expected west,south,east,north with west <= east and south <= north.'})
+    return south, west, north, east
+
+
+def parse_near(raw, radius_raw):
+    """``lat,lng`` plus ``radius_km`` -> (latitude, longitude, radius_km)"""
+    latitude, longitude = _floats(raw, 2, 'near')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': 'Latitude or longitude out of range.'})
+    radius_km = _floats(radius_raw or '5', 1, 'radius_km')[0]
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': f'Must be between 0 and {MAX_RADIUS_KM}.'})
+    return latitude, longitude, radius_km
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Box enclosing a circle, as (south, west, north, east)"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    lng_delta = 180.0 if cos_lat < 1e-6 else min(180.0, math.degrees(radius_km / EARTH_RADIUS_KM / cos_lat))
+    return (
+        max(-90.0, latitude - lat_delta), max(-180.0, longitude - lng_delta),
+        min(90.0, latitude + lat_delta), min(180.0, longitude + lng_delta),
+    )
+
+
+def haversine_km(latitude, longitude):
+    """Expression for the great-circle distance from a point to each row"""
+    lat, lng = Radians(F('latitude')), Radians(F('longitude'))
+    origin_lat, origin_lng = math.radians(latitude), math.radians(longitude)
+    a = (
+        Power(Sin((lat - Value(origin_lat)) / 2), 2)
+        + Value(math.cos(origin_lat)) * Cos(lat) * Power(Sin((lng - Value(origin_lng)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def filter_bbox(queryset, south, west, north, east):
+    return queryset.filter(
+        geohash_prefix_q(covering_cells(south, west, north, east)),
+        latitude__range=(south, north),
+        longitude__range=(west, east),
+    )
+
+
+def filter_near(queryset, latitude, longitude, radius_km):
+    """Listings within ``radius_km``, annotated with ``distance_km``"""
+    queryset = filter_bbox(queryset, *radius_bbox(latitude, longitude, radius_km))
+    return queryset.annotate(distance_km=haversine_km(latitude, longitude)).filter(distance_km__lte=radius_km)
+
+
+def filter_geo(queryset, query_params):
+    """Apply ``bbox=`` and ``near=``/``radius_km=`` from the request"""
+    if query_params.get('bbox'):
+        queryset = filter_bbox(queryset, *parse_bbox(query_params['bbox']))
+    if query_params.get('near'):
+        queryset = filter_near(queryset, *parse_near(query_params['near'], query_params.get('radius_km')))
+    return queryset
+
+
+def zoom_precision(raw):
+    try:
+        zoom = int(raw)
+    except (TypeError, ValueError):
+        raise ValidationError({'zoom': 'Expected an integer map zoom level.'})
+    for max_zoom, precision in ZOOM_PRECISION:
+        if zoom < max_zoom:
+            return precision
+    return ZOOM_PRECISION[-1][1] + 1
+
+
+def cluster_markers(queryset, precision):
+    """One marker per geohash cell: count, centroid, price range and the ID of lone listings"""
+    rows = (
+        queryset.filter(geohash__gt='').order_by()
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(
+            count=Count('id'),
+            latitude=Avg('latitude'), longitude=Avg('longitude'),
+            min_price=Min('price'), max_price=Max('price'), listing_id=Min('id'),
+        )
+        .order_by('cell')
+    )
+    return [
+        {
+            'geohash': row['cell'],
+            'count': row['count'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'min_price': row['min_price'],
+            'max_price': row['max_price'],
+            'listing_id': row['listing_id'] if row['count'] == 1 else None,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,437 @@
+"""
+Delta-sync ingestion of partner listing feeds (CSV or JSON Lines).
+
+Each record is matched on ``(realtor, external_id)`` and fingerprinted with a
+SHA-256 of its normalized content, stored in ``Listing.content_hash``. Records
+whose fingerprint matches the stored one are skipped; new and changed ones are
+written per chunk with ``bulk_create``/``bulk_update``. Feature names are
+resolved for the whole chunk at once, price changes are recorded as bulk
+``PriceHistory`` rows and the photo fields are mirrored to ``ListingPhoto``
+per chunk.
+
+Each chunk commits in its own transaction, so a large feed does not hold row
+locks for the whole run, and a failing chunk keeps the chunks committed before
+it (a re-run skips those as unchanged). A dry run writes every chunk in one
+transaction that is rolled back.
+
+The fingerprint describes the last ingested version of a record, not later
+edits made through the API or admin.
+
+Bulk writes bypass the model signals, so the search index, listing snapshot
+and cache versions are refreshed explicitly as each chunk commits.
+"""
+import csv
+import hashlib
+import io
+import json
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+from realtors.models import Realtor
+
+from .featurebits import free_bits, mask_of
+from .geo import encode_geohash
+from .metrics import price_per_sqft
+from .models import Listing, PriceHistory, PropertyCategory, PropertyFeature
+from .photos import sync_slot_photos
+
+FEED_FORMATS = ('csv', 'jsonl')
+
+# Listing fields a feed may set
+FEED_FIELDS = [
+    'title', 'address', 'city', 'state', 'zipcode', 'neighborhood', 'latitude', 'longitude',
+    'description', 'price', 'listing_type', 'property_type', 'bedrooms', 'bathrooms', 'garage',
+    'parking_spaces', 'sqft', 'lot_size', 'year_built', 'floors', 'fireplaces', 'heating', 'cooling',
+    'hoa_fee', 'property_taxes', 'photo_main', 'photo_1', 'photo_2', 'photo_3', 'photo_4',
+    'photo_5', 'photo_6', 'is_published', 'is_featured',
+]
+REQUIRED_FIELDS = ('title', 'address', 'city', 'state', 'zipcode', 'price', 'bedrooms', 'bathrooms', 'sqft')
+
+# Features in CSV feeds are one cell separated by these
+FEATURE_SEPARATORS = (';', '|')
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'f', 'no', 'n')
+
+
+class FeedError(Exception):
+    """A feed record that cannot be ingested"""
+
+
+class IngestReport:
+    """Counters for one ingestion run"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.price_changes = 0
+        self.features_created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + self.unchanged + self.failed
+
+    def error(self, line, external_id, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'external_id': external_id, 'error': message})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'processed': self.processed,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'price_changes': self.price_changes,
+            'features_created': self.features_created,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'records_per_second': round(self.processed / self.elapsed, 1) if self.elapsed else None,
+            'errors': self.errors,
+        }
+
+
+# ---- reading ----
+
+def read_feed(stream, feed_format):
+    """Yield ``(line number, record dict or FeedError)`` from a text stream"""
+    if feed_format == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            features = row.get('features') or ''
+            for separator in FEATURE_SEPARATORS:
+                features = features.replace(separator, FEATURE_SEPARATORS[0])
+            row['features'] = [name for name in features.split(FEATURE_SEPARATORS[0])]
+            yield line, row
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield line, FeedError(f'Invalid JSON: {exc}')
+            continue
+        yield line, record if isinstance(record, dict) else FeedError('Expected a JSON object')
+
+
+def open_feed(uploaded_file, feed_format):
+    """Text stream over an uploaded (binary) feed file"""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='' if feed_format == 'csv' else None)
+
+
+def guess_format(filename, default='jsonl'):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return default
+
+
+# ---- cleaning ----
+
+def _clean_value(field, value):
+    if isinstance(value, str):
+        value = value.strip()
+    if value in ('', None):
+        if not field.null and field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+        if field.blank:
+            return ''
+        raise ValidationError('This field is required.')
+    if isinstance(field, models.BooleanField) and isinstance(value, str):
+        lowered = value.lower()
+        if lowered in TRUE_VALUES:
+            return True
+        if lowered in FALSE_VALUES:
+            return False
+    value = field.clean(value, None)
+    if isinstance(field, models.DecimalField):
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def clean_record(record, default_realtor_id=None):
+    """
+    Validate a raw feed record into ``{'realtor_id', 'external_id', 'fields',
+    'features', 'category'}``; fields the feed omits take the model default.
+    """
+    external_id = str(record.get('external_id') or '').strip()
+    if not external_id:
+        raise FeedError('external_id is required')
+    if len(external_id) > Listing._meta.get_field('external_id').max_length:
+        raise FeedError('external_id is too long')
+
+    realtor_id = record.get('realtor') or record.get('realtor_id') or default_realtor_id
+    try:
+        realtor_id = int(realtor_id)
+    except (TypeError, ValueError):
+        raise FeedError('realtor is required (in the record or as the feed default)')
+
+    missing = [name for name in REQUIRED_FIELDS if record.get(name) in (None, '')]
+    if missing:
+        raise FeedError(f'Missing required fields: {", ".join(missing)}')
+
+    fields, problems = {}, []
+    for name in FEED_FIELDS:
+        field = Listing._meta.get_field(name)
+        try:
+            if name in record:
+                fields[name] = _clean_value(field, record[name])
+            else:
+                fields[name] = field.get_default() if field.has_default() else (None if field.null else '')
+        except ValidationError as exc:
+            problems.append(f'{name}: {" ".join(exc.messages)}')
+    if problems:
+        raise FeedError('; '.join(problems))
+
+    features = record.get('features') or []
+    if isinstance(features, str):
+        features = [features]
+    features = sorted({str(name).strip() for name in features if str(name).strip()})
+    category = str(record.get('category') or '').strip() or None
+
+    return {
+        'realtor_id': realtor_id,
+        'external_id': external_id,
+        'fields': fields,
+        'features': features,
+        'category': category,
+    }
+
+
+def content_hash(cleaned):
+    """SHA-256 over the normalized record content"""
+    payload = {
+        'fields': cleaned['fields'],
+        'features': cleaned['features'],
+        'category': cleaned['category'],
+    }
+    encoded = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+# ---- writing ----
+
+class FeedIngestor:
+    """Apply a stream of feed records to the catalog in chunks"""
+
+    def __init__(self, default_realtor_id=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.default_realtor_id = default_realtor_id
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.changed_ids = []
+
+    def ingest(self, records):
+        """Ingest ``(line, record)`` pairs and return an ``IngestReport``"""
+        report = IngestReport(dry_run=self.dry_run)
+        self.changed_ids = []
+        if self.dry_run:
+            with transaction.atomic():
+                self._ingest_chunks(records, report)
+                transaction.set_rollback(True)
+        else:
+            self._ingest_chunks(records, report)
+        report.finish()
+        return report
+
+    def _ingest_chunks(self, records, report):
+        chunk = []
+        for line, record in records:
+            chunk.append((line, record))
+            if len(chunk) >= self.chunk_size:
+                self._ingest_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._ingest_chunk(chunk, report)
+
+    def _ingest_chunk(self, chunk, report):
+        cleaned = {}
+        for line, record in chunk:
+            external_id = record.get('external_id') if isinstance(record, dict) else None
+            try:
+                if isinstance(record, FeedError):
+                    raise record
+                item = clean_record(record, self.default_realtor_id)
+            except FeedError as exc:
+                report.error(line, external_id, str(exc))
+                continue
+            item['line'] = line
+            item['hash'] = content_hash(item)
+            # A later record for the same listing in the chunk wins
+            cleaned[(item['realtor_id'], item['external_id'])] = item
+        if not cleaned:
+            return
+
+        with transaction.atomic():
+            changed_ids = self._write_chunk(self._check_references(cleaned, report), report)
+            if changed_ids:
+                transaction.on_commit(lambda: listings_bulk_changed(changed_ids))
+        self.changed_ids.extend(changed_ids)
+
+    def _write_chunk(self, items, report):
+        """Insert new and update changed listings; returns their IDs"""
+        existing = {
+            (listing.realtor_id, listing.external_id): listing
+            for listing in Listing.objects.filter(
+                realtor_id__in={item['realtor_id'] for item in items},
+                external_id__in={item['external_id'] for item in items},
+            ).only('id', 'realtor_id', 'external_id', 'content_hash', 'price')
+        }
+
+        now = timezone.now()
+        new, changed, price_events = [], [], []
+        for item in items:
+            listing = existing.get((item['realtor_id'], item['external_id']))
+            if listing is not None and listing.content_hash == item['hash']:
+                report.unchanged += 1
+                continue
+            if listing is None:
+                listing = Listing(realtor_id=item['realtor_id'], external_id=item['external_id'], list_date=now)
+                new.append((listing, item))
+            else:
+                old_price = listing.price
+                changed.append((listing, item))
+                if old_price != item['fields']['price']:
+                    event = 'price_increase' if item['fields']['price'] > old_price else 'price_decrease'
+                    price_events.append((listing, item['fields']['price'], event))
+            for name, value in item['fields'].items():
+                setattr(listing, name, value)
+            listing.category_id = self.categories.get(item['category'])
+            listing.content_hash = item['hash']
+            listing.updated_at = now
+            listing.geohash = (
+                encode_geohash(listing.latitude, listing.longitude)
+                if listing.latitude is not None and listing.longitude is not None else ''
+            )
+            listing.price_per_sqft = price_per_sqft(listing.price, listing.sqft)
+
+        if new:
+            Listing.objects.bulk_create([listing for listing, _ in new])
+            self._fill_missing_pks([listing for listing, _ in new])
+            price_events.extend((listing, listing.price, 'listed') for listing, _ in new)
+        if changed:
+            Listing.objects.bulk_update(
+                [listing for listing, _ in changed],
+                FEED_FIELDS + ['category', 'content_hash', 'updated_at', 'geohash', 'price_per_sqft'],
+            )
+        self._set_features(new + changed, report)
+        sync_slot_photos([listing for listing, _ in new + changed])
+        if price_events:
+            PriceHistory.objects.bulk_create([
+                PriceHistory(listing_id=listing.pk, price=price, event_type=event, notes='Partner feed')
+                for listing, price, event in price_events
+            ])
+            report.price_changes += sum(1 for _, _, event in price_events if event != 'listed')
+
+        report.inserted += len(new)
+        report.updated += len(changed)
+        return [listing.pk for listing, _ in new + changed]
+
+    def _check_references(self, cleaned, report):
+        """Drop records pointing at unknown realtors or categories (one query each)"""
+        realtor_ids = set(
+            Realtor.objects.filter(id__in={item['realtor_id'] for item in cleaned.values()}).values_list('id', flat=True)
+        )
+        slugs = {item['category'] for item in cleaned.values() if item['category']}
+        self.categories = dict(PropertyCategory.objects.filter(slug__in=slugs).values_list('slug', 'id')) if slugs else {}
+        self.categories[None] = None
+
+        items = []
+        for item in cleaned.values():
+            if item['realtor_id'] not in realtor_ids:
+                report.error(item['line'], item['external_id'], f'Unknown realtor {item["realtor_id"]}')
+            elif item['category'] not in self.categories:
+                report.error(item['line'], item['external_id'], f'Unknown category "{item["category"]}"')
+            else:
+                items.append(item)
+        return items
+
+    def _fill_missing_pks(self, listings):
+        """Backends that can't return IDs from bulk inserts need a lookup"""
+        missing = [listing for listing in listings if listing.pk is None]
+        if not missing:
+            return
+        ids = {
+            (realtor_id, external_id): pk
+            for pk, realtor_id, external_id in Listing.objects.filter(
+                realtor_id__in={listing.realtor_id for listing in missing},
+                external_id__in={listing.external_id for listing in missing},
+            ).values_list('id', 'realtor_id', 'external_id')
+        }
+        for listing in missing:
+            listing.pk = ids[(listing.realtor_id, listing.external_id)]
+
+    def _set_features(self, pairs, report):
+        """Resolve every feature name of the chunk at once and rewrite the links"""
+        if not pairs:
+            return
+        names = {name for _, item in pairs for name in item['features']}
+        features = {
+            name: (feature_id, bit)
+            for name, feature_id, bit in PropertyFeature.objects.filter(name__in=names).values_list('name', 'id', 'bit')
+        }
+        missing = names - set(features)
+        if missing:
+            # bulk_create skips the receiver that hands out mask bits
+            bits = free_bits(len(missing)) + [None] * len(missing)
+            PropertyFeature.objects.bulk_create(
+                [PropertyFeature(name=name, bit=bit) for name, bit in zip(sorted(missing), bits)],
+                ignore_conflicts=True,
+            )
+            features.update(
+                (name, (feature_id, bit))
+                for name, feature_id, bit in PropertyFeature.objects.filter(name__in=missing).values_list('name', 'id', 'bit')
+            )
+            report.features_created += len(missing)
+
+        through = Listing.features.through
+        through.objects.filter(listing_id__in=[listing.pk for listing, _ in pairs]).delete()
+        through.objects.bulk_create([
+            through(listing_id=listing.pk, propertyfeature_id=features[name][0])
+            for listing, item in pairs for name in item['features']
+        ])
+        # The through table was written in bulk, so the masks are set here rather than by m2m_changed
+        for listing, item in pairs:
+            listing.feature_mask = mask_of(features[name][1] for name in item['features'])
+        Listing.objects.bulk_update([listing for listing, _ in pairs], ['feature_mask'])
+
+
+def listings_bulk_changed(listing_ids):
+    """Bring in-process indexes and caches up to date after bulk writes"""
+    from .cache import bump_cache_version
+    from .search import get_search_backend
+    from .snapshot import get_listing_snapshot
+
+    get_search_backend().listings_bulk_saved(listing_ids)
+    snapshot = get_listing_snapshot()
+    if snapshot is not None:
+        snapshot.mark_stale()
+    bump_cache_version('listings')
+
+
+def ingest_feed(stream, feed_format, default_realtor_id=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Read and ingest a feed stream; returns an ``IngestReport``"""
+    ingestor = FeedIngestor(default_realtor_id=default_realtor_id, chunk_size=chunk_size, dry_run=dry_run)
+    return ingestor.ingest(read_feed(stream, feed_format))
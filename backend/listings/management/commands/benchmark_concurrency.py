@@ -0,0 +1,260 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.error import URLError
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.benchmarks import percentile, seed_listings
+from listings.models import Listing
+
+# Anonymous read traffic, spread evenly over these paths
+DEFAULT_PATHS = [
+    '/api/listings/',
+    '/api/listings/?ordering=price&limit=24',
+    '/api/listings/{listing_id}/',
+    '/api/listings/featured/',
+    '/api/listings/search/?city=Lekki&ordering=-price',
+    '/api/realtors/',
+    '/api/health/',
+]
+
+# core.wsgi / core.asgi, wrapped to honour BENCHMARK_DB_LATENCY_MS
+SERVERS = {
+    # Sync DRF views under gunicorn's default sync workers, as in the Dockerfile
+    'wsgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'listings.benchmarks:wsgi_application()', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--backlog', '2048', '--log-level', 'warning',
+    ],
+    # Async read views under uvicorn (core.asgi enables ASYNC_READ_VIEWS)
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'listings.benchmarks:asgi_application', '--factory',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+        '--backlog', '2048', '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+REQUEST_TIMEOUT = 30
+
+
+async def http_get(reader, writer, host, path):
+    """One HTTP/1.1 GET on an open connection; returns ``(status, keep_alive)``"""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed by server')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+async def client(address, paths, offset, deadline, results):
+    """One simulated user issuing requests back to back over a reused connection"""
+    host, port = address
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            status, keep_alive = await asyncio.wait_for(http_get(reader, writer, host, path), REQUEST_TIMEOUT)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            results['errors'] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+            continue
+        results['latencies'].append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            results['errors'] += 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(address, paths, concurrency, duration):
+    results = {'latencies': [], 'errors': 0}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[client(address, paths, index, deadline, results) for index in range(concurrency)])
+    results['elapsed'] = time.perf_counter() - started
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'Server exited with code {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/health/', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (URLError, OSError):
+            pass
+        time.sleep(0.25)
+    raise CommandError(f'Server at {base_url} did not become healthy within {timeout}s')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and latency of the WSGI (gunicorn, sync views) and ASGI '
+        '(uvicorn, async read views) serving modes under concurrent anonymous read load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers',
+            nargs='+',
+            choices=sorted(SERVERS),
+            default=['wsgi', 'asgi'],
+            help='Serving modes to start and benchmark (default: wsgi asgi)'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Benchmark an already running server instead of starting them, e.g. http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[50, 100, 250, 500],
+            help='Concurrent connections per run (default: 50 100 250 500)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds of load per concurrency level (default: 10)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Worker processes per server (default: 2, like a free-tier instance)'
+        )
+        parser.add_argument(
+            '--path',
+            dest='paths',
+            action='append',
+            help='Request path to include (repeatable; default: the hot listing/realtor read endpoints)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic listings for the run and delete them afterwards'
+        )
+        parser.add_argument(
+            '--db-latency-ms',
+            type=float,
+            default=0,
+            help='Add this much latency to every query in the servers, to mimic a remote database (default: 0)'
+        )
+        parser.add_argument(
+            '--no-response-cache',
+            action='store_true',
+            help='Start the servers with API_RESPONSE_CACHE_SECONDS=0 so every request hits the database'
+        )
+
+    def handle(self, *args, **options):
+        realtor = None
+        if options['seed']:
+            self.stdout.write(f"Seeding {options['seed']} synthetic listings...")
+            realtor = seed_listings(options['seed'])
+        try:
+            paths = self.get_paths(options['paths'])
+            if options['base_url']:
+                self.benchmark('external', options['base_url'], paths, options)
+            else:
+                for server in options['servers']:
+                    self.benchmark_server(server, paths, options)
+        finally:
+            if realtor is not None:
+                Listing.objects.filter(realtor=realtor).delete()
+                realtor.delete()
+
+    def get_paths(self, paths):
+        paths = paths or DEFAULT_PATHS
+        listing = Listing.objects.filter(is_published=True).order_by('-id').only('id').first()
+        if listing is None:
+            paths = [path for path in paths if '{listing_id}' not in path]
+            self.stdout.write(self.style.WARNING('⚠️ No published listings, consider --seed'))
+        return [path.format(listing_id=listing.id) if listing else path for path in paths]
+
+    def benchmark_server(self, server, paths, options):
+        port = free_port()
+        env = {
+            **os.environ,
+            'ASYNC_READ_VIEWS': 'True' if server == 'asgi' else 'False',
+            'ALLOWED_HOSTS': '127.0.0.1,localhost',
+        }
+        if options['no_response_cache']:
+            env['API_RESPONSE_CACHE_SECONDS'] = '0'
+        if options['db_latency_ms']:
+            env['BENCHMARK_DB_LATENCY_MS'] = str(options['db_latency_ms'])
+        process = subprocess.Popen(SERVERS[server](port, options['workers']), cwd=settings.BASE_DIR, env=env)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            wait_until_ready(base_url, process)
+            self.benchmark(server, base_url, paths, options)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def benchmark(self, label, base_url, paths, options):
+        url = urlsplit(base_url)
+        address = (url.hostname, url.port or 80)
+        # Warm per-worker caches, indexes and connections before measuring
+        asyncio.run(run_load(address, paths, max(options['workers'] * 4, len(paths)), min(3, options['duration'])))
+
+        self.stdout.write('')
+        self.stdout.write(f"{label} ({options['workers']} workers) {base_url}")
+        for concurrency in options['concurrency']:
+            results = asyncio.run(run_load(address, paths, concurrency, options['duration']))
+            latencies = results['latencies']
+            self.stdout.write(
+                f"  c={concurrency:<5} {len(latencies) / results['elapsed']:9.1f} req/s  "
+                f"p50={percentile(latencies, 50):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms  "
+                f"errors={results['errors']}"
+            )
@@ -0,0 +1,96 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.http import QueryDict
+
+from listings.benchmarks import format_summary, seed_listing_features, seed_listings, throwaway_data, timed
+from listings.featurebits import filter_features
+from listings.models import Listing
+from listings.snapshot import ListingSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark multi-feature AND filters on synthetic data: a join per feature, GROUP BY ... HAVING COUNT, '
+        'the feature_mask bitwise predicate and the snapshot bitmap'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--listings', type=int, default=100000,
+            help='Synthetic listings to seed (default: 100000)'
+        )
+        parser.add_argument(
+            '--features', type=int, default=50,
+            help='Synthetic features to seed (default: 50)'
+        )
+        parser.add_argument(
+            '--queries', type=int, default=100,
+            help='Number of timed queries per path (default: 100)'
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=12,
+            help='Rows fetched per query, like one API page (default: 12)'
+        )
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        with throwaway_data():
+            self.stdout.write(f"Seeding {options['listings']} listings x {options['features']} features...")
+            features, elapsed = timed(self.seed, options['listings'], options['features'])
+            self.stdout.write(f'Seeded in {elapsed / 1000:.1f}s')
+            published = Listing.objects.filter(is_published=True).order_by('-list_date', '-id')
+
+            snapshot = ListingSnapshot(refresh_interval=3600)
+            _, elapsed = timed(snapshot.rebuild)
+            self.stdout.write(f'Built snapshot over {len(snapshot.ensure_fresh())} listings in {elapsed:.0f}ms')
+
+            def page(queryset):
+                return queryset.count(), [listing.id for listing in queryset[:page_size]]
+
+            def joins(ids):
+                queryset = published
+                for feature_id in ids:
+                    queryset = queryset.filter(features=feature_id)
+                return page(queryset)
+
+            def having(ids):
+                return page(
+                    published.filter(features__in=ids).annotate(matched=Count('features')).filter(matched=len(ids))
+                )
+
+            def bitmask(ids):
+                return page(filter_features(published, {'features': ','.join(map(str, ids))}))
+
+            def columnar(ids):
+                params = QueryDict(mutable=True)
+                params['features'] = ','.join(map(str, ids))
+                selection = snapshot.select(params, Listing.objects.all())
+                return selection.count(), [listing.id for listing in selection[:page_size]]
+
+            paths = [
+                ('join per feature', joins), ('GROUP BY / HAVING', having),
+                ('feature_mask predicate', bitmask), ('snapshot bitmap', columnar),
+            ]
+            timings = {label: [] for label, _ in paths}
+            rng = random.Random(options['features'])
+            for _ in range(options['queries']):
+                ids = [feature.pk for feature in rng.sample(features, rng.randint(2, 4))]
+                results = []
+                for label, path in paths:
+                    result, elapsed = timed(path, ids)
+                    timings[label].append(elapsed)
+                    results.append(result)
+                if any(result != results[0] for result in results):
+                    raise CommandError(f'Paths disagree for features {ids}: {results}')
+
+            self.stdout.write('')
+            self.stdout.write(f"{options['listings']} listings, {options['features']} features, 2-4 features per query")
+            for label, _ in paths:
+                self.stdout.write(format_summary(label, timings[label]))
+
+    def seed(self, listing_count, feature_count):
+        realtor = seed_listings(listing_count)
+        listing_ids = list(Listing.objects.filter(realtor=realtor).values_list('id', flat=True))
+        return seed_listing_features(listing_ids, feature_count)
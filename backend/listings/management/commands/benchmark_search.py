@@ -0,0 +1,94 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from listings.benchmarks import format_summary, seed_listings, throwaway_data, timed
+from listings.models import Listing
+from listings.search import InMemorySearchBackend, PostgresSearchBackend
+
+QUERIES = [
+    'lekki', 'luxury lekki', 'pool', 'swimming pool', 'waterfront villa', 'ikeja apartment',
+    'serviced apartment abuja', 'penthouse', 'gated estate security', 'maitama',
+    'port harcourt house', '4 bedroom', 'rooftop terrace', 'admiralty', 'furnished loft',
+    'executive duplex', 'smart home', 'victoria island condo', 'enugu', 'airport',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ranked listing search against the legacy icontains scan on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--listings',
+            type=int,
+            default=100000,
+            help='Number of synthetic listings to seed (default: 100000)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of timed queries per path (default: 200)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['memory', 'postgres'],
+            default='memory',
+            help='Search engine to benchmark (default: memory)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=15,
+            help='Rows fetched per query, like one results page (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        engine = options['engine']
+        if engine == 'postgres' and connection.vendor != 'postgresql':
+            raise CommandError('The postgres engine needs DATABASE_URL pointing at PostgreSQL')
+
+        rng = random.Random(7)
+        queries = [rng.choice(QUERIES) for _ in range(options['queries'])]
+        page_size = options['page_size']
+
+        with throwaway_data():
+            self.stdout.write(f"Seeding {options['listings']} synthetic listings...")
+            _, elapsed = timed(seed_listings, options['listings'])
+            self.stdout.write(f'Seeded in {elapsed / 1000:.1f}s')
+
+            if engine == 'memory':
+                backend = InMemorySearchBackend(refresh_interval=3600)
+                _, elapsed = timed(backend.rebuild)
+                self.stdout.write(f'Built in-memory index over {len(backend)} listings in {elapsed:.0f}ms')
+            else:
+                backend = PostgresSearchBackend()
+                from listings.search import build_search_vector
+                Listing.objects.update(search_vector=build_search_vector())
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE listings_listing')
+
+            published = Listing.objects.filter(is_published=True)
+            legacy, ranked = [], []
+            for query in queries:
+                legacy_qs = published.filter(
+                    Q(title__icontains=query) |
+                    Q(description__icontains=query) |
+                    Q(address__icontains=query) |
+                    Q(city__icontains=query) |
+                    Q(state__icontains=query)
+                ).order_by('-list_date')
+                _, elapsed = timed(lambda: (legacy_qs.count(), list(legacy_qs[:page_size])))
+                legacy.append(elapsed)
+
+                def run_ranked():
+                    ranked_qs = backend.search(published, query).order_by('-search_rank', '-list_date')
+                    return ranked_qs.count(), list(ranked_qs[:page_size])
+                _, elapsed = timed(run_ranked)
+                ranked.append(elapsed)
+
+        self.stdout.write('')
+        self.stdout.write(format_summary('icontains (legacy)', legacy))
+        self.stdout.write(format_summary(f'{engine} ranked', ranked))
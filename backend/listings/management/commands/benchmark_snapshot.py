@@ -0,0 +1,99 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from listings.benchmarks import CITIES, PROPERTY_TYPES, format_summary, seed_listings, throwaway_data, timed
+from listings.snapshot import ListingSnapshot
+from listings.views import ListingListAPIView
+
+
+def random_params(rng):
+    """A filter/sort combination like the listing page sends"""
+    params = {}
+    if rng.random() < 0.6:
+        low = rng.randint(40, 1500) * 100000
+        params['min_price'] = str(low)
+        if rng.random() < 0.7:
+            params['max_price'] = str(low + rng.randint(50, 800) * 100000)
+    if rng.random() < 0.3:
+        params['min_sqft'] = str(rng.randint(450, 4000))
+    if rng.random() < 0.4:
+        params['property_type'] = rng.choice(PROPERTY_TYPES)
+    if rng.random() < 0.3:
+        params['listing_type'] = rng.choice(['sale', 'rent'])
+    if rng.random() < 0.3:
+        params['city'] = rng.choice(CITIES)[0]
+    if rng.random() < 0.2:
+        params['bedrooms'] = str(rng.randint(1, 6))
+    params['ordering'] = rng.choice(['-list_date', 'price', '-price', 'sqft', '-sqft'])
+    return params
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the columnar listing snapshot against the ORM filter/sort path on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='Catalog sizes to benchmark, seeded cumulatively (default: 10000 100000 1000000)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of timed queries per path and size (default: 200)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=12,
+            help='Rows hydrated per query, like one API page (default: 12)'
+        )
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        factory = APIRequestFactory()
+
+        with throwaway_data():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                if size > seeded:
+                    self.stdout.write(f'Seeding {size - seeded} more synthetic listings...')
+                    _, elapsed = timed(seed_listings, size - seeded, seed=size)
+                    self.stdout.write(f'Seeded in {elapsed / 1000:.1f}s')
+                    seeded = size
+
+                snapshot = ListingSnapshot(refresh_interval=3600)
+                _, elapsed = timed(snapshot.rebuild)
+                self.stdout.write(f'Built snapshot over {len(snapshot.ensure_fresh())} listings in {elapsed:.0f}ms')
+
+                rng = random.Random(size)
+                orm, columnar = [], []
+                for _ in range(options['queries']):
+                    view = ListingListAPIView()
+                    view.args, view.kwargs, view.format_kwarg = (), {}, None
+                    view.request = view.initialize_request(factory.get('/', random_params(rng)))
+
+                    def run_orm():
+                        with override_settings(LISTING_SNAPSHOT_ENABLED=False):
+                            queryset = view.filter_queryset(view.get_queryset())
+                        return queryset.count(), list(queryset[:page_size])
+                    _, elapsed = timed(run_orm)
+                    orm.append(elapsed)
+
+                    def run_snapshot():
+                        selection = snapshot.select(view.request.query_params, view.get_queryset())
+                        return selection.count(), list(selection[:page_size])
+                    _, elapsed = timed(run_snapshot)
+                    columnar.append(elapsed)
+
+                self.stdout.write('')
+                self.stdout.write(f'{size} listings')
+                self.stdout.write(format_summary('ORM filter + page', orm))
+                self.stdout.write(format_summary('snapshot mask + hydrate', columnar))
+                self.stdout.write('')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.similar import compute_similar_listings, similar_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the "similar listings" neighbour table for listings changed since the last run '
+        '(run it from cron, e.g. hourly)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every listing instead of only the changed ones'
+        )
+        parser.add_argument(
+            '-k',
+            type=int,
+            default=None,
+            help=f'Neighbours per listing (default: SIMILAR_LISTINGS_COUNT, {similar_count()})'
+        )
+
+    def handle(self, *args, **options):
+        if options['k'] is not None and options['k'] < 1:
+            raise CommandError('-k must be at least 1')
+        report = compute_similar_listings(full=options['full'], k=options['k'])
+        mode = 'Full run' if report['full'] else 'Incremental run'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {mode} in {report['elapsed_seconds']}s: {report['listings']} listings encoded, "
+            f"{report['changed']} changed, {report['recomputed']} neighbour lists recomputed"
+        ))
@@ -0,0 +1,129 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from listings.benchmarks import seed_listings, throwaway_data
+from listings.models import Listing
+from listings.views import FeaturedListingsAPIView, ListingListAPIView, SearchListingsAPIView
+
+# (label, view, query params) - run through the view's own get_queryset/filter_queryset
+VIEW_CASES = [
+    ('list: newest first', ListingListAPIView, {}),
+    ('list: price range', ListingListAPIView, {'min_price': '20000000', 'max_price': '60000000'}),
+    ('list: sqft range by sqft', ListingListAPIView, {'min_sqft': '1500', 'max_sqft': '3000', 'ordering': 'sqft'}),
+    ('list: cheapest first', ListingListAPIView, {'ordering': 'price'}),
+    ('list: property + listing type', ListingListAPIView, {'property_type': 'villa', 'listing_type': 'sale'}),
+    ('list: type + price range', ListingListAPIView, {'property_type': 'apartment', 'listing_type': 'rent', 'max_price': '30000000'}),
+    ('list: city', ListingListAPIView, {'city': 'Lekki'}),
+    ('search: price + sqft range', SearchListingsAPIView, {'min_price': '10000000', 'max_sqft': '2000'}),
+    ('search: map bbox', SearchListingsAPIView, {'bbox': '3.35,6.40,3.50,6.50'}),
+    ('search: near point', SearchListingsAPIView, {'near': '6.4698,3.5852', 'radius_km': '3'}),
+    ('featured', FeaturedListingsAPIView, {}),
+]
+
+# Querysets built outside DRF views, mirroring the legacy endpoints
+QUERYSET_CASES = [
+    ('legacy search: city/state iexact', lambda: Listing.objects.filter(
+        is_published=True, city__iexact='lagos', state__iexact='lagos',
+    ).order_by('-list_date')),
+    ('legacy featured', lambda: Listing.objects.filter(
+        is_published=True, is_featured=True,
+    ).order_by('-list_date')),
+]
+
+
+def sequential_scans(plan, table):
+    """Return plan lines where ``table`` is read without an index"""
+    if connection.vendor == 'postgresql':
+        pattern = re.compile(rf'Seq Scan on {table}\b')
+    else:
+        # SQLite: "SCAN t" is a full scan, "SCAN t USING [COVERING] INDEX i" walks an index
+        pattern = re.compile(rf'\bSCAN (TABLE )?{table}\b(?! USING)')
+    return [line.strip() for line in plan.splitlines() if pattern.search(line)]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the canonical listing queries on synthetic data and report sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--listings',
+            type=int,
+            default=20000,
+            help='Synthetic listings to seed before explaining (default: 20000)'
+        )
+        parser.add_argument(
+            '--no-seed',
+            action='store_true',
+            help='Explain against the existing data instead of a synthetic dataset'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=12,
+            help='LIMIT applied to each query, like one API page (default: 12)'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan for every query'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Exit with an error if any query falls back to a sequential scan'
+        )
+
+    def handle(self, *args, **options):
+        if options['no_seed']:
+            failures = self.explain_all(options)
+        else:
+            with throwaway_data():
+                self.stdout.write(f"Seeding {options['listings']} synthetic listings...")
+                seed_listings(options['listings'])
+                failures = self.explain_all(options)
+
+        self.stdout.write('=' * 50)
+        if failures:
+            message = f'{len(failures)} listing query(ies) fall back to sequential scans: {", ".join(failures)}'
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('All canonical listing queries use indexes'))
+
+    def canonical_querysets(self):
+        factory = APIRequestFactory()
+        for label, view_class, params in VIEW_CASES:
+            view = view_class()
+            view.args, view.kwargs, view.format_kwarg = (), {}, None
+            view.request = view.initialize_request(factory.get('/', params))
+            # EXPLAIN the ORM path, not the in-memory listing snapshot
+            with override_settings(LISTING_SNAPSHOT_ENABLED=False):
+                yield label, view.filter_queryset(view.get_queryset())
+        for label, build in QUERYSET_CASES:
+            yield label, build()
+
+    def explain_all(self, options):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        table = Listing._meta.db_table
+        failures = []
+        for label, queryset in self.canonical_querysets():
+            plan = queryset[:options['page_size']].explain()
+            scans = sequential_scans(plan, table)
+            if scans:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'❌ {label}: sequential scan'))
+                for line in scans:
+                    self.stdout.write(f'     {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ {label}'))
+            if options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'     {line}')
+        return failures
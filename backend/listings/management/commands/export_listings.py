@@ -0,0 +1,61 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.export import EXPORT_FORMATS, export_lines
+from listings.views import ListingExportAPIView, view_queryset
+
+
+class Command(BaseCommand):
+    help = 'Stream listings as CSV or JSON Lines, with the same filters as the search endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            dest='export_format',
+            choices=sorted(EXPORT_FORMATS),
+            default='csv',
+            help='Output format (default: csv)'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to (default: stdout)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Include unpublished listings'
+        )
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='PARAM=VALUE',
+            help='Search filter, e.g. --filter city=Lekki --filter min_price=20000000 (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep or not key:
+                raise CommandError(f'Invalid --filter "{item}", expected PARAM=VALUE')
+            params[key] = value
+        if options['all']:
+            params['include_unpublished'] = '1'
+
+        # Build the queryset through the export view so filters behave exactly like the API
+        queryset = view_queryset(ListingExportAPIView, params)
+
+        stream = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        count = -1 if options['export_format'] == 'csv' else 0  # don't count the CSV header
+        try:
+            for line in export_lines(queryset, options['export_format']):
+                stream.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                stream.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Exported {count} listings to {options['output']}"))
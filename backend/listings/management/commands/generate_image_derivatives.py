@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.derivatives import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate thumbnail/medium/large WebP variants for listing photos and uploaded images that have none yet '
+        '(safe to re-run or interrupt; run it from cron or after uploads)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Encoder processes (default: one per CPU; 0 encodes in this process)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Images read, encoded and recorded per committed batch (default: 50)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after about this many images'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry images that failed before'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 0:
+            raise CommandError('--workers cannot be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        report = generate_derivatives(
+            workers=options['workers'], batch_size=options['batch_size'],
+            retry_failed=options['retry_failed'], limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {report['images']} images in {report['elapsed_seconds']}s "
+            f"({report['images_per_second']} images/sec): {report['variants']} variants written, "
+            f"{report['failed']} failed, {report['rows']} rows updated"
+        ))
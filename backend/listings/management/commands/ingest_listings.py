@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.ingest import DEFAULT_CHUNK_SIZE, FEED_FORMATS, guess_format, ingest_feed
+
+
+class Command(BaseCommand):
+    help = 'Delta-sync listings from a partner feed (CSV or JSON Lines); unchanged records are skipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Feed file to ingest'
+        )
+        parser.add_argument(
+            '--format',
+            dest='feed_format',
+            choices=FEED_FORMATS,
+            help='Feed format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--realtor',
+            type=int,
+            help='Realtor ID for records that do not name one'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Records written per batch (default: {DEFAULT_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without saving anything'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        feed_format = options['feed_format'] or guess_format(options['path'], default=None)
+        if feed_format is None:
+            raise CommandError('Cannot tell the feed format from the file name, pass --format')
+
+        try:
+            stream = open(options['path'], encoding='utf-8-sig', newline='' if feed_format == 'csv' else None)
+        except OSError as exc:
+            raise CommandError(f'Cannot open feed: {exc}')
+        with stream:
+            report = ingest_feed(
+                stream, feed_format, default_realtor_id=options['realtor'],
+                chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            )
+
+        summary = report.as_dict()
+        prefix = '🧪 Dry run: ' if report.dry_run else '✅ '
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['processed']} records in {summary['elapsed_seconds']}s "
+            f"({summary['records_per_second']} records/s): "
+            f"{summary['inserted']} inserted, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['failed']} failed"
+        ))
+        self.stdout.write(
+            f"   {summary['price_changes']} price changes recorded, {summary['features_created']} new features"
+        )
+        for error in summary['errors']:
+            self.stdout.write(self.style.WARNING(
+                f"   ⚠️ line {error['line']} ({error['external_id'] or 'no external_id'}): {error['error']}"
+            ))
+        if report.failed > len(summary['errors']):
+            self.stdout.write(self.style.WARNING(f"   ... and {report.failed - len(summary['errors'])} more errors"))
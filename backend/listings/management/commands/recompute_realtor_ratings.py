@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.cache import bump_cache_version
+from listings.ratings import recompute_realtor_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild realtor average ratings, review counts and star histograms from the reviews '
+        '(one grouped query), e.g. after bulk edits that bypass the review signals'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--realtor',
+            type=int,
+            action='append',
+            dest='realtor_ids',
+            help='Only rebuild this realtor (repeatable; default: all realtors)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = recompute_realtor_ratings(options['realtor_ids'])
+        if changed:
+            bump_cache_version('realtors')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Recomputed realtor ratings in {time.perf_counter() - started:.2f}s: {changed} realtors corrected'
+        ))
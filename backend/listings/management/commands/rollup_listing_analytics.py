@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.rollups import rollup_listing_analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll listing views, saves, inquiries and tours recorded since the last run up into '
+        'hourly and daily per-listing buckets (run it from cron, e.g. every 15 minutes)'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        report = rollup_listing_analytics()
+        elapsed = time.perf_counter() - started
+
+        rows = ', '.join(f'{count} {source}' for source, count in report['rows'].items()) or 'nothing new'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rolled up to {report['until']:%Y-%m-%d %H:%M:%S} in {elapsed:.2f}s: {rows}"
+        ))
+        self.stdout.write(
+            f"   {report['buckets_created']} buckets created, {report['buckets_updated']} updated"
+        )
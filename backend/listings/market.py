@@ -0,0 +1,154 @@
+"""
+Market statistics for the insights and analytics pages.
+
+``compute_market_stats`` pulls the published listings once with
+``values_list`` and groups them by city, neighbourhood and/or property type
+in NumPy. Every listing is sorted once by (group, value), so the percentiles
+of all groups come from index arithmetic on the sorted array (the same linear
+interpolation as ``numpy.percentile``), and counts and means come from
+``bincount``. ``get_market_stats`` caches each grouping and filter set for
+``MARKET_STATS_CACHE_SECONDS`` until the listing cache version changes.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import versioned_key
+
+GROUPINGS = ('city', 'neighborhood', 'property_type')
+FILTERS = ('listing_type', 'city', 'state', 'property_type')
+PRICE_PERCENTILES = (10, 25, 50, 75, 90)
+PRICE_PER_SQFT_PERCENTILES = (25, 50, 75)
+
+
+def parse_group_by(raw):
+    """``city,property_type`` -> ('city', 'property_type'); defaults to city"""
+    group_by = tuple(dict.fromkeys(part.strip() for part in (raw or 'city').split(',') if part.strip()))
+    if not group_by or any(field not in GROUPINGS for field in group_by):
+        raise ValidationError({'group_by': f'Expected a comma-separated subset of: {", ".join(GROUPINGS)}'})
+    return group_by
+
+
+def group_percentiles(codes, values, group_count, percentiles):
+    """
+    ``{percentile: array per group}`` (NaN for empty groups) from one sort of
+    all values by (group, value).
+    """
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ordered = values[np.lexsort((values, codes))]
+    result = {}
+    for percentile in percentiles:
+        position = starts + (np.maximum(counts, 1) - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        if len(ordered):
+            lower = np.minimum(lower, len(ordered) - 1)
+            upper = np.minimum(upper, len(ordered) - 1)
+            low, high = ordered[lower], ordered[upper]
+            value = low + (high - low) * (position - lower)
+        else:
+            value = np.zeros(group_count)
+        result[percentile] = np.where(counts > 0, value, np.nan)
+    return result
+
+
+def _number(value, digits=2):
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def _percentile_key(percentile):
+    return 'median' if percentile == 50 else f'p{percentile}'
+
+
+def summarize_groups(codes, group_count, prices, price_per_sqft, days_on_market):
+    """Per-group stat dicts, in group code order"""
+    counts = np.bincount(codes, minlength=group_count)
+    safe_counts = np.maximum(counts, 1)
+    mean_price = np.bincount(codes, weights=prices, minlength=group_count) / safe_counts
+    mean_days = np.bincount(codes, weights=days_on_market, minlength=group_count) / safe_counts
+    price_min = np.full(group_count, np.inf)
+    np.minimum.at(price_min, codes, prices)
+    price_max = np.full(group_count, -np.inf)
+    np.maximum.at(price_max, codes, prices)
+    price_points = group_percentiles(codes, prices, group_count, PRICE_PERCENTILES)
+
+    # Listings without a floor area have no price per sqft
+    sized = price_per_sqft > 0
+    ppsf_points = group_percentiles(codes[sized], price_per_sqft[sized], group_count, PRICE_PER_SQFT_PERCENTILES)
+    sized_counts = np.bincount(codes[sized], minlength=group_count)
+
+    stats = []
+    for code in range(group_count):
+        price = {'min': _number(price_min[code], 0)}
+        price.update((_percentile_key(p), _number(points[code])) for p, points in price_points.items())
+        price.update({'max': _number(price_max[code], 0), 'mean': _number(mean_price[code])})
+        per_sqft = {_percentile_key(p): _number(points[code]) for p, points in ppsf_points.items()}
+        per_sqft['count'] = int(sized_counts[code])
+        stats.append({
+            'count': int(counts[code]),
+            'price': price,
+            'price_per_sqft': per_sqft,
+            'avg_days_on_market': _number(mean_days[code], 1) if counts[code] else None,
+        })
+    return stats
+
+
+def compute_market_stats(group_by=('city',), filters=None):
+    """
+    Stats per ``group_by`` value combination plus an ``overall`` row for the
+    published listings matching ``filters`` (exact field values).
+    """
+    from .models import Listing
+
+    rows = list(
+        Listing.objects.filter(is_published=True, **(filters or {})).order_by().values_list(
+            *group_by, 'price', 'sqft', 'list_date',
+        )
+    )
+    width = len(group_by)
+    groups = {}
+    codes = np.fromiter(
+        (groups.setdefault(row[:width], len(groups)) for row in rows), dtype=np.int64, count=len(rows),
+    )
+    prices = np.fromiter((row[width] for row in rows), dtype=np.float64, count=len(rows))
+    sqft = np.fromiter((row[width + 1] for row in rows), dtype=np.float64, count=len(rows))
+    # Unrounded, from the integer columns (no Decimal conversion per row)
+    price_per_sqft = np.divide(prices, sqft, out=np.zeros_like(prices), where=sqft > 0)
+    # Same day arithmetic as Listing.days_on_market
+    today = timezone.now().astimezone(dt_timezone.utc).date().toordinal()
+    days_on_market = np.fromiter(
+        (today - row[width + 2].astimezone(dt_timezone.utc).date().toordinal() for row in rows),
+        dtype=np.float64, count=len(rows),
+    )
+
+    per_group = summarize_groups(codes, len(groups), prices, price_per_sqft, days_on_market)
+    overall = summarize_groups(np.zeros(len(rows), dtype=np.int64), 1, prices, price_per_sqft, days_on_market)[0]
+    results = [
+        {**{field: value or None for field, value in zip(group_by, key)}, **stats}
+        for key, stats in zip(groups, per_group)
+    ]
+    results.sort(key=lambda row: (-row['count'], [str(row[field] or '') for field in group_by]))
+    return {
+        'group_by': list(group_by),
+        'filters': filters or {},
+        'generated_at': datetime.now(dt_timezone.utc).isoformat(),
+        'overall': overall,
+        'groups': results,
+    }
+
+
+def get_market_stats(query_params):
+    """Cached ``compute_market_stats`` for the ``group_by`` and filter query params"""
+    group_by = parse_group_by(query_params.get('group_by'))
+    filters = {field: query_params[field].strip() for field in FILTERS if (query_params.get(field) or '').strip()}
+    key = versioned_key('market-stats', ['listings'], ','.join(group_by), sorted(filters.items()))
+    result = cache.get(key)
+    if result is None:
+        result = compute_market_stats(group_by, filters)
+        cache.set(key, result, getattr(settings, 'MARKET_STATS_CACHE_SECONDS', 900))
+    return result
@@ -0,0 +1,107 @@
+"""
+Market metrics for filtering and sorting: price per sqft and days on market.
+
+``price_per_sqft`` is a stored column on ``Listing``, kept in step by a
+``pre_save`` receiver and the feed ingestor (which bypasses signals), with a
+partial ``(price_per_sqft, id)`` index like the other sort keys. Django 4.2
+has no ``GeneratedField``, so the column is maintained rather than generated.
+
+``days_on_market`` is ``today - list_date`` and would go stale every midnight
+if stored. Its filters become ``list_date`` bounds and its ordering becomes
+the reverse ``list_date`` ordering, both served by ``listing_pub_recent_idx``.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+CENTS = Decimal('0.01')
+
+# Orderings on derived values -> the stored column ordering they equal
+ORDERING_ALIASES = {
+    'days_on_market': '-list_date',
+    '-days_on_market': 'list_date',
+}
+
+PRICE_PER_SQFT_PARAMS = {'min_ppsf': 'gte', 'max_ppsf': 'lte'}
+DAYS_ON_MARKET_PARAMS = ('min_days_on_market', 'max_days_on_market')
+METRIC_PARAMS = tuple(PRICE_PER_SQFT_PARAMS) + DAYS_ON_MARKET_PARAMS
+
+
+def price_per_sqft(price, sqft):
+    """Price per square foot rounded to cents, 0 without a floor area"""
+    if not sqft or sqft <= 0 or price is None:
+        return Decimal('0.00')
+    return (Decimal(price) / Decimal(sqft)).quantize(CENTS, ROUND_HALF_UP)
+
+
+def resolve_ordering(term):
+    """Map a ``days_on_market`` ordering term to its ``list_date`` equivalent"""
+    return ORDERING_ALIASES.get(term, term)
+
+
+def parse_price_per_sqft(raw, param):
+    try:
+        value = Decimal(raw)
+    except (InvalidOperation, TypeError):
+        value = None
+    if value is None or not value.is_finite() or value < 0:
+        raise ValidationError({param: 'Expected a non-negative number.'})
+    return value
+
+
+def parse_days(raw, param):
+    try:
+        days = int(raw)
+    except (TypeError, ValueError):
+        days = -1
+    if days < 0:
+        raise ValidationError({param: 'Expected a non-negative whole number of days.'})
+    return days
+
+
+def listed_on_or_after(days):
+    """Earliest ``list_date`` with at most ``days`` days on market"""
+    day = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=days)
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def list_date_bounds(query_params):
+    """
+    ``(after, before)`` from the days-on-market params: listings with
+    ``after <= list_date < before`` match, either side may be None.
+    """
+    after = before = None
+    value = query_params.get('max_days_on_market')
+    if value:
+        after = listed_on_or_after(parse_days(value, 'max_days_on_market'))
+    value = query_params.get('min_days_on_market')
+    if value:
+        before = listed_on_or_after(parse_days(value, 'min_days_on_market') - 1)
+    return after, before
+
+
+def filter_market_metrics(queryset, query_params):
+    """Apply ``min_ppsf``/``max_ppsf`` and ``min_/max_days_on_market``"""
+    for param, lookup in PRICE_PER_SQFT_PARAMS.items():
+        value = query_params.get(param)
+        if value:
+            queryset = queryset.filter(**{f'price_per_sqft__{lookup}': parse_price_per_sqft(value, param)})
+    after, before = list_date_bounds(query_params)
+    if after is not None:
+        queryset = queryset.filter(list_date__gte=after)
+    if before is not None:
+        queryset = queryset.filter(list_date__lt=before)
+    return queryset
+
+
+class ListingOrderingFilter(filters.OrderingFilter):
+    """``OrderingFilter`` that also accepts ``days_on_market`` (see module docs)"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering:
+            ordering = [resolve_ordering(term) for term in ordering]
+        return ordering
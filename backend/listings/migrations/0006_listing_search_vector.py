@@ -0,0 +1,48 @@
+# Generated by Django 4.2.23 on 2026-10-17 03:49
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = """
+    UPDATE listings_listing SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(address, '') || ' ' || coalesce(city, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(state, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'D')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index and backfill only exist on PostgreSQL"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(SEARCH_VECTOR_SQL)
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS listings_listing_search_gin "
+        "ON listings_listing USING gin (search_vector)"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS listings_listing_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0005_alter_listing_photo_1_alter_listing_photo_2_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.23 on 2026-10-17 03:59
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0006_listing_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-list_date", "-id"],
+                name="listing_pub_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["price", "id"],
+                name="listing_pub_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["sqft", "id"],
+                name="listing_pub_sqft_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["property_type", "listing_type", "price"],
+                name="listing_pub_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["city", "-list_date"],
+                name="listing_pub_city_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                django.db.models.functions.text.Upper("city"),
+                django.db.models.functions.text.Upper("state"),
+                condition=models.Q(("is_published", True)),
+                name="listing_pub_city_ci_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_featured", True), ("is_published", True)),
+                fields=["-list_date"],
+                name="listing_featured_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0008_listing_location"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name="listing",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("external_id", ""), _negated=True),
+                fields=("realtor", "external_id"),
+                name="listing_unique_external_id",
+            ),
+        ),
+    ]
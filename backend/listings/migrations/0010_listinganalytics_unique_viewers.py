@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0009_listing_feed_identity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listinganalytics",
+            name="unique_viewers",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="listinganalytics",
+            name="viewer_sketch",
+            field=models.BinaryField(default=b""),
+        ),
+    ]
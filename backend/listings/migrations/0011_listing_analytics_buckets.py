@@ -0,0 +1,79 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0010_listinganalytics_unique_viewers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingAnalyticsBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("views", models.IntegerField(default=0)),
+                ("saves", models.IntegerField(default=0)),
+                ("inquiries", models.IntegerField(default=0)),
+                ("tours_scheduled", models.IntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["bucket_start"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=50, unique=True)),
+                ("processed_until", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="listingview",
+            index=models.Index(fields=["viewed_at"], name="listingview_viewed_at_idx"),
+        ),
+        migrations.AddField(
+            model_name="listinganalyticsbucket",
+            name="listing",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="analytics_buckets",
+                to="listings.listing",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="listinganalyticsbucket",
+            constraint=models.UniqueConstraint(
+                fields=("listing", "granularity", "bucket_start"),
+                name="analytics_bucket_unique_start",
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:55
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_totals(apps, schema_editor):
+    """Fill the running rating totals from the existing reviews (see listings.ratings)"""
+    Realtor = apps.get_model("realtors", "Realtor")
+    RealtorReview = apps.get_model("listings", "RealtorReview")
+
+    totals = RealtorReview.objects.order_by().values("realtor_id").annotate(
+        total=Count("id"),
+        rating_total=Sum("rating"),
+        **{f"stars_{stars}": Count("id", filter=Q(rating=stars)) for stars in range(1, 6)},
+    )
+    realtors = []
+    for row in totals:
+        realtor = Realtor(id=row["realtor_id"])
+        realtor.total_reviews = row["total"]
+        realtor.rating_sum = row["rating_total"]
+        realtor.average_rating = (Decimal(row["rating_total"]) / row["total"]).quantize(
+            Decimal("0.01"), ROUND_HALF_UP
+        )
+        for stars in range(1, 6):
+            setattr(realtor, f"rating_count_{stars}", row[f"stars_{stars}"])
+        realtors.append(realtor)
+    Realtor.objects.bulk_update(
+        realtors,
+        ["total_reviews", "rating_sum", "average_rating"] + [f"rating_count_{stars}" for stars in range(1, 6)],
+        batch_size=500,
+    )
+    # Totals without reviews behind them would skew the next incremental update
+    Realtor.objects.exclude(id__in=RealtorReview.objects.values("realtor_id")).update(
+        total_reviews=0, average_rating=Decimal("0")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0011_listing_analytics_buckets"),
+        ("realtors", "0005_realtor_rating_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
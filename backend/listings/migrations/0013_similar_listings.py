@@ -0,0 +1,55 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0012_backfill_realtor_rating_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarListing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_listings",
+                        to="listings.listing",
+                    ),
+                ),
+                (
+                    "neighbour",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_to",
+                        to="listings.listing",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["listing", "rank"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="similarlisting",
+            constraint=models.UniqueConstraint(
+                fields=("listing", "rank"), name="similar_listing_unique_rank"
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:04
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def backfill_price_per_sqft(apps, schema_editor):
+    """Fill the new column for existing listings (see listings.metrics.price_per_sqft)"""
+    Listing = apps.get_model("listings", "Listing")
+    batch = []
+    for listing in Listing.objects.filter(sqft__gt=0).only("id", "price", "sqft").iterator(chunk_size=2000):
+        listing.price_per_sqft = (Decimal(listing.price) / Decimal(listing.sqft)).quantize(
+            Decimal("0.01"), ROUND_HALF_UP
+        )
+        batch.append(listing)
+        if len(batch) >= 2000:
+            Listing.objects.bulk_update(batch, ["price_per_sqft"])
+            batch = []
+    Listing.objects.bulk_update(batch, ["price_per_sqft"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0013_similar_listings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="price_per_sqft",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=12
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["price_per_sqft", "id"],
+                name="listing_pub_ppsf_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_price_per_sqft, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:07
+
+from django.db import migrations, models
+
+MASK_BITS = 63
+
+
+def backfill_feature_bits(apps, schema_editor):
+    """Give existing features bits in ID order and fill the masks (see listings.featurebits)"""
+    Listing = apps.get_model("listings", "Listing")
+    PropertyFeature = apps.get_model("listings", "PropertyFeature")
+
+    features = list(PropertyFeature.objects.order_by("id")[:MASK_BITS])
+    for bit, feature in enumerate(features):
+        feature.bit = bit
+    PropertyFeature.objects.bulk_update(features, ["bit"])
+
+    masks = {}
+    links = Listing.features.through.objects.filter(propertyfeature__bit__isnull=False)
+    for listing_id, bit in links.values_list("listing_id", "propertyfeature__bit").iterator(chunk_size=5000):
+        masks[listing_id] = masks.get(listing_id, 0) | 1 << bit
+    Listing.objects.bulk_update(
+        [Listing(id=listing_id, feature_mask=mask) for listing_id, mask in masks.items()],
+        ["feature_mask"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0014_listing_price_per_sqft"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="feature_mask",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="propertyfeature",
+            name="bit",
+            field=models.PositiveSmallIntegerField(
+                blank=True, editable=False, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(backfill_feature_bits, migrations.RunPython.noop),
+    ]
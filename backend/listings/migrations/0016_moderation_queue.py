@@ -0,0 +1,62 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+PRIORITY_RANKS = {"low": 0, "medium": 1, "high": 2, "urgent": 3}
+
+
+def backfill_priority_rank(apps, schema_editor):
+    """One UPDATE per priority label (see listings.moderation.PRIORITY_RANKS)"""
+    PropertyModeration = apps.get_model("listings", "PropertyModeration")
+    for priority, rank in PRIORITY_RANKS.items():
+        PropertyModeration.objects.filter(priority=priority).update(priority_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("listings", "0015_feature_bitmask"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="propertymoderation",
+            options={
+                "ordering": ["-priority_rank", "-submitted_date"],
+                "verbose_name": "Property Moderation",
+                "verbose_name_plural": "Property Moderations",
+            },
+        ),
+        migrations.AddField(
+            model_name="propertymoderation",
+            name="claimed_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="claimed_moderations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="propertymoderation",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="propertymoderation",
+            name="priority_rank",
+            field=models.PositiveSmallIntegerField(default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="propertymoderation",
+            index=models.Index(
+                fields=["status", "-priority_rank", "submitted_date"],
+                name="moderation_queue_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_priority_rank, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SLOT_FIELDS = ("photo_main", "photo_1", "photo_2", "photo_3", "photo_4", "photo_5", "photo_6")
+BATCH_SIZE = 2000
+
+
+def backfill_listing_photos(apps, schema_editor):
+    """
+    Photo fields at positions 0-6, then completed property image uploads in
+    upload order (see listings.photos)
+    """
+    Listing = apps.get_model("listings", "Listing")
+    ListingPhoto = apps.get_model("listings", "ListingPhoto")
+    FileUpload = apps.get_model("backend_accounts", "FileUpload")
+
+    batch = []
+    for row in Listing.objects.order_by("id").values_list("id", *SLOT_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        for position, (slot, url) in enumerate(zip(SLOT_FIELDS, row[1:])):
+            if url:
+                batch.append(ListingPhoto(
+                    listing_id=row[0], position=position, url=url, is_main=slot == "photo_main",
+                    source="slot", slot=slot,
+                ))
+        if len(batch) >= BATCH_SIZE:
+            ListingPhoto.objects.bulk_create(batch)
+            batch = []
+
+    listing_ids = set(Listing.objects.values_list("id", flat=True))
+    next_position = {}
+    uploads = (
+        FileUpload.objects.filter(file_type="property-image", upload_status="completed").exclude(blob_url="")
+        .order_by("uploaded_at", "id").values_list("id", "listing_id", "property_id", "blob_url")
+    )
+    for file_id, listing_id, property_id, url in uploads.iterator(chunk_size=BATCH_SIZE):
+        if listing_id is None:
+            property_id = (property_id or "").strip()
+            listing_id = int(property_id) if property_id.isdigit() else None
+        if listing_id not in listing_ids:
+            continue
+        position = next_position.get(listing_id, len(SLOT_FIELDS))
+        next_position[listing_id] = position + 1
+        batch.append(ListingPhoto(
+            listing_id=listing_id, position=position, url=url, source="upload", file_id=file_id,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            ListingPhoto.objects.bulk_create(batch)
+            batch = []
+    ListingPhoto.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend_accounts", "0004_activity_created_at_indexes"),
+        ("listings", "0016_moderation_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingPhoto",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField()),
+                ("url", models.URLField(max_length=500)),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                ("is_main", models.BooleanField(default=False)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("slot", "Listing photo field"),
+                            ("upload", "Uploaded file"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("slot", models.CharField(blank=True, max_length=10)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "file",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="listing_photo",
+                        to="backend_accounts.fileupload",
+                    ),
+                ),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="photos",
+                        to="listings.listing",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["listing", "position", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["listing", "position", "id"],
+                        name="listing_photo_order_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_listing_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0017_listing_photos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listingphoto",
+            name="variants",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
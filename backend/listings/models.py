@@ -1,5 +1,8 @@
 from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Upper
 from datetime import datetime
 from realtors.models import Realtor
 
@@ -20,6 +23,8 @@ class PropertyFeature(models.Model):
     name = models.CharField(max_length=100, unique=True)
     category = models.CharField(max_length=50, default='general')  # interior, exterior, amenity, etc.
     icon = models.CharField(max_length=50, blank=True)  # Icon name for frontend
+    # Position in Listing.feature_mask, assigned on creation (see listings.featurebits)
+    bit = models.PositiveSmallIntegerField(null=True, blank=True, unique=True, editable=False)
     
     def __str__(self):
         return self.name
@@ -66,6 +71,11 @@ class Listing(models.Model):
     neighborhood = models.CharField(max_length=100, blank=True)
     description = models.TextField(blank=True)
     
+    # Location (map search, see listings.geo)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    
     # Pricing and Type
     price = models.IntegerField()
     listing_type = models.CharField(max_length=10, choices=LISTING_TYPE_CHOICES, default='sale')
@@ -78,6 +88,8 @@ class Listing(models.Model):
     garage = models.IntegerField(default=0)
     parking_spaces = models.IntegerField(default=0)
     sqft = models.IntegerField()
+    # Maintained from price and sqft for filtering and sorting (see listings.metrics)
+    price_per_sqft = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     lot_size = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     
     # Additional Property Details
@@ -93,6 +105,8 @@ class Listing(models.Model):
     
     # Features and Amenities
     features = models.ManyToManyField(PropertyFeature, blank=True)
+    # OR of the features' bits, maintained from the links (see listings.featurebits)
+    feature_mask = models.BigIntegerField(default=0, editable=False)
     
     # Images - URLs to external blob storage
     photo_main = models.URLField(max_length=500, blank=True)
@@ -109,24 +123,53 @@ class Listing(models.Model):
     list_date = models.DateTimeField(default=datetime.now, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Full-text search document (GIN-indexed on PostgreSQL, see listings.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Partner feed identity and fingerprint of the last ingested record (see listings.ingest)
+    external_id = models.CharField(max_length=100, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    
     class Meta:
         ordering = ['-list_date']
+        # Matched to the public listing/search queries: every one filters
+        # is_published=True, so the indexes are partial on it.
+        indexes = [
+            models.Index(fields=['-list_date', '-id'], condition=models.Q(is_published=True), name='listing_pub_recent_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_published=True), name='listing_pub_price_idx'),
+            models.Index(fields=['sqft', 'id'], condition=models.Q(is_published=True), name='listing_pub_sqft_idx'),
+            models.Index(fields=['price_per_sqft', 'id'], condition=models.Q(is_published=True), name='listing_pub_ppsf_idx'),
+            models.Index(fields=['property_type', 'listing_type', 'price'], condition=models.Q(is_published=True), name='listing_pub_type_idx'),
+            models.Index(fields=['city', '-list_date'], condition=models.Q(is_published=True), name='listing_pub_city_idx'),
+            # Legacy search uses city__iexact/state__iexact, i.e. UPPER() on PostgreSQL
+            models.Index(Upper('city'), Upper('state'), condition=models.Q(is_published=True), name='listing_pub_city_ci_idx'),
+            models.Index(fields=['-list_date'], condition=models.Q(is_published=True, is_featured=True), name='listing_featured_idx'),
+        ]
+        constraints = [
+            # Feed records are matched on (realtor, external_id)
+            models.UniqueConstraint(
+                fields=['realtor', 'external_id'], condition=~models.Q(external_id=''), name='listing_unique_external_id',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored photo URLs, so saves only resync ListingPhoto when they change (see listings.photos)
+        from .photos import SLOT_FIELDS
+        if all(name in instance.__dict__ for name in SLOT_FIELDS):
+            instance._photo_slots = tuple(instance.__dict__[name] for name in SLOT_FIELDS)
+        return instance
+    
     @property
     def days_on_market(self):
         """Calculate days on market"""
         from django.utils import timezone
         return (timezone.now().date() - self.list_date.date()).days
-    
-    @property
-    def price_per_sqft(self):
-        """Calculate price per square foot"""
-        if self.sqft > 0:
-            return round(self.price / self.sqft, 2)
-        return 0
+
 
 class ListingAnalytics(models.Model):
     """Track listing analytics like views, saves, inquiries"""
@@ -136,6 +179,9 @@ class ListingAnalytics(models.Model):
     inquiries = models.IntegerField(default=0)
     tours_scheduled = models.IntegerField(default=0)
     last_viewed = models.DateTimeField(null=True, blank=True)
+    # HyperLogLog estimate of distinct viewers and its registers (see listings.tracking)
+    unique_viewers = models.IntegerField(default=0)
+    viewer_sketch = models.BinaryField(default=b'', editable=False)
     
     def __str__(self):
         return f"Analytics for {self.listing.title}"
@@ -149,6 +195,100 @@ class ListingView(models.Model):
     
     class Meta:
         unique_together = ['listing', 'user', 'ip_address']
+        indexes = [
+            # Range scans of the analytics rollup job
+            models.Index(fields=['viewed_at'], name='listingview_viewed_at_idx'),
+        ]
+
+class ListingAnalyticsBucket(models.Model):
+    """Per-listing activity counts for one hour or day (filled by listings.rollups)"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='analytics_buckets')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    # First views by a viewer: ListingView is unique per listing, user and IP
+    views = models.IntegerField(default=0)
+    saves = models.IntegerField(default=0)
+    inquiries = models.IntegerField(default=0)
+    tours_scheduled = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['bucket_start']
+        constraints = [
+            # Also the index behind the time-series range reads
+            models.UniqueConstraint(
+                fields=['listing', 'granularity', 'bucket_start'], name='analytics_bucket_unique_start',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} - {self.granularity} - {self.bucket_start}"
+
+class RollupWatermark(models.Model):
+    """How far an incremental job (analytics rollups, similar listings) has processed its source"""
+    source = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} until {self.processed_until}"
+
+class SimilarListing(models.Model):
+    """A listing's precomputed nearest neighbours, best first (see listings.similar)"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='similar_listings')
+    rank = models.PositiveSmallIntegerField()
+    neighbour = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['listing', 'rank']
+        constraints = [
+            # Also the index behind the /similar/ lookup
+            models.UniqueConstraint(fields=['listing', 'rank'], name='similar_listing_unique_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} #{self.rank}: {self.neighbour_id}"
+
+class ListingPhoto(models.Model):
+    """
+    A listing's photos in gallery order, from its ``photo_*`` fields and its
+    image uploads (see listings.photos)
+    """
+    SOURCE_CHOICES = [
+        ('slot', 'Listing photo field'),
+        ('upload', 'Uploaded file'),
+    ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='photos')
+    position = models.PositiveIntegerField()
+    url = models.URLField(max_length=500)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    is_main = models.BooleanField(default=False)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    # The Listing field a 'slot' photo comes from, e.g. 'photo_main'
+    slot = models.CharField(max_length=10, blank=True)
+    file = models.OneToOneField(
+        'backend_accounts.FileUpload', on_delete=models.CASCADE, null=True, blank=True, related_name='listing_photo',
+    )
+    # Resized WebP versions, null until generated (see listings.derivatives)
+    variants = models.JSONField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['listing', 'position', 'id']
+        indexes = [
+            # The images endpoint's keyset query
+            models.Index(fields=['listing', 'position', 'id'], name='listing_photo_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} #{self.position}: {self.url}"
 
 class PriceHistory(models.Model):
     """Track price changes for listings"""
@@ -186,6 +326,14 @@ class RealtorReview(models.Model):
         unique_together = ['realtor', 'user', 'listing']
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored rating, so saves apply only their change (see listings.ratings)
+        if 'realtor_id' in instance.__dict__ and 'rating' in instance.__dict__:
+            instance._rated = (instance.realtor_id, instance.rating)
+        return instance
+    
     def __str__(self):
         return f"{self.user.username} - {self.realtor.name} - {self.rating} stars"
 
@@ -209,47 +357,193 @@ class PropertyModeration(models.Model):
     listing = models.OneToOneField(Listing, on_delete=models.CASCADE, related_name='moderation')
     status = models.CharField(max_length=20, choices=MODERATION_STATUS_CHOICES, default='pending')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
+    # Sort key for priority (low=0 .. urgent=3), kept in step on save (see listings.moderation)
+    priority_rank = models.PositiveSmallIntegerField(default=1, editable=False)
     submitted_date = models.DateTimeField(auto_now_add=True)
     reviewed_date = models.DateTimeField(null=True, blank=True)
     reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='moderated_properties')
     reason = models.TextField(blank=True, help_text='Reason for rejection or flagging')
     notes = models.TextField(blank=True, help_text='Internal admin notes')
     report_count = models.IntegerField(default=0, help_text='Number of user reports')
+
+    # Work queue lease: the moderator working on the item until lease_expires_at
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_moderations')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-priority', '-submitted_date']
+        ordering = ['-priority_rank', '-submitted_date']
         verbose_name = 'Property Moderation'
         verbose_name_plural = 'Property Moderations'
+        indexes = [
+            # The claim queue: open statuses, most urgent and oldest first
+            models.Index(fields=['status', '-priority_rank', 'submitted_date'], name='moderation_queue_idx'),
+        ]
     
     def __str__(self):
         return f"{self.listing.title} - {self.status}"
-    
-    @property
-    def days_pending(self):
-        """Calculate days since submission"""
-        from django.utils import timezone
-        return (timezone.now().date() - self.submitted_date.date()).days
 
 # Add this at the end of the file to update realtor ratings when reviews are saved
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
 from django.dispatch import receiver
 
-@receiver([post_save, post_delete], sender=RealtorReview)
-def update_realtor_rating(sender, instance, **kwargs):
-    """Update realtor's average rating when reviews change"""
-    realtor = instance.realtor
-    reviews = RealtorReview.objects.filter(realtor=realtor)
-    
-    if reviews.exists():
-        from django.db.models import Avg
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
-        realtor.average_rating = round(avg_rating, 2)
-        realtor.total_reviews = reviews.count()
+@receiver(post_save, sender=RealtorReview)
+def update_realtor_rating(sender, instance, created=False, raw=False, **kwargs):
+    """Apply a review's rating change to its realtor's running totals"""
+    if raw:
+        return
+    from .cache import bump_cache_version
+    from .ratings import review_changed
+    if review_changed(instance, created=created):
+        bump_cache_version('realtors')
+
+
+@receiver(post_delete, sender=RealtorReview)
+def remove_realtor_rating(sender, instance, **kwargs):
+    """Take a deleted review out of its realtor's running totals"""
+    from .cache import bump_cache_version
+    from .ratings import review_changed
+    if review_changed(instance, deleted=True):
+        bump_cache_version('realtors')
+
+
+@receiver(post_save, sender=Listing)
+def sync_listing_slot_photos(sender, instance, created=False, raw=False, **kwargs):
+    """Mirror changed ``photo_*`` fields into ListingPhoto"""
+    if raw:
+        return
+    from .photos import SLOT_FIELDS, sync_slot_photos
+    slots = tuple(getattr(instance, name) for name in SLOT_FIELDS)
+    stored = ('',) * len(SLOT_FIELDS) if created else getattr(instance, '_photo_slots', None)
+    if stored != slots:
+        sync_slot_photos([instance])
+        instance._photo_slots = slots
+
+
+@receiver(post_save, sender='backend_accounts.FileUpload')
+def sync_uploaded_listing_photo(sender, instance, raw=False, **kwargs):
+    """Completed property image uploads are listing photos; others are not"""
+    if raw:
+        return
+    from .photos import sync_upload_photo
+    sync_upload_photo(instance)
+
+
+@receiver(post_delete, sender=ListingPhoto)
+def drop_listing_photo_manifest(sender, instance, **kwargs):
+    """Also covers photos removed with their upload or listing"""
+    from .photos import photos_changed
+    photos_changed([instance.listing_id])
+
+
+@receiver(pre_save, sender=Listing)
+def set_listing_geohash(sender, instance, **kwargs):
+    """Keep the geohash grid cell in step with the coordinates"""
+    from .geo import encode_geohash
+    if instance.latitude is None or instance.longitude is None:
+        instance.geohash = ''
     else:
-        realtor.average_rating = 0.0
-        realtor.total_reviews = 0
-    
-    realtor.save()
\ No newline at end of file
+        instance.geohash = encode_geohash(instance.latitude, instance.longitude)
+
+
+@receiver(pre_save, sender=Listing)
+def set_listing_price_per_sqft(sender, instance, **kwargs):
+    """Keep the stored price per sqft in step with price and sqft"""
+    from .metrics import price_per_sqft
+    instance.price_per_sqft = price_per_sqft(instance.price, instance.sqft)
+
+
+@receiver(pre_save, sender=PropertyModeration)
+def set_moderation_priority_rank(sender, instance, **kwargs):
+    """Keep the numeric priority in step with the label"""
+    from .moderation import priority_rank
+    instance.priority_rank = priority_rank(instance.priority)
+
+
+@receiver(post_save, sender=Listing)
+def index_listing_for_search(sender, instance, raw=False, **kwargs):
+    """Keep the listing search index in step with saved listings"""
+    if raw:
+        return
+    from .search import get_search_backend
+    get_search_backend().listing_saved(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def remove_listing_from_search(sender, instance, **kwargs):
+    """Drop deleted listings from the search index"""
+    from .search import get_search_backend
+    get_search_backend().listing_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Listing)
+def refresh_listing_snapshot(sender, instance, raw=False, **kwargs):
+    """Have this process' listing snapshot pick up the change on its next read"""
+    if raw:
+        return
+    from .snapshot import get_listing_snapshot
+    snapshot = get_listing_snapshot()
+    if snapshot is not None:
+        snapshot.mark_stale()
+
+
+@receiver(post_delete, sender=Listing)
+def remove_listing_from_snapshot(sender, instance, **kwargs):
+    """Tombstone deleted listings in this process' snapshot"""
+    from .snapshot import get_listing_snapshot
+    snapshot = get_listing_snapshot()
+    if snapshot is not None:
+        snapshot.listing_deleted(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def bump_listing_cache_version(sender, instance, **kwargs):
+    """Invalidate cached listing reads when any listing changes"""
+    from .cache import bump_cache_version
+    bump_cache_version('listings')
+
+
+@receiver([post_save, post_delete], sender=PriceHistory)
+@receiver(m2m_changed, sender=Listing.features.through)
+def bump_listing_cache_version_for_related(sender, **kwargs):
+    """Price history and features are part of cached listing responses"""
+    from .cache import bump_cache_version
+    bump_cache_version('listings')
+
+
+@receiver(m2m_changed, sender=Listing.features.through)
+def update_listing_feature_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep ``feature_mask`` in step with the links. Feature edits also count as
+    listing changes for ``updated_at`` based jobs (listings.similar, the snapshot).
+    """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_listing_ids = list(instance.listing_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .featurebits import feature_links_changed
+    feature_links_changed(instance, action, reverse, pk_set)
+
+
+@receiver(pre_save, sender=PropertyFeature)
+def assign_feature_bit(sender, instance, raw=False, **kwargs):
+    """New features take the lowest free mask bit, if any is left"""
+    if instance._state.adding and instance.bit is None and not raw:
+        from .featurebits import free_bits
+        instance.bit = next(iter(free_bits(1)), None)
+
+
+@receiver(post_delete, sender=PropertyFeature)
+def clear_feature_bit(sender, instance, **kwargs):
+    from .featurebits import feature_deleted
+    feature_deleted(instance)
+
+
+@receiver([post_save, post_delete], sender=Realtor)
+def bump_realtor_cache_version(sender, instance, **kwargs):
+    """Invalidate cached realtor reads (and listings embedding them)"""
+    from .cache import bump_cache_version
+    bump_cache_version('realtors')
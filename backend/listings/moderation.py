@@ -0,0 +1,194 @@
+"""
+Moderation work queue.
+
+``PropertyModeration.priority`` is a label; ``priority_rank`` (kept in step
+by a ``pre_save`` receiver) is what the queue sorts on, so ``urgent`` comes
+before ``high`` rather than after it alphabetically. The queue index is
+``(status, -priority_rank, submitted_date)``.
+
+``claim_moderations`` leases the next items to a moderator. Candidates are
+locked with ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent claims take
+different rows instead of waiting on each other, and the lease is written by
+an ``UPDATE`` that re-checks the item is still free. Leases expire after
+``MODERATION_LEASE_SECONDS``, after which the item is free to claim again
+(expired leases are not cleared eagerly: that ``UPDATE`` would wait on the
+rows other claims hold). Approving, rejecting or flagging releases a lease.
+
+``bulk_moderate`` approves, rejects or flags many items in one transaction
+with a single ``UPDATE`` per table.
+
+``with_days_pending`` computes the age in whole days in the database, so the
+list can be filtered and sorted on it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateField, Func, IntegerField, Q, Value
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+PRIORITY_RANKS = {'low': 0, 'medium': 1, 'high': 2, 'urgent': 3}
+# Statuses still waiting for a decision
+QUEUE_STATUSES = ('pending', 'under_review', 'flagged')
+QUEUE_ORDERING = ('-priority_rank', 'submitted_date', 'id')
+
+ORDERING_ALIASES = {'priority': 'priority_rank', '-priority': '-priority_rank'}
+
+
+def priority_rank(priority):
+    return PRIORITY_RANKS.get(priority, PRIORITY_RANKS['medium'])
+
+
+class DaysSince(Func):
+    """Whole days from a datetime's UTC date to ``today`` (a date), like ``Listing.days_on_market``"""
+    output_field = IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(Value(today, output_field=DateField()), expression, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='DATEDIFF(%(expressions)s)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        today, moment = self.get_source_expressions()
+        today_sql, today_params = compiler.compile(today)
+        moment_sql, moment_params = compiler.compile(moment)
+        sql = f"({today_sql}::date - ({moment_sql} AT TIME ZONE 'UTC')::date)"
+        return sql, (*today_params, *moment_params)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        today, moment = self.get_source_expressions()
+        today_sql, today_params = compiler.compile(today)
+        moment_sql, moment_params = compiler.compile(moment)
+        # Datetimes are stored as UTC text
+        sql = f'CAST(julianday({today_sql}) - julianday(date({moment_sql})) AS INTEGER)'
+        return sql, (*today_params, *moment_params)
+
+
+def with_days_pending(queryset):
+    return queryset.annotate(days_pending=DaysSince('submitted_date', timezone.now().date()))
+
+
+def filter_days_pending(queryset, query_params):
+    """``?min_days_pending=``/``?max_days_pending=`` on the annotation"""
+    for param, lookup in (('min_days_pending', 'gte'), ('max_days_pending', 'lte')):
+        value = query_params.get(param)
+        if not value:
+            continue
+        try:
+            days = int(value)
+        except ValueError:
+            days = -1
+        if days < 0:
+            raise ValidationError({param: 'Expected a non-negative whole number of days.'})
+        queryset = queryset.filter(**{f'days_pending__{lookup}': days})
+    return queryset
+
+
+class ModerationOrderingFilter(filters.OrderingFilter):
+    """``OrderingFilter`` that sorts ``priority`` by rank rather than label"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering:
+            ordering = [ORDERING_ALIASES.get(term, term) for term in ordering]
+        return ordering
+
+
+def lease_seconds():
+    return getattr(settings, 'MODERATION_LEASE_SECONDS', 900)
+
+
+def claimable(user, now):
+    """Queue items that are unclaimed, whose lease expired, or already leased to ``user``"""
+    from .models import PropertyModeration
+
+    return PropertyModeration.objects.filter(status__in=QUEUE_STATUSES).filter(
+        Q(claimed_by__isnull=True) | Q(lease_expires_at__lte=now) | Q(claimed_by=user)
+    )
+
+
+def claim_moderations(user, count):
+    """
+    Lease up to ``count`` queue items, highest priority and oldest first, to
+    ``user``. Items the user already holds are renewed. Returns the claimed IDs
+    in queue order and the lease expiry.
+    """
+    from .models import PropertyModeration
+
+    now = timezone.now()
+    expires = now + timedelta(seconds=lease_seconds())
+    with transaction.atomic():
+        candidates = list(
+            claimable(user, now).select_for_update(skip_locked=True)
+            .order_by(*QUEUE_ORDERING).values_list('id', flat=True)[:count]
+        )
+        if not candidates:
+            return [], expires
+        # The UPDATE re-checks the lease, for backends without row locks
+        claimable(user, now).filter(id__in=candidates).update(
+            claimed_by=user, lease_expires_at=expires, updated_at=now,
+        )
+        claimed = set(
+            PropertyModeration.objects.filter(id__in=candidates, claimed_by=user, lease_expires_at=expires)
+            .values_list('id', flat=True)
+        )
+    return [moderation_id for moderation_id in candidates if moderation_id in claimed], expires
+
+
+def lease_active(moderation, now=None):
+    return moderation.lease_expires_at is not None and moderation.lease_expires_at > (now or timezone.now())
+
+
+def release_claim(moderation):
+    """Drop the lease of a decided item (saved by the caller)"""
+    moderation.claimed_by = None
+    moderation.lease_expires_at = None
+
+
+# Bulk action -> (status, Listing.is_published or None to leave it, priority or None)
+BULK_ACTIONS = {
+    'approve': ('approved', True, None),
+    'reject': ('rejected', False, None),
+    'flag': ('flagged', None, 'high'),  # flagged items stay published, with high priority
+}
+
+
+def bulk_moderate(user, moderation_ids, action, reason=''):
+    """
+    Apply ``action`` to every moderation in ``moderation_ids`` in one
+    transaction: one locking read, one ``UPDATE`` of the moderations and one of
+    their listings. Returns ``{id: 'updated' | 'not_found'}`` in request order.
+
+    Like the single-item views, ``reviewed_by``/``reviewed_date`` are set and
+    leases released; ``reason`` is stored for rejections and flags. The
+    ``UPDATE``s skip model signals, so ``updated_at`` is set here and the
+    search index, snapshot and response caches are told after commit.
+    """
+    from .ingest import listings_bulk_changed
+    from .models import Listing, PropertyModeration
+
+    status, is_published, priority = BULK_ACTIONS[action]
+    now = timezone.now()
+    with transaction.atomic():
+        found = dict(
+            PropertyModeration.objects.select_for_update().filter(id__in=moderation_ids)
+            .values_list('id', 'listing_id')
+        )
+        changes = {
+            'status': status, 'reviewed_by': user, 'reviewed_date': now,
+            'claimed_by': None, 'lease_expires_at': None, 'updated_at': now,
+        }
+        if action != 'approve':
+            changes['reason'] = reason
+        if priority is not None:
+            changes.update(priority=priority, priority_rank=priority_rank(priority))
+        PropertyModeration.objects.filter(id__in=found).update(**changes)
+
+        listing_ids = sorted(set(found.values()))
+        if is_published is not None and listing_ids:
+            Listing.objects.filter(id__in=listing_ids).update(is_published=is_published, updated_at=now)
+            transaction.on_commit(lambda: listings_bulk_changed(listing_ids))
+    return {moderation_id: 'updated' if moderation_id in found else 'not_found' for moderation_id in moderation_ids}
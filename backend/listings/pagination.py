@@ -0,0 +1,242 @@
+"""
+Pagination for listing endpoints.
+
+``ListingPagination`` keeps the page-number envelope the frontend already
+parses and adds an opt-in keyset (cursor) mode: passing ``?cursor=`` (empty
+for the first page) pages by the current ordering plus ``id`` instead of
+``OFFSET``, and skips ``COUNT(*)`` unless ``?with_count=1`` is given.
+"""
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q, QuerySet
+from rest_framework import exceptions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor pagination keyed on ``(ordering field, ..., id)``.
+
+    Only orderings made of ``cursor_fields`` are supported; anything else
+    (e.g. relevance-ranked search results) falls back to page numbers.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    cursor_fields = ('list_date', 'price', 'sqft', 'price_per_sqft')
+    invalid_cursor_message = 'Invalid cursor'
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.start_keyset(queryset, request):
+            return super().paginate_queryset(queryset, request, view)
+        if self.with_count:
+            self.total = queryset.count()
+        return self.finish_keyset(list(self.keyset_page(queryset)))
+
+    def start_keyset(self, queryset, request):
+        """Set up cursor mode for this request; False means page numbers apply"""
+        self.cursor_mode = False
+        if self.cursor_query_param not in request.query_params:
+            return False
+
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            return False
+
+        self.cursor_mode = True
+        self.request = request
+        self.model = queryset.model
+        self.limit = self.get_page_size(request)
+        self.keyset_ordering = ordering
+        self.with_count = request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+        self.total = None
+        self.cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        self.reverse = bool(self.cursor and self.cursor['prev'])
+        return True
+
+    def keyset_page(self, queryset):
+        """The rows after the cursor, plus one to tell whether there are more"""
+        queryset = queryset.order_by(*self._order_by(self.reverse))
+        if self.cursor:
+            queryset = queryset.filter(self._keyset_filter(self.cursor['values'], self.reverse))
+        return queryset[:self.limit + 1]
+
+    def finish_keyset(self, rows):
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if self.reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        self.next_cursor = self.encode_cursor(rows[-1], prev=False) if rows and self.has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], prev=True) if rows and self.has_previous else None
+        return rows
+
+    def get_keyset_ordering(self, queryset):
+        """``[(field, descending), ...]`` ending in ``id``, or None if unsupported"""
+        order_by = queryset.query.order_by
+        if not order_by and queryset.query.default_ordering:
+            order_by = queryset.model._meta.ordering
+        ordering = []
+        for entry in order_by:
+            if not isinstance(entry, str):
+                return None
+            descending = entry.startswith('-')
+            name = entry.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            if name != 'id' and name not in self.cursor_fields:
+                return None
+            ordering.append((name, descending))
+            if name == 'id':
+                break
+        if not ordering or ordering[-1][0] != 'id':
+            ordering.append(('id', ordering[0][1] if ordering else True))
+        return ordering
+
+    def _order_by(self, reverse):
+        return [
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.keyset_ordering
+        ]
+
+    def _keyset_filter(self, values, reverse):
+        """Rows strictly after ``values`` in (possibly reversed) ordering"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keyset_ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _signature(self):
+        return ','.join(('-' if descending else '') + name for name, descending in self.keyset_ordering)
+
+    def encode_cursor(self, row, prev):
+        values = []
+        for name, _ in self.keyset_ordering:
+            value = getattr(row, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        payload = json.dumps({'o': self._signature(), 'v': values, 'p': int(prev)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if payload['o'] != self._signature() or len(payload['v']) != len(self.keyset_ordering):
+                raise ValueError('cursor does not match ordering')
+            values = []
+            for (name, _), value in zip(self.keyset_ordering, payload['v']):
+                try:
+                    field = self.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    values.append(value)  # annotation; JSON value is already typed
+                else:
+                    values.append(field.to_python(value))
+            return {'values': values, 'prev': bool(payload.get('p'))}
+        except (KeyError, TypeError, ValueError, ValidationError, binascii.Error, UnicodeDecodeError):
+            raise exceptions.ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+    def get_cursor_paginated_response(self, data):
+        return Response({
+            'results': data,
+            'count': self.total,
+            'pagination': {
+                'mode': 'cursor',
+                'page': None,
+                'limit': self.limit,
+                'total': self.total,
+                'pages': math.ceil(self.total / self.limit) if self.total is not None else None,
+                'has_next': self.has_next,
+                'has_previous': self.has_previous,
+                'next_page': None,
+                'previous_page': None,
+                'next_cursor': self.next_cursor,
+                'previous_cursor': self.previous_cursor,
+            }
+        })
+
+
+class ListingPagination(KeysetPaginationMixin, PageNumberPagination):
+    """
+    Base pagination for listing endpoints: page numbers by default,
+    keyset cursors on request
+    """
+    page_size_query_param = 'limit'
+    page_query_param = 'page'
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return self.get_cursor_paginated_response(data)
+        return Response({
+            'results': data,
+            'count': self.page.paginator.count,
+            'pagination': {
+                'page': self.page.number,
+                'limit': self.page_size,
+                'total': self.page.paginator.count,
+                'pages': self.page.paginator.num_pages,
+                'has_next': self.page.has_next(),
+                'has_previous': self.page.has_previous(),
+                'next_page': self.page.next_page_number() if self.page.has_next() else None,
+                'previous_page': self.page.previous_page_number() if self.page.has_previous() else None,
+            }
+        })
+
+
+class ListingPhotoPagination(KeysetPaginationMixin, PageNumberPagination):
+    """A listing's photos in gallery order, by page number or ``?cursor=``"""
+    cursor_fields = ('position',)
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 50
+
+
+async def apaginate_queryset(paginator, queryset, request, view=None):
+    """
+    Async counterpart of ``paginator.paginate_queryset`` for DRF page-number
+    paginators (including ``ListingPagination`` in cursor mode): same state
+    and errors, with the count and page queries run through the async ORM.
+    """
+    if not isinstance(queryset, QuerySet):
+        # e.g. snapshot selections, which hydrate while being sliced
+        return await sync_to_async(paginator.paginate_queryset)(queryset, request, view)
+
+    if isinstance(paginator, KeysetPaginationMixin) and paginator.start_keyset(queryset, request):
+        if paginator.with_count:
+            paginator.total = await queryset.acount()
+        return paginator.finish_keyset([row async for row in paginator.keyset_page(queryset)])
+
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise exceptions.NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    paginator.page.object_list = [row async for row in paginator.page.object_list]
+    return paginator.page.object_list
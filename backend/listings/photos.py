@@ -0,0 +1,218 @@
+"""
+Listing photos.
+
+Every photo of a listing is a ``ListingPhoto`` row, in gallery order by
+``(position, id)``. Rows come from two places and are kept in step by signal
+receivers (and by the feed ingestor, whose bulk writes skip them):
+
+- the ``photo_main``..``photo_6`` fields of ``Listing``, at positions 0-6
+  (``source='slot'``, ``photo_main`` is the main photo);
+- completed ``property-image`` uploads (``FileUpload``), appended after the
+  slots in upload order (``source='upload'``).
+
+The images endpoint pages a listing's photos with one keyset query on the
+``(listing, position, id)`` index. Totals and the main photo come from a
+per-listing manifest, cached until that listing's photos change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import JSONField, Max, OuterRef, Subquery
+
+from .cache import bump_cache_version, versioned_key
+
+SLOT_FIELDS = ('photo_main', 'photo_1', 'photo_2', 'photo_3', 'photo_4', 'photo_5', 'photo_6')
+# Uploads are positioned after every slot
+FIRST_UPLOAD_POSITION = len(SLOT_FIELDS)
+
+
+def manifest_namespace(listing_id):
+    return f'listing-photos:{listing_id}'
+
+
+def photos_changed(listing_ids):
+    """Drop the cached manifests of these listings"""
+    for listing_id in set(listing_ids):
+        bump_cache_version(manifest_namespace(listing_id))
+
+
+def slot_photo(listing_id, position, slot, url):
+    from .models import ListingPhoto
+
+    return ListingPhoto(
+        listing_id=listing_id, position=position, url=url, is_main=slot == 'photo_main', source='slot', slot=slot,
+    )
+
+
+def sync_slot_photos(listings):
+    """
+    Make the ``slot`` photos of ``listings`` match their ``photo_*`` fields,
+    with one read and at most one bulk insert, update and delete. Returns the
+    number of photos written or removed.
+    """
+    from .models import ListingPhoto
+
+    listings = [listing for listing in listings if listing.pk is not None]
+    if not listings:
+        return 0
+    existing = {
+        (photo.listing_id, photo.slot): photo
+        for photo in ListingPhoto.objects.filter(listing__in=[listing.pk for listing in listings], source='slot')
+    }
+    created, updated, removed = [], [], []
+    for listing in listings:
+        for position, slot in enumerate(SLOT_FIELDS):
+            url = getattr(listing, slot)
+            photo = existing.get((listing.pk, slot))
+            if photo is None:
+                if url:
+                    created.append(slot_photo(listing.pk, position, slot, url))
+            elif not url:
+                removed.append(photo)
+            elif photo.url != url:
+                # A different image; its dimensions and variants are not known yet
+                photo.url, photo.width, photo.height, photo.variants = url, None, None, None
+                updated.append(photo)
+
+    if created:
+        ListingPhoto.objects.bulk_create(created)
+    if updated:
+        ListingPhoto.objects.bulk_update(updated, ['url', 'width', 'height', 'variants'])
+    if removed:
+        ListingPhoto.objects.filter(id__in=[photo.id for photo in removed]).delete()
+    changed = created + updated + removed
+    photos_changed(photo.listing_id for photo in changed)
+    return len(changed)
+
+
+def upload_listing_id(upload):
+    """The listing a ``FileUpload`` belongs to: its ``listing`` or a numeric ``property_id``"""
+    from .models import Listing
+
+    if upload.listing_id is not None:
+        return upload.listing_id
+    property_id = (upload.property_id or '').strip()
+    if property_id.isdigit() and Listing.objects.filter(id=int(property_id)).exists():
+        return int(property_id)
+    return None
+
+
+def is_listing_image(upload):
+    return upload.file_type == 'property-image' and upload.upload_status == 'completed' and bool(upload.blob_url)
+
+
+def next_upload_position(listing_id):
+    from .models import ListingPhoto
+
+    last = ListingPhoto.objects.filter(listing_id=listing_id, source='upload').aggregate(last=Max('position'))['last']
+    return FIRST_UPLOAD_POSITION if last is None else last + 1
+
+
+def sync_upload_photo(upload):
+    """Add, move, update or remove the photo of one ``FileUpload``"""
+    from .models import ListingPhoto
+
+    photo = ListingPhoto.objects.filter(file=upload).first()
+    listing_id = upload_listing_id(upload) if is_listing_image(upload) else None
+    if listing_id is None:
+        if photo is not None:
+            photo.delete()
+        return
+    if photo is None:
+        # The upload's variants may already exist (see listings.derivatives)
+        original = (upload.variants or {}).get('original') or {}
+        ListingPhoto.objects.create(
+            listing_id=listing_id, position=next_upload_position(listing_id), url=upload.blob_url,
+            width=original.get('width'), height=original.get('height'), source='upload', file=upload,
+            variants=upload.variants,
+        )
+        photos_changed([listing_id])
+        return
+    changed_listings = {photo.listing_id, listing_id}
+    if photo.listing_id != listing_id:
+        photo.listing_id, photo.position = listing_id, next_upload_position(listing_id)
+    elif photo.url == upload.blob_url:
+        return
+    if photo.url != upload.blob_url:
+        photo.url, photo.width, photo.height, photo.variants = upload.blob_url, None, None, None
+    photo.save()
+    photos_changed(changed_listings)
+
+
+def add_upload_photos(uploads):
+    """
+    ``sync_upload_photo`` for many new uploads at once (``bulk_create`` skips
+    the receiver): one listing check, one position lookup and one insert.
+    """
+    from .models import Listing, ListingPhoto
+
+    uploads = [upload for upload in uploads if is_listing_image(upload)]
+    property_ids = {
+        int(upload.property_id.strip()) for upload in uploads
+        if upload.listing_id is None and (upload.property_id or '').strip().isdigit()
+    }
+    known = set(Listing.objects.filter(id__in=property_ids).values_list('id', flat=True)) if property_ids else set()
+    placed = []
+    for upload in uploads:
+        listing_id = upload.listing_id
+        if listing_id is None and (upload.property_id or '').strip().isdigit():
+            listing_id = int(upload.property_id.strip())
+        if listing_id is not None and (listing_id == upload.listing_id or listing_id in known):
+            placed.append((listing_id, upload))
+    if not placed:
+        return []
+
+    last = dict(
+        ListingPhoto.objects.filter(listing_id__in={listing_id for listing_id, _ in placed}, source='upload')
+        .order_by().values('listing_id').annotate(last=Max('position')).values_list('listing_id', 'last')
+    )
+    photos = []
+    for listing_id, upload in placed:
+        position = last.get(listing_id, FIRST_UPLOAD_POSITION - 1) + 1
+        last[listing_id] = position
+        photos.append(ListingPhoto(
+            listing_id=listing_id, position=position, url=upload.blob_url, source='upload', file=upload,
+        ))
+    ListingPhoto.objects.bulk_create(photos)
+    photos_changed(listing_id for listing_id, _ in placed)
+    return photos
+
+
+def with_main_photo_variants(queryset):
+    """Annotate listings with ``photo_main_variants``, in the same query"""
+    from .models import ListingPhoto
+
+    return queryset.annotate(photo_main_variants=Subquery(
+        ListingPhoto.objects.filter(listing=OuterRef('pk'), is_main=True).values('variants')[:1],
+        output_field=JSONField(),
+    ))
+
+
+def compute_photo_manifest(listing_id):
+    """Photo counts and the main photo (``is_main``, else the first) of a listing"""
+    from .derivatives import srcset
+    from .models import ListingPhoto
+
+    rows = list(
+        ListingPhoto.objects.filter(listing_id=listing_id).order_by('position', 'id')
+        .values_list('id', 'url', 'width', 'height', 'variants', 'is_main', 'source')
+    )
+    main = next((row for row in rows if row[5]), rows[0] if rows else None)
+    return {
+        'listing_id': listing_id,
+        'count': len(rows),
+        'uploads': sum(1 for row in rows if row[6] == 'upload'),
+        'slots': sum(1 for row in rows if row[6] == 'slot'),
+        'main': {
+            'id': main[0], 'url': main[1], 'width': main[2], 'height': main[3], 'srcset': srcset(main[4]),
+        } if main else None,
+    }
+
+
+def get_photo_manifest(listing_id):
+    """Cached ``compute_photo_manifest``"""
+    key = versioned_key('listing-photos', [manifest_namespace(listing_id)], listing_id)
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = compute_photo_manifest(listing_id)
+        cache.set(key, manifest, getattr(settings, 'LISTING_PHOTO_MANIFEST_CACHE_SECONDS', 86400))
+    return manifest
@@ -0,0 +1,124 @@
+"""
+Realtor rating aggregates maintained from ``RealtorReview`` changes.
+
+Each realtor row carries the running ``rating_sum``, ``total_reviews`` and a
+count per star (``rating_count_1`` .. ``rating_count_5``); ``average_rating``
+follows from the first two. A review save or delete applies only its delta in
+one ``UPDATE`` of those columns with ``F()`` expressions, so concurrent reviews
+never overwrite each other and ``Realtor.save`` (which may create a user) is
+not involved. ``recompute_realtor_ratings`` rebuilds every realtor from a
+single grouped query, for bulk edits that bypass the signals.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, DecimalField, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from realtors.models import Realtor
+
+STARS = range(1, 6)
+RATING_FIELDS = ['average_rating', 'total_reviews', 'rating_sum'] + [f'rating_count_{stars}' for stars in STARS]
+AVERAGE_FIELD = Realtor._meta.get_field('average_rating')
+
+
+def average_expression(rating_sum, total_reviews):
+    """``rating_sum / total_reviews`` as a rating, 0 without reviews"""
+    average_field = DecimalField(max_digits=AVERAGE_FIELD.max_digits, decimal_places=AVERAGE_FIELD.decimal_places)
+    return Coalesce(
+        Cast(Cast(rating_sum, FloatField()) / NullIf(total_reviews, Value(0)), average_field),
+        Value(Decimal('0')),
+        output_field=average_field,
+    )
+
+
+def apply_rating_delta(realtor_id, delta):
+    """
+    Add ``{stars: reviews}`` (negative to remove) to a realtor's aggregates in
+    one ``UPDATE``. Returns the number of realtor rows updated.
+    """
+    delta = {stars: count for stars, count in delta.items() if count}
+    if realtor_id is None or not delta:
+        return 0
+    sum_delta = sum(stars * count for stars, count in delta.items())
+    count_delta = sum(delta.values())
+    rating_sum = F('rating_sum') + sum_delta
+    total_reviews = F('total_reviews') + count_delta
+    updates = {f'rating_count_{stars}': F(f'rating_count_{stars}') + count for stars, count in delta.items()}
+    # SET expressions all see the old row, so the average is computed from the new totals explicitly
+    return Realtor.objects.filter(pk=realtor_id).update(
+        rating_sum=rating_sum,
+        total_reviews=total_reviews,
+        average_rating=average_expression(rating_sum, total_reviews),
+        **updates,
+    )
+
+
+def review_changed(review, created=False, deleted=False):
+    """Apply the rating delta of a saved or deleted review; returns the realtor IDs updated"""
+    previous = getattr(review, '_rated', None)
+    current = None if deleted else (review.realtor_id, review.rating)
+    if deleted and previous is None:
+        previous = (review.realtor_id, review.rating)
+    if created:
+        previous = None
+    elif not deleted and previous is None:
+        # Saved without having been loaded (e.g. a hand-built instance): the old values are unknown
+        recompute_realtor_ratings([review.realtor_id])
+        review._rated = current
+        return {review.realtor_id}
+
+    deltas = {}
+    if previous is not None:
+        deltas.setdefault(previous[0], {}).setdefault(previous[1], 0)
+        deltas[previous[0]][previous[1]] -= 1
+    if current is not None:
+        deltas.setdefault(current[0], {}).setdefault(current[1], 0)
+        deltas[current[0]][current[1]] += 1
+    review._rated = current
+
+    changed = set()
+    for realtor_id, delta in deltas.items():
+        if apply_rating_delta(realtor_id, delta):
+            changed.add(realtor_id)
+    return changed
+
+
+def recompute_realtor_ratings(realtor_ids=None):
+    """
+    Rebuild rating aggregates from the reviews with one grouped query; all
+    realtors, or only ``realtor_ids``. Returns the number of realtors changed.
+    """
+    from .models import RealtorReview
+
+    reviews = RealtorReview.objects.order_by()
+    realtors = Realtor.objects.only('id', *RATING_FIELDS)
+    if realtor_ids is not None:
+        reviews = reviews.filter(realtor_id__in=realtor_ids)
+        realtors = realtors.filter(pk__in=realtor_ids)
+    totals = {
+        row['realtor_id']: row
+        for row in reviews.values('realtor_id').annotate(
+            total=Count('id'),
+            rating_total=Sum('rating'),
+            **{f'stars_{stars}': Count('id', filter=Q(rating=stars)) for stars in STARS},
+        )
+    }
+
+    changed = []
+    for realtor in realtors:
+        row = totals.get(realtor.id, {})
+        values = {
+            'total_reviews': row.get('total', 0),
+            'rating_sum': row.get('rating_total') or 0,
+            **{f'rating_count_{stars}': row.get(f'stars_{stars}', 0) for stars in STARS},
+        }
+        values['average_rating'] = (
+            (Decimal(values['rating_sum']) / values['total_reviews']).quantize(Decimal('0.01'), ROUND_HALF_UP)
+            if values['total_reviews'] else Decimal('0.00')
+        )
+        if any(getattr(realtor, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(realtor, field, value)
+            changed.append(realtor)
+    Realtor.objects.bulk_update(changed, RATING_FIELDS, batch_size=500)
+    return len(changed)
@@ -0,0 +1,214 @@
+"""
+Hourly and daily per-listing activity rollups.
+
+``ListingAnalytics`` only keeps lifetime totals. Trends come from
+``ListingAnalyticsBucket`` rows, one per listing, granularity and hour/day,
+which ``rollup_listing_analytics`` fills from the raw activity tables:
+
+* ``views`` from ``ListingView`` (first views per viewer, see the model),
+* ``saves`` and ``inquiries`` from ``accounts.UserActivity``,
+* ``tours_scheduled`` from ``accounts.Tour``.
+
+Each source keeps a ``RollupWatermark``; a run only aggregates rows created
+after it (an indexed range scan grouped by listing and hour in the database)
+and adds the counts onto the existing buckets. Rows newer than
+``ANALYTICS_ROLLUP_LAG_SECONDS`` are left for the next run, so a transaction
+that commits a little after its rows' timestamps is not skipped.
+
+``listing_time_series`` reads only the buckets.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import ListingAnalyticsBucket, RollupWatermark
+
+METRICS = ('views', 'saves', 'inquiries', 'tours_scheduled')
+GRANULARITIES = ('hour', 'day')
+# Longest range per request, in days
+MAX_RANGE_DAYS = {'hour': 31, 'day': 366}
+DEFAULT_RANGE_DAYS = {'hour': 2, 'day': 30}
+
+RollupSource = namedtuple('RollupSource', 'name model timestamp filters metric')
+
+ROLLUP_SOURCES = [
+    RollupSource('listing_views', 'listings.ListingView', 'viewed_at', {}, 'views'),
+    RollupSource(
+        'saves', 'backend_accounts.UserActivity', 'created_at',
+        {'activity_type__in': ['property_saved', 'favorite_added']}, 'saves',
+    ),
+    RollupSource(
+        'inquiries', 'backend_accounts.UserActivity', 'created_at', {'activity_type': 'message_sent'}, 'inquiries',
+    ),
+    RollupSource('tours', 'backend_accounts.Tour', 'created_at', {}, 'tours_scheduled'),
+]
+
+
+def day_start(moment):
+    """Midnight (in the current time zone) of the day containing ``moment``"""
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def hourly_counts(source, after, until):
+    """``(listing_id, hour, count)`` for a source's rows in ``(after, until]``"""
+    rows = apps.get_model(source.model).objects.filter(
+        listing__isnull=False, **source.filters, **{f'{source.timestamp}__lte': until}
+    )
+    if after is not None:
+        rows = rows.filter(**{f'{source.timestamp}__gt': after})
+    return (
+        rows.annotate(bucket=TruncHour(source.timestamp))
+        .order_by()
+        .values_list('listing_id', 'bucket')
+        .annotate(count=Count('pk'))
+    )
+
+
+def add_to_buckets(granularity, counts):
+    """Add ``{(listing_id, bucket_start): {metric: n}}`` onto the stored buckets"""
+    if not counts:
+        return 0, 0
+    listing_ids = {listing_id for listing_id, _ in counts}
+    starts = [start for _, start in counts]
+    existing = {
+        (bucket.listing_id, bucket.bucket_start): bucket
+        for bucket in ListingAnalyticsBucket.objects.filter(
+            granularity=granularity, listing_id__in=listing_ids,
+            bucket_start__gte=min(starts), bucket_start__lte=max(starts),
+        )
+    }
+    created, updated = [], []
+    for (listing_id, start), metrics in counts.items():
+        bucket = existing.get((listing_id, start))
+        if bucket is None:
+            created.append(ListingAnalyticsBucket(
+                listing_id=listing_id, granularity=granularity, bucket_start=start, **metrics,
+            ))
+            continue
+        for metric, count in metrics.items():
+            setattr(bucket, metric, getattr(bucket, metric) + count)
+        updated.append(bucket)
+    ListingAnalyticsBucket.objects.bulk_create(created, batch_size=500)
+    ListingAnalyticsBucket.objects.bulk_update(updated, METRICS, batch_size=500)
+    return len(created), len(updated)
+
+
+def rollup_listing_analytics(until=None):
+    """
+    Roll raw activity up to ``until`` (default: now minus the lag) into hourly
+    and daily buckets. Returns counts of rows read and buckets written.
+    """
+    if until is None:
+        until = timezone.now() - timedelta(seconds=getattr(settings, 'ANALYTICS_ROLLUP_LAG_SECONDS', 300))
+    report = {'until': until, 'rows': {}, 'buckets_created': 0, 'buckets_updated': 0}
+    names = [source.name for source in ROLLUP_SOURCES]
+
+    with transaction.atomic():
+        RollupWatermark.objects.bulk_create(
+            [RollupWatermark(source=name) for name in names], ignore_conflicts=True,
+        )
+        # Locking the watermarks serialises concurrent runs, so no rows are counted twice
+        watermarks = {
+            mark.source: mark
+            for mark in RollupWatermark.objects.select_for_update().filter(source__in=names)
+        }
+        hourly = defaultdict(lambda: defaultdict(int))
+        daily = defaultdict(lambda: defaultdict(int))
+        advanced = []
+        for source in ROLLUP_SOURCES:
+            mark = watermarks[source.name]
+            if mark.processed_until is not None and mark.processed_until >= until:
+                continue
+            rows = 0
+            for listing_id, hour, count in hourly_counts(source, mark.processed_until, until):
+                hourly[listing_id, hour][source.metric] += count
+                daily[listing_id, day_start(hour)][source.metric] += count
+                rows += count
+            report['rows'][source.name] = rows
+            mark.processed_until = until
+            advanced.append(mark)
+
+        for granularity, counts in (('hour', hourly), ('day', daily)):
+            created, updated = add_to_buckets(granularity, counts)
+            report['buckets_created'] += created
+            report['buckets_updated'] += updated
+        if advanced:
+            now = timezone.now()
+            for mark in advanced:
+                mark.updated_at = now
+            RollupWatermark.objects.bulk_update(advanced, ['processed_until', 'updated_at'])
+    return report
+
+
+def parse_range(granularity, start, end):
+    """Validate the query parameters; returns ``(granularity, start_date, end_date)``"""
+    granularity = granularity or 'day'
+    if granularity not in GRANULARITIES:
+        raise ValidationError({'granularity': f'Expected one of: {", ".join(GRANULARITIES)}'})
+    dates = {}
+    for param, value in (('start', start), ('end', end)):
+        try:
+            dates[param] = parse_date(value) if value else None
+        except ValueError:
+            dates[param] = None
+        if value and dates[param] is None:
+            raise ValidationError({param: 'Expected a date as YYYY-MM-DD.'})
+    end_date = dates['end'] or timezone.localdate()
+    start_date = dates['start'] or end_date - timedelta(days=DEFAULT_RANGE_DAYS[granularity] - 1)
+    if start_date > end_date:
+        raise ValidationError({'start': 'Must not be after end.'})
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS[granularity]:
+        raise ValidationError({'end': f'At most {MAX_RANGE_DAYS[granularity]} days per {granularity} series.'})
+    return granularity, start_date, end_date
+
+
+def listing_time_series(listing_id, granularity, start_date, end_date):
+    """
+    Buckets of one listing between two dates (inclusive, current time zone),
+    with empty hours/days filled with zeros, plus totals for the range.
+    """
+    range_start = timezone.make_aware(datetime.combine(start_date, time.min))
+    range_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    stored = {
+        row['bucket_start']: row
+        for row in ListingAnalyticsBucket.objects.filter(
+            listing_id=listing_id, granularity=granularity,
+            bucket_start__gte=range_start, bucket_start__lt=range_end,
+        ).values('bucket_start', *METRICS)
+    }
+
+    if granularity == 'hour':
+        # Step in UTC so DST changes neither skip nor repeat an hour
+        count = int((range_end - range_start).total_seconds() // 3600)
+        starts = [range_start + timedelta(hours=offset) for offset in range(count)]
+    else:
+        starts = [
+            timezone.make_aware(datetime.combine(start_date + timedelta(days=offset), time.min))
+            for offset in range((end_date - start_date).days + 1)
+        ]
+
+    totals = dict.fromkeys(METRICS, 0)
+    series = []
+    for start in starts:
+        row = stored.get(start, {})
+        point = {'start': timezone.localtime(start).isoformat()}
+        for metric in METRICS:
+            point[metric] = row.get(metric, 0)
+            totals[metric] += point[metric]
+        series.append(point)
+    return {
+        'listing': listing_id,
+        'granularity': granularity,
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'totals': totals,
+        'series': series,
+    }
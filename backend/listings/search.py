@@ -0,0 +1,457 @@
+"""
+Ranked full-text search for listings.
+
+Two interchangeable engines sit behind ``get_search_backend()``:
+
+- ``InMemorySearchBackend`` keeps an inverted index of published listings in
+  process memory and scores matches with BM25. It is kept current by the
+  Listing post_save/post_delete signals and a periodic ``updated_at`` delta
+  sync, so listings saved by other workers show up too.
+- ``PostgresSearchBackend`` ranks against the ``search_vector`` tsvector
+  column, which is covered by a GIN index on PostgreSQL.
+
+Both restrict the queryset to every matching listing, annotate it with
+``search_rank`` (featured listings optionally boosted) and leave ordering to
+the caller.
+"""
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, F, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+# Relative importance of each searchable field
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'address': 1.5,
+    'city': 1.5,
+    'state': 1.0,
+    'description': 1.0,
+}
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'at', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with',
+])
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Text search configuration used by the PostgreSQL engine
+SEARCH_CONFIG = 'english'
+
+
+def tokenize(text):
+    """Split text into lowercase search terms, dropping stop words"""
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS]
+
+
+def featured_boost():
+    return float(getattr(settings, 'LISTING_SEARCH_FEATURED_BOOST', 0.25))
+
+
+def scored_results():
+    return int(getattr(settings, 'LISTING_SEARCH_SCORED_RESULTS', 1000))
+
+
+class BaseSearchBackend:
+    """Interface shared by the listing search engines"""
+    name = None
+
+    def search(self, queryset, query):
+        """Restrict queryset to matches for query, annotated with ``search_rank``"""
+        raise NotImplementedError
+
+    def listing_saved(self, listing):
+        """Called from the Listing post_save signal"""
+
+    def listing_deleted(self, listing_id):
+        """Called from the Listing post_delete signal"""
+
+    def listings_bulk_saved(self, listing_ids):
+        """Called after bulk writes that bypass the save signals"""
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Per-process inverted index over published listings with BM25 scoring.
+
+    Postings map each term to ``{listing_id: weighted term frequency}``, where
+    the frequency is summed over fields using ``FIELD_WEIGHTS``. All terms in a
+    query must match; the last term is also treated as a prefix so partial
+    words typed into the search box still match.
+    """
+    name = 'memory'
+    K1 = 1.2
+    B = 0.75
+    MAX_PREFIX_EXPANSIONS = 64
+
+    def __init__(self, refresh_interval=None):
+        if refresh_interval is None:
+            refresh_interval = getattr(settings, 'LISTING_SEARCH_REFRESH_SECONDS', 60)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._total_len = 0.0
+        self._featured = set()
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        self._norms = None
+        self._loaded = False
+        self._watermark = None
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    # ---- index maintenance ----
+
+    def index_document(self, listing_id, fields, is_featured=False):
+        """Add or replace one listing in the index"""
+        weighted = Counter()
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(fields.get(field))
+            length += weight * len(tokens)
+            for token in tokens:
+                weighted[token] += weight
+
+        with self._lock:
+            self._remove(listing_id)
+            for term, frequency in weighted.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._vocabulary_dirty = True
+                postings[listing_id] = frequency
+            self._doc_terms[listing_id] = tuple(weighted)
+            self._doc_len[listing_id] = length
+            self._total_len += length
+            self._norms = None
+            if is_featured:
+                self._featured.add(listing_id)
+
+    def remove_document(self, listing_id):
+        with self._lock:
+            self._remove(listing_id)
+
+    def _remove(self, listing_id):
+        for term in self._doc_terms.pop(listing_id, ()):
+            postings = self._postings[term]
+            del postings[listing_id]
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+        self._total_len -= self._doc_len.pop(listing_id, 0.0)
+        self._featured.discard(listing_id)
+        self._norms = None
+
+    def _index_row(self, row):
+        listing_id, title, description, address, city, state, is_published, is_featured = row
+        if not is_published:
+            self._remove(listing_id)
+            return
+        self.index_document(listing_id, {
+            'title': title,
+            'description': description,
+            'address': address,
+            'city': city,
+            'state': state,
+        }, is_featured)
+
+    def rebuild(self):
+        """Reload the whole index from the database"""
+        from .models import Listing
+
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._total_len = 0.0
+            self._featured = set()
+            self._norms = None
+            self._vocabulary_dirty = True
+            self._watermark = None
+            self._sync_rows(Listing.objects.filter(is_published=True))
+            self._loaded = True
+            self._checked_at = time.monotonic()
+
+    def _sync_rows(self, queryset):
+        rows = queryset.values_list(
+            'id', 'title', 'description', 'address', 'city', 'state',
+            'is_published', 'is_featured', 'updated_at',
+        ).order_by()
+        for row in rows.iterator(chunk_size=2000):
+            self._index_row(row[:-1])
+            if self._watermark is None or row[-1] > self._watermark:
+                self._watermark = row[-1]
+
+    def ensure_fresh(self):
+        """Build the index on first use and pull ``updated_at`` deltas afterwards"""
+        if self._loaded and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        from .models import Listing
+
+        with self._lock:
+            if not self._loaded:
+                self.rebuild()
+            elif time.monotonic() - self._checked_at >= self.refresh_interval:
+                if self._watermark is not None:
+                    self._sync_rows(Listing.objects.filter(updated_at__gte=self._watermark))
+                else:
+                    self._sync_rows(Listing.objects.filter(is_published=True))
+                self._checked_at = time.monotonic()
+
+    def listing_saved(self, listing):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._index_row((
+                listing.pk, listing.title, listing.description, listing.address,
+                listing.city, listing.state, listing.is_published, listing.is_featured,
+            ))
+
+    def listing_deleted(self, listing_id):
+        if self._loaded:
+            self.remove_document(listing_id)
+
+    def listings_bulk_saved(self, listing_ids):
+        if not self._loaded:
+            return
+        from .models import Listing
+
+        with self._lock:
+            self._sync_rows(Listing.objects.filter(id__in=listing_ids))
+
+    # ---- querying ----
+
+    def _expand(self, term, prefix):
+        """Return index terms matching term, optionally as a prefix"""
+        if not prefix:
+            return [term] if term in self._postings else []
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, term)
+        matches = []
+        for candidate in self._vocabulary[start:start + self.MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def _length_norms(self, avg_len):
+        """Per-listing BM25 length normalisation, cached until the index changes"""
+        if self._norms is None:
+            k1, b = self.K1, self.B
+            self._norms = {
+                listing_id: k1 * (1 - b + b * length / avg_len)
+                for listing_id, length in self._doc_len.items()
+            }
+        return self._norms
+
+    def _score_term(self, terms, doc_count, norms, candidates=None):
+        """
+        BM25 contribution of one query term, taking the best matching
+        expansion. When ``candidates`` is given only those listings are scored.
+        """
+        scores = {}
+        k1_plus_1 = self.K1 + 1
+        for term in terms:
+            postings = self._postings[term]
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            if candidates is None:
+                matched = postings.items()
+            elif len(candidates) < df:
+                matched = [(listing_id, postings[listing_id]) for listing_id in candidates if listing_id in postings]
+            else:
+                matched = [(listing_id, frequency) for listing_id, frequency in postings.items() if listing_id in candidates]
+            for listing_id, frequency in matched:
+                score = idf * frequency * k1_plus_1 / (frequency + norms[listing_id])
+                if score > scores.get(listing_id, 0.0):
+                    scores[listing_id] = score
+        return scores
+
+    def scores(self, query):
+        """``{listing_id: score}`` for every listing matching query"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return {}
+        self.ensure_fresh()
+
+        with self._lock:
+            doc_count = len(self._doc_len)
+            if not doc_count:
+                return {}
+            norms = self._length_norms((self._total_len / doc_count) or 1.0)
+
+            expansions = []
+            for position, term in enumerate(terms):
+                matches = self._expand(term, prefix=position == len(terms) - 1)
+                if not matches:
+                    return {}
+                expansions.append(matches)
+            # Intersect from the rarest term so candidate sets shrink quickly
+            expansions.sort(key=lambda matches: sum(len(self._postings[t]) for t in matches))
+
+            scores = None
+            for matches in expansions:
+                term_scores = self._score_term(matches, doc_count, norms, candidates=scores)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        listing_id: scores[listing_id] + score
+                        for listing_id, score in term_scores.items()
+                    }
+                if not scores:
+                    return {}
+
+            boost = featured_boost()
+            if boost:
+                for listing_id in self._featured.intersection(scores):
+                    scores[listing_id] *= 1 + boost
+        return scores
+
+    def rank(self, query, limit=None):
+        """Return ``[(listing_id, score), ...]`` best first"""
+        scores = self.scores(query)
+        if limit is None:
+            return sorted(scores.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+
+    def search(self, queryset, query):
+        scores = self.scores(query)
+        if not scores:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        # IDs and scores are inlined as numeric literals: a CASE built from
+        # When() objects costs more to compile than the query takes to run,
+        # and a broad query can match more IDs than the database takes as
+        # parameters. Every match is kept, so counts and explicit orderings
+        # cover all of them; only the best ``scored_results()`` are scored,
+        # as the CASE is scanned for each row.
+        column = '%s.%s' % (
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name('id'),
+        )
+        ids = ','.join('%d' % listing_id for listing_id in scores)
+        ranked = heapq.nlargest(scored_results(), scores.items(), key=itemgetter(1))
+        whens = ' '.join('WHEN %d THEN %r' % (listing_id, score) for listing_id, score in ranked)
+        return queryset.filter(RawSQL(f'{column} IN ({ids})', (), output_field=BooleanField())).annotate(
+            search_rank=RawSQL(f'CASE {column} {whens} ELSE 0.0 END', (), output_field=FloatField())
+        )
+
+
+def build_search_vector():
+    """Weighted tsvector expression stored in ``Listing.search_vector``"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('address', 'city', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('state', weight='C', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    tsvector/tsquery engine backed by the GIN-indexed ``search_vector`` column.
+
+    ``ts_rank`` with length normalisation (flag 1) stands in for BM25: term
+    frequency weighted by field, damped by document length.
+    """
+    name = 'postgres'
+    RANK_WEIGHTS = [0.1, 0.2, 0.4, 1.0]  # D, C, B, A
+
+    def build_query(self, query):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return None
+        terms[-1] = f'{terms[-1]}:*'
+        return SearchQuery(' & '.join(terms), search_type='raw', config=SEARCH_CONFIG)
+
+    def search(self, queryset, query):
+        search_query = self.build_query(query)
+        if search_query is None:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        rank = SearchRank(
+            F('search_vector'), search_query,
+            weights=self.RANK_WEIGHTS, normalization=Value(1),
+        )
+        boost = featured_boost()
+        if boost:
+            rank = Case(
+                When(is_featured=True, then=rank * Value(1 + boost)),
+                default=rank,
+                output_field=FloatField(),
+            )
+        return queryset.filter(search_vector=search_query).annotate(search_rank=rank)
+
+    def listing_saved(self, listing):
+        from .models import Listing
+        Listing.objects.filter(pk=listing.pk).update(search_vector=build_search_vector())
+
+    def listings_bulk_saved(self, listing_ids):
+        from .models import Listing
+        Listing.objects.filter(pk__in=listing_ids).update(search_vector=build_search_vector())
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the configured engine. ``LISTING_SEARCH_BACKEND`` may be
+    ``memory``, ``postgres`` or ``auto`` (PostgreSQL when the database is).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, 'LISTING_SEARCH_BACKEND', 'auto')
+                if choice == 'auto':
+                    choice = 'postgres' if connection.vendor == 'postgresql' else 'memory'
+                if choice == 'postgres':
+                    _backend = PostgresSearchBackend()
+                else:
+                    _backend = InMemorySearchBackend()
+    return _backend
+
+
+def reset_search_backend():
+    """Drop the cached engine so the next call rebuilds it"""
+    global _backend
+    _backend = None
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for DRF's SearchFilter that uses the ranked search
+    engine. Results are ordered by relevance unless the client asked for an
+    explicit ``ordering``, so this filter must run after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        queryset = get_search_backend().search(queryset, ' '.join(terms))
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-list_date')
+        return queryset
@@ -1,9 +1,24 @@
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from .models import (
     Listing, PropertyCategory, PropertyFeature, 
-    ListingAnalytics, PriceHistory, RealtorReview, PropertyModeration
+    ListingAnalytics, ListingPhoto, PriceHistory, RealtorReview, PropertyModeration
 )
 from realtors.serializers import RealtorSerializer
+from .derivatives import srcset
+from .moderation import QUEUE_STATUSES, lease_active, release_claim
+from .photos import with_main_photo_variants
+
+# Most recent price events embedded in a listing
+PRICE_HISTORY_LIMIT = 20
+
+
+def recent_price_history(limit=PRICE_HISTORY_LIMIT):
+    """Latest ``limit`` price events per listing, for prefetching across many listings"""
+    return PriceHistory.objects.annotate(
+        recency=Window(RowNumber(), partition_by=F('listing_id'), order_by=F('created_at').desc()),
+    ).filter(recency__lte=limit).order_by('-created_at')
 
 class PropertyCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,13 +33,23 @@ class PropertyFeatureSerializer(serializers.ModelSerializer):
 class ListingAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ListingAnalytics
-        fields = ['views', 'saves', 'inquiries', 'tours_scheduled', 'last_viewed']
+        fields = ['views', 'unique_viewers', 'saves', 'inquiries', 'tours_scheduled', 'last_viewed']
 
 class PriceHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = PriceHistory
         fields = ['price', 'event_type', 'notes', 'created_at']
 
+class ListingPhotoSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ListingPhoto
+        fields = ['id', 'position', 'url', 'width', 'height', 'is_main', 'source', 'slot', 'file', 'srcset']
+
+    def get_srcset(self, obj):
+        return srcset(obj.variants)
+
 class ListingSerializer(serializers.ModelSerializer):
     """
     Serializer for Listing model with all fields
@@ -39,22 +64,36 @@ class ListingSerializer(serializers.ModelSerializer):
     # Computed fields
     days_on_market = serializers.ReadOnlyField()
     price_per_sqft = serializers.ReadOnlyField()
+    photo_main_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = [
             'id', 'realtor', 'realtor_id', 'title', 'address', 'city', 'state', 
-            'zipcode', 'neighborhood', 'description', 'price', 'listing_type',
+            'zipcode', 'neighborhood', 'latitude', 'longitude', 'description', 'price', 'listing_type',
             'category', 'property_type', 'bedrooms', 'bathrooms', 'garage', 
             'parking_spaces', 'sqft', 'lot_size', 'year_built', 'floors', 
             'fireplaces', 'heating', 'cooling', 'hoa_fee', 'property_taxes',
             'features', 'photo_main', 'photo_1', 'photo_2', 'photo_3', 
             'photo_4', 'photo_5', 'photo_6', 'is_published', 'is_featured',
             'list_date', 'updated_at', 'analytics', 'price_history',
-            'days_on_market', 'price_per_sqft'
+            'days_on_market', 'price_per_sqft', 'photo_main_srcset'
         ]
         read_only_fields = ('id', 'list_date', 'updated_at', 'days_on_market', 'price_per_sqft')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch everything this serializer reads in a fixed number of queries"""
+        return with_main_photo_variants(queryset).select_related('realtor__user', 'category', 'analytics').defer(
+            'analytics__viewer_sketch',
+        ).prefetch_related(
+            'features',
+            Prefetch('price_history', queryset=recent_price_history()),
+        )
+
+    def get_photo_main_srcset(self, obj):
+        return srcset(getattr(obj, 'photo_main_variants', None))
+
     def validate_price(self, value):
         """Validate that price is positive"""
         if value <= 0:
@@ -87,16 +126,25 @@ class ListingListSerializer(serializers.ModelSerializer):
     realtor_name = serializers.CharField(source='realtor.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     days_on_market = serializers.ReadOnlyField()
+    photo_main_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = [
             'id', 'title', 'address', 'city', 'state', 'neighborhood', 'price', 
             'listing_type', 'property_type', 'bedrooms', 'bathrooms', 'sqft', 
-            'photo_main', 'realtor_name', 'category_name', 'list_date', 'description',
-            'is_featured', 'days_on_market'
+            'photo_main', 'photo_main_srcset', 'realtor_name', 'category_name', 'list_date', 'description',
+            'is_featured', 'days_on_market', 'latitude', 'longitude'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join the realtor and category read for every row, and the main photo's variants"""
+        return with_main_photo_variants(queryset).select_related('realtor', 'category')
+
+    def get_photo_main_srcset(self, obj):
+        return srcset(getattr(obj, 'photo_main_variants', None))
+
 class RealtorReviewSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     
@@ -122,7 +170,7 @@ class ListingCreateSerializer(serializers.ModelSerializer):
         model = Listing
         fields = [
             'realtor', 'title', 'address', 'city', 'state', 'zipcode',
-            'description', 'price', 'listing_type', 'property_type',
+            'latitude', 'longitude', 'description', 'price', 'listing_type', 'property_type',
             'bedrooms', 'bathrooms', 'sqft', 'lot_size', 'year_built',
             'garage', 'parking_spaces', 'floors', 'fireplaces',
             'heating', 'cooling', 'hoa_fee', 'property_taxes',
@@ -157,8 +205,8 @@ class ListingUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Listing
         fields = [
-            'title', 'address', 'city', 'state', 'zipcode', 'description', 
-            'price', 'bedrooms', 'bathrooms', 'garage', 'sqft', 'lot_size', 
+            'title', 'address', 'city', 'state', 'zipcode', 'latitude', 'longitude',
+            'description', 'price', 'bedrooms', 'bathrooms', 'garage', 'sqft', 'lot_size', 
             'photo_main', 'photo_1', 'photo_2', 'photo_3', 'photo_4', 
             'photo_5', 'photo_6', 'is_published'
         ]
@@ -194,18 +242,39 @@ class PropertyModerationSerializer(serializers.ModelSerializer):
     listing = ModerationListingSerializer(read_only=True)
     listing_id = serializers.IntegerField(write_only=True)
     reviewed_by_name = serializers.SerializerMethodField()
-    days_pending = serializers.ReadOnlyField()
+    days_pending = serializers.SerializerMethodField()
+    claimed_by = serializers.SerializerMethodField()
     
     class Meta:
         model = PropertyModeration
         fields = [
-            'id', 'listing', 'listing_id', 'status', 'priority', 
+            'id', 'listing', 'listing_id', 'status', 'priority', 'priority_rank',
             'submitted_date', 'reviewed_date', 'reviewed_by', 'reviewed_by_name',
             'reason', 'notes', 'report_count', 'days_pending',
+            'claimed_by', 'lease_expires_at',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['submitted_date', 'created_at', 'updated_at', 'days_pending']
+        read_only_fields = [
+            'submitted_date', 'created_at', 'updated_at', 'days_pending', 'priority_rank', 'lease_expires_at',
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join the listing (with its realtor and category) and the reviewer"""
+        return queryset.select_related('listing__realtor', 'listing__category', 'reviewed_by')
     
+    def get_days_pending(self, obj):
+        """Annotated by the queue views (listings.moderation.with_days_pending)"""
+        days = getattr(obj, 'days_pending', None)
+        if days is None:
+            from django.utils import timezone
+            days = (timezone.now().date() - obj.submitted_date.date()).days
+        return days
+
+    def get_claimed_by(self, obj):
+        """The moderator holding an unexpired lease, if any"""
+        return obj.claimed_by_id if lease_active(obj) else None
+
     def get_reviewed_by_name(self, obj):
         """Get the name of the user who reviewed the property"""
         if obj.reviewed_by:
@@ -225,6 +294,9 @@ class PropertyModerationUpdateSerializer(serializers.ModelSerializer):
         if 'status' in validated_data:
             from django.utils import timezone
             instance.reviewed_date = timezone.now()
+            if validated_data['status'] not in QUEUE_STATUSES:
+                # Decided: the item leaves the work queue
+                release_claim(instance)
         
         return super().update(instance, validated_data)
     """
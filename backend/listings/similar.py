@@ -0,0 +1,208 @@
+"""
+Precomputed "similar listings".
+
+``compute_similar_listings`` encodes every published listing as a feature
+vector and stores each listing's ``SIMILAR_LISTINGS_COUNT`` nearest
+neighbours (same ``listing_type``) in ``SimilarListing``, so the
+``/listings/<id>/similar/`` endpoint is one indexed lookup.
+
+The vector holds log2 price and sqft (one unit per doubling), bedrooms and
+bathrooms, and one-hot property type, city and ``PropertyFeature`` bits, each
+block weighted so that a mismatch costs a comparable squared distance. The
+scales are fixed rather than fitted to the catalogue, so the distance between
+two listings only changes when one of them does. Scores are
+``1 / (1 + squared distance)``, computed for blocks of rows against the whole
+catalogue with one matrix product per block.
+
+Runs are incremental: after the first, only listings changed since the last
+run (``updated_at``, which feature edits also touch) are scored against the
+catalogue. The other lists are recomputed only when they contain a changed
+or unpublished listing, are short, or a changed listing now beats their
+weakest neighbour.
+"""
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+WATERMARK_SOURCE = 'similar_listings'
+# Squared-distance weight of each block: a price or size doubling, 2 bedrooms
+# or bathrooms, another property type or city, or 4 differing features cost ~1
+NUMERIC_SCALES = {'price': 1.0, 'sqft': 1.0, 'bedrooms': 0.5, 'bathrooms': 0.5}
+ONE_HOT_WEIGHT = np.sqrt(0.5)
+FEATURE_WEIGHT = np.sqrt(0.125)
+# Similarity matrix elements per block (float32), bounding memory per step
+BLOCK_ELEMENTS = 4_000_000
+
+
+def similar_count():
+    return getattr(settings, 'SIMILAR_LISTINGS_COUNT', 8)
+
+
+def encode_listings(rows, feature_bits):
+    """
+    ``(ids, vectors)`` for ``(id, listing_type, price, sqft, bedrooms,
+    bathrooms, property_type, city)`` rows and ``{id: feature ids}``.
+    """
+    from .models import Listing
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    columns = {}
+    for position, column in enumerate(('price', 'sqft', 'bedrooms', 'bathrooms'), start=2):
+        values = np.array([float(row[position] or 0) for row in rows], dtype=np.float64)
+        if column in ('price', 'sqft'):
+            values = np.log2(np.maximum(values, 1.0))
+        columns[column] = values * NUMERIC_SCALES[column]
+
+    property_types = [choice for choice, _ in Listing.PROPERTY_TYPE_CHOICES]
+    cities = sorted({(row[7] or '').strip().lower() for row in rows})
+    features = sorted({feature for bits in feature_bits.values() for feature in bits})
+    offsets = {'property_type': 4, 'city': 4 + len(property_types), 'features': 4 + len(property_types) + len(cities)}
+    vectors = np.zeros((len(rows), offsets['features'] + len(features)), dtype=np.float32)
+    for index, column in enumerate(('price', 'sqft', 'bedrooms', 'bathrooms')):
+        vectors[:, index] = columns[column]
+
+    type_index = {value: index for index, value in enumerate(property_types)}
+    city_index = {value: index for index, value in enumerate(cities)}
+    feature_index = {value: index for index, value in enumerate(features)}
+    for position, row in enumerate(rows):
+        if row[6] in type_index:
+            vectors[position, offsets['property_type'] + type_index[row[6]]] = ONE_HOT_WEIGHT
+        vectors[position, offsets['city'] + city_index[(row[7] or '').strip().lower()]] = ONE_HOT_WEIGHT
+        for feature in feature_bits.get(row[0], ()):
+            vectors[position, offsets['features'] + feature_index[feature]] = FEATURE_WEIGHT
+    return ids, vectors
+
+
+def similarity(distance):
+    """Score in (0, 1] for a squared distance"""
+    return 1.0 / (1.0 + distance)
+
+
+def distance_blocks(vectors, rows):
+    """Yield ``(row positions, squared distances to every vector)`` a block at a time"""
+    squared = np.einsum('ij,ij->i', vectors, vectors)
+    size = max(1, BLOCK_ELEMENTS // max(1, len(vectors)))
+    for start in range(0, len(rows), size):
+        block = rows[start:start + size]
+        distances = squared[block, None] + squared[None, :] - 2.0 * (vectors[block] @ vectors.T)
+        np.maximum(distances, 0.0, out=distances)
+        distances[np.arange(len(block)), block] = np.inf  # never your own neighbour
+        yield block, distances
+
+
+def top_neighbours(vectors, rows, k):
+    """``{row position: [(neighbour position, score), ...]}``, best first"""
+    result = {}
+    count = min(k, len(vectors) - 1)
+    for block, distances in distance_blocks(vectors, rows):
+        if count <= 0:
+            result.update((row, []) for row in block.tolist())
+            continue
+        candidates = np.argpartition(distances, count - 1, axis=1)[:, :count]
+        picked = np.take_along_axis(distances, candidates, axis=1)
+        # Nearest first, ties broken by position (i.e. listing ID)
+        order = np.lexsort((candidates, picked), axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1).tolist()
+        scores = similarity(np.take_along_axis(picked, order, axis=1)).tolist()
+        for offset, row in enumerate(block.tolist()):
+            result[row] = list(zip(candidates[offset], scores[offset]))
+    return result
+
+
+def compute_similar_listings(full=False, k=None):
+    """
+    Refresh the neighbour table. Returns counts of listings encoded, changed
+    since the last run and recomputed.
+    """
+    from .cache import bump_cache_version
+    from .models import Listing, RollupWatermark, SimilarListing
+
+    k = k or similar_count()
+    started = time.perf_counter()
+    run_started = timezone.now()
+    mark, _ = RollupWatermark.objects.get_or_create(source=WATERMARK_SOURCE)
+    if full or mark.processed_until is None:
+        full = True
+
+    rows = list(
+        Listing.objects.filter(is_published=True).order_by('id').values_list(
+            'id', 'listing_type', 'price', 'sqft', 'bedrooms', 'bathrooms', 'property_type', 'city', 'updated_at',
+        )
+    )
+    feature_bits = defaultdict(list)
+    through = Listing.features.through
+    for listing_id, feature_id in through.objects.filter(listing__is_published=True).values_list(
+        'listing_id', 'propertyfeature_id'
+    ):
+        feature_bits[listing_id].append(feature_id)
+    changed_ids = {row[0] for row in rows if full or row[8] > mark.processed_until}
+
+    stored = defaultdict(list)
+    if not full:
+        for listing_id, neighbour_id, score in SimilarListing.objects.order_by('listing_id', 'rank').values_list(
+            'listing_id', 'neighbour_id', 'score'
+        ):
+            stored[listing_id].append((neighbour_id, score))
+
+    published = {row[0] for row in rows}
+    removed = {listing_id for listing_id in stored if listing_id not in published}
+    recomputed = set()
+    neighbours = {}
+    for listing_type in sorted({row[1] for row in rows}):
+        group = [row for row in rows if row[1] == listing_type]
+        ids, vectors = encode_listings(group, feature_bits)
+        positions = {int(listing_id): position for position, listing_id in enumerate(ids)}
+        changed = [positions[listing_id] for listing_id in ids.tolist() if listing_id in changed_ids]
+
+        if full:
+            affected = set(range(len(ids)))
+        else:
+            affected = set(changed)
+            wanted = min(k, len(ids) - 1)
+            weakest = np.full(len(ids), np.inf)
+            for position, listing_id in enumerate(ids.tolist()):
+                entries = stored.get(listing_id, [])
+                stale = any(neighbour in changed_ids or neighbour not in published for neighbour, _ in entries)
+                if stale or len(entries) < wanted:
+                    affected.add(position)
+                elif entries:
+                    weakest[position] = entries[-1][1]
+            # Distance is symmetric: a changed listing enters every list whose weakest neighbour it beats
+            for block, distances in distance_blocks(vectors, np.array(changed, dtype=np.int64)):
+                affected.update(np.flatnonzero((similarity(distances) > weakest[None, :]).any(axis=0)).tolist())
+
+        for position, entries in top_neighbours(vectors, np.array(sorted(affected), dtype=np.int64), k).items():
+            neighbours[int(ids[position])] = [(int(ids[neighbour]), score) for neighbour, score in entries]
+        recomputed.update(int(ids[position]) for position in affected)
+
+    with transaction.atomic():
+        if full:
+            SimilarListing.objects.all().delete()
+        else:
+            replaced = sorted(recomputed | removed)
+            for start in range(0, len(replaced), 500):
+                SimilarListing.objects.filter(listing_id__in=replaced[start:start + 500]).delete()
+        SimilarListing.objects.bulk_create(
+            [
+                SimilarListing(listing_id=listing_id, rank=rank, neighbour_id=neighbour_id, score=score)
+                for listing_id, entries in neighbours.items()
+                for rank, (neighbour_id, score) in enumerate(entries)
+            ],
+            batch_size=1000,
+        )
+        mark.processed_until = run_started
+        mark.save(update_fields=['processed_until', 'updated_at'])
+    if recomputed or removed:
+        bump_cache_version('similar')
+
+    return {
+        'listings': len(rows),
+        'changed': len(changed_ids),
+        'recomputed': len(recomputed),
+        'full': full,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,359 @@
+"""
+Columnar in-memory snapshot of published listings.
+
+Most listing traffic is numeric range filtering and sorting on a handful of
+columns. ``ListingSnapshot`` keeps those columns as NumPy arrays per process,
+answers the filters with vectorized boolean masks and orders matches through
+permutations precomputed per sort key, so a request only has to hydrate its
+page of rows from the database.
+
+The snapshot refreshes itself from ``updated_at`` deltas at most every
+``LISTING_SNAPSHOT_REFRESH_SECONDS`` and falls back to a full rebuild when the
+published row count no longer matches (hard deletes made by other workers).
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from .featurebits import feature_values, mask_of, resolve_features
+from .metrics import DAYS_ON_MARKET_PARAMS, list_date_bounds, parse_price_per_sqft, resolve_ordering
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+NUMERIC_COLUMNS = {
+    'price': np.int64,
+    'sqft': np.int64,
+    'bedrooms': np.int32,
+    'bathrooms': np.float64,
+    'price_per_sqft': np.float64,
+    'feature_mask': np.int64,
+    'list_date': np.int64,  # microseconds since epoch
+}
+CATEGORICAL_COLUMNS = ('property_type', 'listing_type', 'city')
+
+# Range filters: query param -> (column, comparison)
+RANGE_PARAMS = {
+    'min_price': ('price', 'gte'),
+    'max_price': ('price', 'lte'),
+    'min_sqft': ('sqft', 'gte'),
+    'max_sqft': ('sqft', 'lte'),
+    'min_ppsf': ('price_per_sqft', 'gte'),
+    'max_ppsf': ('price_per_sqft', 'lte'),
+}
+EXACT_NUMERIC_PARAMS = ('bedrooms', 'bathrooms')
+
+ORDERINGS = ('list_date', 'price', 'sqft', 'price_per_sqft')
+DEFAULT_ORDERING = '-list_date'
+
+# Params that don't affect which rows match or their order
+PASSTHROUGH_PARAMS = ('page', 'limit', 'format')
+
+SUPPORTED_PARAMS = frozenset(
+    list(RANGE_PARAMS) + list(EXACT_NUMERIC_PARAMS) + list(CATEGORICAL_COLUMNS) + list(DAYS_ON_MARKET_PARAMS)
+    + ['features']
+    + ['ordering'] + list(PASSTHROUGH_PARAMS)
+)
+
+VALUES_FIELDS = ('id', 'is_published', 'updated_at') + tuple(NUMERIC_COLUMNS) + CATEGORICAL_COLUMNS
+
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+class ListingColumns:
+    """One immutable generation of column arrays; replaced wholesale on refresh"""
+
+    def __init__(self, ids, alive, numeric, categorical, vocabularies):
+        self.ids = ids
+        self.alive = alive
+        self.numeric = numeric
+        self.categorical = categorical
+        self.vocabularies = vocabularies
+        self.position = dict(zip(ids.tolist(), range(len(ids))))
+        self._orders = {}
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def order(self, field):
+        """Row positions sorted ascending by (field, id), computed once per generation"""
+        order = self._orders.get(field)
+        if order is None:
+            order = np.lexsort((self.ids, self.numeric[field])).astype(np.int64)
+            self._orders[field] = order
+        return order
+
+
+class SnapshotSelection:
+    """
+    Ordered IDs matching a query, sliced and hydrated lazily. Quacks enough
+    like a QuerySet for Django's Paginator: ``count()`` and slicing.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        page_ids = [int(listing_id) for listing_id in self.ids[item]]
+        rows = {listing.id: listing for listing in self.queryset.filter(id__in=page_ids)}
+        return [rows[listing_id] for listing_id in page_ids if listing_id in rows]
+
+
+class ListingSnapshot:
+    """Per-process columnar snapshot with ``updated_at`` delta refreshes"""
+
+    def __init__(self, refresh_interval=None):
+        if refresh_interval is None:
+            refresh_interval = getattr(settings, 'LISTING_SNAPSHOT_REFRESH_SECONDS', 30)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._columns = None
+        self._watermark = None
+        self._checked_at = 0.0
+
+    # ---- building ----
+
+    def _rows(self, queryset):
+        rows = queryset.values_list(*VALUES_FIELDS).order_by()
+        return rows.iterator(chunk_size=5000)
+
+    def _build(self, rows, vocabularies=None):
+        vocabularies = vocabularies or {column: {} for column in CATEGORICAL_COLUMNS}
+        rows = list(rows)
+        if rows:
+            self._track_watermark(max(row[2] for row in rows))
+        rows = [row for row in rows if row[1]]
+        # Transpose to one tuple per field, in VALUES_FIELDS order
+        fields = dict(zip(VALUES_FIELDS, zip(*rows))) if rows else {field: () for field in VALUES_FIELDS}
+
+        numeric = {}
+        for column, dtype in NUMERIC_COLUMNS.items():
+            values = fields[column]
+            if column == 'list_date':
+                values = [_micros(value) for value in values]
+            numeric[column] = np.array(values, dtype=dtype)
+        categorical = {}
+        for column in CATEGORICAL_COLUMNS:
+            codes = vocabularies[column]
+            categorical[column] = np.array(
+                [codes.setdefault(value, len(codes)) for value in fields[column]], dtype=np.int32,
+            )
+        ids = np.array(fields['id'], dtype=np.int64)
+        return ListingColumns(ids, np.ones(len(ids), dtype=bool), numeric, categorical, vocabularies)
+
+    @staticmethod
+    def _numeric(column, value):
+        if column == 'list_date':
+            return _micros(value)
+        if column in ('bathrooms', 'price_per_sqft'):
+            return float(value)
+        return value
+
+    def _track_watermark(self, updated_at):
+        if self._watermark is None or updated_at > self._watermark:
+            self._watermark = updated_at
+
+    def rebuild(self):
+        from .models import Listing
+
+        with self._lock:
+            self._watermark = None
+            self._columns = self._build(self._rows(Listing.objects.filter(is_published=True)))
+            self._checked_at = time.monotonic()
+
+    def _apply_delta(self, columns, changed):
+        """New generation with changed rows overwritten, appended or tombstoned"""
+        vocabularies = {c: dict(codes) for c, codes in columns.vocabularies.items()}
+        alive = columns.alive.copy()
+        numeric = {c: values.copy() for c, values in columns.numeric.items()}
+        categorical = {c: values.copy() for c, values in columns.categorical.items()}
+        appended = []
+        for record in changed:
+            position = columns.position.get(record['id'])
+            if not record['is_published']:
+                if position is not None:
+                    alive[position] = False
+                continue
+            if position is None:
+                appended.append(record)
+                continue
+            alive[position] = True
+            for column in NUMERIC_COLUMNS:
+                numeric[column][position] = self._numeric(column, record[column])
+            for column in CATEGORICAL_COLUMNS:
+                codes = vocabularies[column]
+                categorical[column][position] = codes.setdefault(record[column], len(codes))
+
+        if appended:
+            extra = self._build(
+                (tuple(record[field] for field in VALUES_FIELDS) for record in appended),
+                vocabularies,
+            )
+            ids = np.concatenate([columns.ids, extra.ids])
+            alive = np.concatenate([alive, extra.alive])
+            numeric = {c: np.concatenate([numeric[c], extra.numeric[c]]) for c in numeric}
+            categorical = {c: np.concatenate([categorical[c], extra.categorical[c]]) for c in categorical}
+        else:
+            ids = columns.ids
+
+        if len(ids) and (~alive).sum() > len(ids) // 4:
+            # Compact once a quarter of the rows are tombstones
+            ids = ids[alive]
+            numeric = {c: values[alive] for c, values in numeric.items()}
+            categorical = {c: values[alive] for c, values in categorical.items()}
+            alive = np.ones(len(ids), dtype=bool)
+        return ListingColumns(ids, alive, numeric, categorical, vocabularies)
+
+    def refresh(self):
+        """
+        Pull rows changed since the last sync; rebuild if row counts drifted
+        or there is no watermark yet (the catalog was empty at the last build)
+        """
+        from .models import Listing
+
+        with self._lock:
+            if self._watermark is not None:
+                columns = self._columns
+                changed = [
+                    dict(zip(VALUES_FIELDS, row))
+                    for row in self._rows(Listing.objects.filter(updated_at__gte=self._watermark))
+                ]
+                for record in changed:
+                    self._track_watermark(record['updated_at'])
+                if changed:
+                    columns = self._apply_delta(columns, changed)
+                self._checked_at = time.monotonic()
+                if len(columns) == Listing.objects.filter(is_published=True).count():
+                    self._columns = columns
+                    return
+        self.rebuild()
+
+    def ensure_fresh(self):
+        if self._columns is None:
+            self.rebuild()
+        elif time.monotonic() - self._checked_at >= self.refresh_interval:
+            self.refresh()
+        return self._columns
+
+    def mark_stale(self):
+        """Make the next query pull deltas instead of waiting for the interval"""
+        self._checked_at = float('-inf')
+
+    def listing_deleted(self, listing_id):
+        """Tombstone a deleted listing in this process straight away"""
+        columns = self._columns
+        if columns is None:
+            return
+        position = columns.position.get(listing_id)
+        if position is not None:
+            with self._lock:
+                alive = columns.alive.copy()
+                alive[position] = False
+                self._columns = ListingColumns(
+                    columns.ids, alive, columns.numeric, columns.categorical, columns.vocabularies,
+                )
+
+    # ---- querying ----
+
+    @staticmethod
+    def supports(query_params):
+        if not set(query_params.keys()) <= SUPPORTED_PARAMS:
+            return False
+        ordering = resolve_ordering(query_params.get('ordering') or DEFAULT_ORDERING)
+        return ordering.lstrip('-') in ORDERINGS and ',' not in ordering
+
+    def select_ids(self, query_params):
+        """
+        Ordered IDs matching the filters, or None when the params can't be
+        answered from the snapshot (the caller then uses the ORM).
+        """
+        if not self.supports(query_params):
+            return None
+        columns = self.ensure_fresh()
+        mask = columns.alive.copy()
+
+        try:
+            for param, (column, comparison) in RANGE_PARAMS.items():
+                value = query_params.get(param)
+                if value:
+                    bound = float(parse_price_per_sqft(value, param)) if column == 'price_per_sqft' else int(value)
+                    values = columns.numeric[column]
+                    mask &= values >= bound if comparison == 'gte' else values <= bound
+            for column in EXACT_NUMERIC_PARAMS:
+                value = query_params.get(column)
+                if value:
+                    target = int(value) if column == 'bedrooms' else float(Decimal(value))
+                    mask &= columns.numeric[column] == target
+            after, before = list_date_bounds(query_params)
+        except (ValueError, InvalidOperation, ValidationError):
+            return None
+        if after is not None:
+            mask &= columns.numeric['list_date'] >= _micros(after)
+        if before is not None:
+            mask &= columns.numeric['list_date'] < _micros(before)
+
+        for column in CATEGORICAL_COLUMNS:
+            value = query_params.get(column)
+            if value:
+                code = columns.vocabularies[column].get(value)
+                if code is None:
+                    return np.empty(0, dtype=np.int64)
+                mask &= columns.categorical[column] == code
+
+        features = feature_values(query_params)
+        if features:
+            features = resolve_features(features)
+            if features is None:
+                return np.empty(0, dtype=np.int64)
+            if any(bit is None for _, bit in features):
+                return None  # features without a bit need the ORM's join
+            feature_mask = mask_of(bit for _, bit in features)
+            mask &= (columns.numeric['feature_mask'] & feature_mask) == feature_mask
+
+        ordering = resolve_ordering(query_params.get('ordering') or DEFAULT_ORDERING)
+        order = columns.order(ordering.lstrip('-'))
+        if ordering.startswith('-'):
+            order = order[::-1]
+        return columns.ids[order[mask[order]]]
+
+    def select(self, query_params, queryset):
+        ids = self.select_ids(query_params)
+        if ids is None:
+            return None
+        return SnapshotSelection(ids, queryset)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_listing_snapshot():
+    """Process-wide snapshot, or None when ``LISTING_SNAPSHOT_ENABLED`` is off"""
+    global _snapshot
+    if not getattr(settings, 'LISTING_SNAPSHOT_ENABLED', True):
+        return None
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = ListingSnapshot()
+    return _snapshot
+
+
+def reset_listing_snapshot():
+    global _snapshot
+    _snapshot = None
@@ -0,0 +1,103 @@
+"""
+Blob storage for the derivative pipeline (see listings.derivatives) and the
+content-hash backfill of uploads (see accounts.dedup).
+
+``IMAGE_STORAGE_BACKEND`` is the dotted path of a ``BaseImageStorage``
+subclass. The default ``LocalImageStorage`` is a filesystem stand-in for the
+blob store: originals are read from ``IMAGE_STORAGE_ROOT/originals/<host>/<path>``
+(or, for URLs under ``IMAGE_STORAGE_URL``, from the matching file) and
+derivatives are written below ``IMAGE_STORAGE_ROOT`` and served from
+``IMAGE_STORAGE_URL``.
+"""
+import os
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ImageStorageError(Exception):
+    """An original could not be read, or a file could not be written or deleted"""
+
+
+class BaseImageStorage:
+    def read(self, url):
+        """The bytes of the image at ``url``"""
+        raise NotImplementedError
+
+    def write(self, key, data, content_type):
+        """Store ``data`` under ``key`` (a relative path) and return its public URL"""
+        raise NotImplementedError
+
+    def delete(self, url):
+        """Remove the file at ``url``; a missing file is not an error"""
+        raise NotImplementedError
+
+
+class LocalImageStorage(BaseImageStorage):
+    def __init__(self, root=None, base_url=None):
+        self.root = root or getattr(settings, 'IMAGE_STORAGE_ROOT', os.path.join(settings.MEDIA_ROOT, 'images'))
+        self.base_url = base_url or getattr(settings, 'IMAGE_STORAGE_URL', settings.MEDIA_URL + 'images/')
+
+    def path_for(self, url):
+        if url.startswith(self.base_url):
+            relative = url[len(self.base_url):]
+        else:
+            parts = urlsplit(url)
+            relative = os.path.join('originals', parts.netloc, parts.path.lstrip('/'))
+        path = os.path.normpath(os.path.join(self.root, relative))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ImageStorageError(f'{url} is outside the storage root')
+        return path
+
+    def read(self, url):
+        try:
+            with open(self.path_for(url), 'rb') as stream:
+                return stream.read()
+        except OSError as exc:
+            raise ImageStorageError(f'Could not read {url}: {exc}') from exc
+
+    def write(self, key, data, content_type):
+        path = self.path_for(self.base_url + key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so readers never see half a file
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                stream.write(data)
+            os.replace(temporary, path)
+        except OSError as exc:
+            os.unlink(temporary)
+            raise ImageStorageError(f'Could not write {key}: {exc}') from exc
+        return self.base_url + key
+
+    def delete(self, url):
+        try:
+            os.unlink(self.path_for(url))
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            raise ImageStorageError(f'Could not delete {url}: {exc}') from exc
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_image_storage():
+    """The configured ``IMAGE_STORAGE_BACKEND`` instance"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = getattr(settings, 'IMAGE_STORAGE_BACKEND', 'listings.storage.LocalImageStorage')
+                _storage = import_string(backend)()
+    return _storage
+
+
+def reset_image_storage():
+    """Drop the cached backend so the next call rebuilds it"""
+    global _storage
+    _storage = None
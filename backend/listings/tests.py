@@ -1,3 +1,1701 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from accounts.models import FileUpload, Tour, UserActivity
+from realtors import async_views as realtor_async_views
+from realtors.models import Realtor
+
+from . import async_views, views
+from .cache import bump_cache_version, get_cache_version
+from .derivatives import generate_derivatives, srcset
+from .featurebits import MASK_BITS, refresh_feature_masks
+from .featured import MIN_FEATURED, compute_featured_slate, get_featured_slate
+from .geo import BASE32, covering_cells, encode_geohash, geohash_prefix_q, next_cell
+from .ingest import FeedIngestor, ingest_feed
+from .management.commands.explain_listing_queries import sequential_scans
+from .market import compute_market_stats
+from .models import (
+    Listing, ListingAnalytics, ListingAnalyticsBucket, ListingPhoto, ListingView, PriceHistory, PropertyCategory,
+    PropertyFeature, PropertyModeration, RealtorReview, SimilarListing,
+)
+from .ratings import recompute_realtor_ratings
+from .rollups import rollup_listing_analytics
+from .serializers import PRICE_HISTORY_LIMIT
+from .search import InMemorySearchBackend, get_search_backend, reset_search_backend
+from .similar import compute_similar_listings
+from .snapshot import ListingSnapshot, reset_listing_snapshot
+from .storage import reset_image_storage
+from .tracking import HyperLogLog, ViewBuffer, get_view_buffer, reset_view_buffer
+
+
+class CatalogTestData:
+    """Listings with realtors, categories, features, analytics and price history"""
+    listing_count = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            PropertyCategory.objects.create(name=name, slug=name.lower())
+            for name in ('Luxury', 'Residential')
+        ]
+        features = [PropertyFeature.objects.create(name=name) for name in ('Pool', 'Gym', 'Garden')]
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+
+        for index in range(cls.listing_count):
+            # Realtor.save creates a user account when none is set
+            user = User.objects.create_user(f'realtor{index}', f'realtor{index}@example.com', 'password')
+            realtor = Realtor.objects.create(
+                user=user, name=f'Realtor {index}', phone='0800000000',
+                email=user.email, is_mvp=index % 4 == 0,
+            )
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Listing {index}', address=f'{index} Admiralty Way',
+                city='Lekki', state='Lagos', zipcode='105102', price=10000000 + index * 100000,
+                category=categories[index % 2], bedrooms=3, bathrooms=2, sqft=1500 + index,
+                is_featured=index % 5 == 0,
+            )
+            listing.features.set(features[:1 + index % 3])
+            ListingAnalytics.objects.create(listing=listing, views=index)
+            PriceHistory.objects.bulk_create([
+                PriceHistory(listing=listing, price=listing.price - step * 10000, event_type='price_decrease')
+                for step in range(index + 1)
+            ])
+            PropertyModeration.objects.create(listing=listing, reviewed_by=cls.admin)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class ListingQueryBudgetTests(CatalogTestData, TestCase):
+    """
+    Each endpoint must cost the same number of queries whatever the page size,
+    so related objects read by the serializers have to be joined or prefetched.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context)
+
+    def assertQueryBudget(self, url, budget, page_param='limit', small=2, large=12, params=None):
+        params = params or {}
+        few = self.count_queries(url, {**params, page_param: small})
+        many = self.count_queries(url, {**params, page_param: large})
+        self.assertEqual(few, many, f'{url}: query count grows with page size ({few} -> {many})')
+        self.assertLessEqual(many, budget, f'{url}: {many} queries, budget is {budget}')
+
+    def test_listing_list(self):
+        # count + page
+        self.assertQueryBudget(reverse('listings:listing-list'), 2)
+
+    def test_listing_list_with_cursor(self):
+        self.assertQueryBudget(reverse('listings:listing-list'), 1, params={'cursor': ''})
+
+    def test_listing_search(self):
+        self.assertQueryBudget(reverse('listings:search-listings-paginated'), 2, params={'min_price': '1'})
+
+    def test_featured_listings(self):
+        url = reverse('listings:featured-listings-paginated')
+        # Cold: slate + count + page; the slate is then cached
+        self.assertLessEqual(self.count_queries(url), 3)
+        self.assertQueryBudget(url, 2, small=2, large=6)
+
+    def test_listing_detail(self):
+        listing = Listing.objects.order_by('-id').first()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('listings:listing-detail', kwargs={'id': listing.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['features']), listing.features.count())
+        self.assertEqual(len(response.data['price_history']), PRICE_HISTORY_LIMIT)
+        # listing joined with realtor/user/category/analytics + features + price history
+        self.assertLessEqual(len(context), 3)
+
+    def test_price_history_is_capped_per_listing(self):
+        for listing in Listing.objects.all():
+            response = self.client.get(reverse('listings:listing-detail', kwargs={'id': listing.id}))
+            expected = min(listing.price_history.count(), PRICE_HISTORY_LIMIT)
+            self.assertEqual(len(response.data['price_history']), expected)
+
+    def test_legacy_search(self):
+        url = reverse('listings:search-listings-legacy')
+        few = self.count_queries(url, {'price_max': 10300000})
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 2)
+
+    def test_legacy_featured(self):
+        # slate + listings
+        self.assertLessEqual(self.count_queries(reverse('listings:featured-listings-legacy')), 2)
+
+    def test_moderation_list(self):
+        self.client.force_login(self.admin)
+        # session + user + count + page
+        self.assertQueryBudget(reverse('listings:moderation-list'), 4, page_param='page_size')
+
+    def test_realtor_list(self):
+        self.assertLessEqual(self.count_queries(reverse('realtors:realtor-list')), 2)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=True)
+class SnapshotQueryBudgetTests(ListingQueryBudgetTests):
+    """The snapshot path only hydrates the requested page"""
+
+    def setUp(self):
+        super().setUp()
+        reset_listing_snapshot()
+        # Build the snapshot outside the measured requests
+        self.client.get(reverse('listings:listing-list'))
+
+    def tearDown(self):
+        reset_listing_snapshot()
+
+    def test_listing_list(self):
+        self.assertQueryBudget(reverse('listings:listing-list'), 1, params={'ordering': 'price'})
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class ListingExportTests(CatalogTestData, TestCase):
+    """Staff stream the catalog as CSV or JSON Lines, under WSGI and ASGI alike"""
+
+    def setUp(self):
+        self.url = reverse('listings:listing-export')
+
+    def test_csv(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url, {'output': 'csv', 'ordering': 'price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="listings-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), self.listing_count)
+        first = Listing.objects.order_by('price').first()
+        self.assertEqual(rows[0]['id'], str(first.id))
+        self.assertEqual(rows[0]['realtor'], first.realtor.name)
+        self.assertEqual(rows[0]['features'], '; '.join(sorted(first.features.values_list('name', flat=True))))
+
+    def test_jsonl_with_filters(self):
+        self.client.force_login(self.admin)
+        Listing.objects.filter(id=Listing.objects.order_by('id').first().id).update(is_published=False)
+        response = self.client.get(self.url, {'output': 'jsonl', 'min_price': 11000000})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), Listing.objects.filter(is_published=True, price__gte=11000000).count())
+        self.assertTrue(all(record['price'] >= 11000000 and record['is_published'] for record in records))
+        self.assertEqual(records[0]['features'], sorted(records[0]['features']))
+        everything = self.client.get(self.url, {'output': 'jsonl', 'include_unpublished': 1})
+        self.assertEqual(len(b''.join(everything.streaming_content).splitlines()), self.listing_count)
+        self.assertEqual(self.client.get(self.url, {'output': 'xml'}).status_code, 400)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_login(User.objects.create_user('visitor', 'visitor@example.com', 'password'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    async def test_asgi_streams_in_chunks(self):
+        await sync_to_async(self.async_client.force_login)(self.admin)
+        response = await self.async_client.get(self.url, {'output': 'jsonl'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), self.listing_count)
+
+    def test_command_applies_the_search_filters(self):
+        Listing.objects.filter(id=Listing.objects.order_by('id').first().id).update(is_published=False)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        path = os.path.join(root.name, 'listings.jsonl')
+
+        def export(**options):
+            call_command('export_listings', export_format='jsonl', output=path, stdout=io.StringIO(), **options)
+            with open(path, encoding='utf-8') as stream:
+                return [json.loads(line) for line in stream]
+
+        prices = [record['price'] for record in export(filter=['min_price=11000000', 'ordering=price'])]
+        self.assertEqual(len(prices), Listing.objects.filter(is_published=True, price__gte=11000000).count())
+        self.assertEqual(prices, sorted(prices))
+        self.assertEqual(len(export(all=True)), self.listing_count)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False, LISTING_SEARCH_BACKEND='memory')
+class ListingSearchTests(TestCase):
+    """BM25 ranking over the in-memory index, kept current by the listing signals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('search', 'search@example.com', 'password')
+        cls.realtor = Realtor.objects.create(user=user, name='Search', phone='0800000000', email=user.email)
+
+    def setUp(self):
+        cache.clear()
+        reset_search_backend()
+        self.addCleanup(reset_search_backend)
+
+    def create(self, title, **fields):
+        return Listing.objects.create(**{
+            'realtor': self.realtor, 'title': title, 'address': '1 Search Road', 'city': 'Lekki', 'state': 'Lagos',
+            'zipcode': '105102', 'price': 1000000, 'bedrooms': 2, 'bathrooms': 1, 'sqft': 1000, **fields,
+        })
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('listings:search-listings-paginated'), {'search': query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_bm25_ranking(self):
+        backend = InMemorySearchBackend(refresh_interval=3600)
+        backend._loaded = True
+        backend.index_document(1, {'title': 'Villa', 'description': 'villa by the water'})
+        backend.index_document(2, {'title': 'Apartment', 'description': 'near a villa'})
+        backend.index_document(3, {'title': 'Villa', 'description': 'a long description ' * 20})
+        backend.index_document(4, {'title': 'Duplex', 'description': 'no match here'})
+        ranked = [listing_id for listing_id, _ in backend.rank('villa')]
+        # Most weighted occurrences first; length normalisation puts the long title match last
+        self.assertEqual(ranked, [1, 2, 3])
+        # Every term must match
+        self.assertEqual([listing_id for listing_id, _ in backend.rank('villa water')], [1])
+        self.assertEqual(backend.rank('villa helipad'), [])
+        backend.index_document(2, {'title': 'Apartment', 'description': 'near a villa'}, is_featured=True)
+        scores = dict(backend.rank('apartment'))
+        with self.settings(LISTING_SEARCH_FEATURED_BOOST=0):
+            self.assertAlmostEqual(scores[2], dict(backend.rank('apartment'))[2] * 1.25)
+
+    def test_last_term_matches_as_prefix(self):
+        waterfront = self.create('Waterfront villa')
+        self.create('Water tower flat')
+        self.assertEqual([row['id'] for row in self.search('waterf')['results']], [waterfront.id])
+        self.assertEqual(len(self.search('wat')['results']), 2)
+        # Only the last term is a prefix
+        self.assertEqual(self.search('wat villa')['results'], [])
+
+    def test_signals_update_the_index(self):
+        listing = self.create('Garden cottage')
+        self.assertEqual(self.search('cottage')['count'], 1)
+        listing.title = 'Garden bungalow'
+        listing.save()
+        self.assertEqual(self.search('cottage')['count'], 0)
+        self.assertEqual(self.search('bungalow')['count'], 1)
+        listing.is_published = False
+        listing.save()
+        self.assertEqual(self.search('bungalow')['count'], 0)
+        listing.is_published = True
+        listing.save()
+        self.assertEqual(len(get_search_backend()), 1)
+        listing.delete()
+        self.assertEqual(len(get_search_backend()), 0)
+
+    @override_settings(LISTING_SEARCH_SCORED_RESULTS=2)
+    def test_counts_and_orderings_cover_every_match(self):
+        listings = [self.create(f'Lekki home {index}', price=1000000 + index) for index in range(5)]
+        self.create('Lekki home', city='Ikoyi', description='lekki lekki lekki')
+        data = self.search('lekki', limit=2)
+        self.assertEqual((data['count'], data['pagination']['pages']), (6, 3))
+        prices = self.search('lekki', ordering='price', city='Lekki', limit=10)
+        self.assertEqual([row['id'] for row in prices['results']], [listing.id for listing in listings])
+        # The best scored match still leads the relevance order
+        self.assertEqual(self.search('lekki')['results'][0]['city'], 'Ikoyi')
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class KeysetPaginationTests(CatalogTestData, TestCase):
+    """?cursor= pages by (ordering, id), forwards and back, without OFFSET or COUNT"""
+
+    def setUp(self):
+        self.url = reverse('listings:listing-list')
+
+    def page(self, **params):
+        response = self.client.get(self.url, {'limit': 4, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return [row['id'] for row in data['results']], data['pagination']
+
+    def walk(self, **params):
+        pages, cursor = [], ''
+        while cursor is not None:
+            ids, pagination = self.page(cursor=cursor, **params)
+            pages.append(ids)
+            cursor = pagination['next_cursor']
+        return pages
+
+    def test_pages_cover_the_ordering_with_ties(self):
+        # Ties on price are broken by id
+        Listing.objects.filter(id__in=Listing.objects.order_by('id').values('id')[:10]).update(price=5000000)
+        for ordering, order_by in (('price', ('price', 'id')), ('-price', ('-price', '-id'))):
+            pages = self.walk(ordering=ordering)
+            expected = list(Listing.objects.order_by(*order_by).values_list('id', flat=True))
+            self.assertEqual([listing_id for page in pages for listing_id in page], expected)
+            self.assertEqual([len(page) for page in pages], [4] * 6 + [1])
+
+    def test_previous_cursor(self):
+        first, pagination = self.page(cursor='', ordering='price')
+        self.assertEqual((pagination['has_previous'], pagination['previous_cursor']), (False, None))
+        second, pagination = self.page(cursor=pagination['next_cursor'], ordering='price')
+        back, pagination = self.page(cursor=pagination['previous_cursor'], ordering='price')
+        self.assertEqual(back, first)
+        self.assertTrue(pagination['has_next'])
+        self.assertFalse(pagination['has_previous'])
+
+    def test_counts_only_on_request(self):
+        with CaptureQueriesContext(connection) as context:
+            _, pagination = self.page(cursor='')
+        self.assertEqual((pagination['mode'], pagination['total']), ('cursor', None))
+        self.assertFalse(any('COUNT(' in query['sql'] or 'OFFSET' in query['sql'] for query in context))
+        _, pagination = self.page(cursor='', with_count=1)
+        self.assertEqual((pagination['total'], pagination['pages']), (self.listing_count, 7))
+
+    def test_invalid_cursors(self):
+        _, pagination = self.page(cursor='', ordering='price')
+        for params in ({'cursor': 'garbage'}, {'cursor': pagination['next_cursor'], 'ordering': 'sqft'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('cursor', response.json())
+
+
+class ListingIndexPackTests(TestCase):
+    """The canonical listing queries must be answered from indexes, not full table scans"""
+    command = 'listings.management.commands.explain_listing_queries'
+
+    def test_canonical_queries_use_indexes(self):
+        out = io.StringIO()
+        # strict turns a sequential scan into a CommandError
+        call_command('explain_listing_queries', listings=200, strict=True, stdout=out)
+        self.assertIn('All canonical listing queries use indexes', out.getvalue())
+
+    def test_postgresql_sequential_scans(self):
+        plan = (
+            'Limit  (cost=0.29..1.02 rows=12 width=8)\n'
+            '  ->  Index Scan using listing_pub_recent_idx on listings_listing  (cost=0.29..612.29 rows=8400 width=8)\n'
+            '  ->  Seq Scan on listings_listing_features  (cost=0.00..1.25 rows=25 width=8)\n'
+            '  ->  Bitmap Heap Scan on listings_listing  (cost=4.30..9.72 rows=5 width=8)\n'
+            '  ->  Seq Scan on listings_listing  (cost=0.00..1.25 rows=25 width=8)'
+        )
+        with mock.patch(f'{self.command}.connection', vendor='postgresql'):
+            self.assertEqual(
+                sequential_scans(plan, 'listings_listing'),
+                ['->  Seq Scan on listings_listing  (cost=0.00..1.25 rows=25 width=8)'],
+            )
+
+    def test_sqlite_sequential_scans(self):
+        plan = (
+            '2 0 0 SCAN listings_listing USING INDEX listing_pub_recent_idx\n'
+            '3 0 0 SCAN listings_listing USING COVERING INDEX listing_pub_price_idx\n'
+            '4 0 0 SEARCH listings_listing USING INDEX listing_pub_city_idx (is_published=? AND city=?)\n'
+            '5 0 0 SCAN listings_listing_features\n'
+            '6 0 0 SCAN listings_listing\n'
+            '7 0 0 SCAN TABLE listings_listing'
+        )
+        with mock.patch(f'{self.command}.connection', vendor='sqlite'):
+            self.assertEqual(
+                sequential_scans(plan, 'listings_listing'),
+                ['6 0 0 SCAN listings_listing', '7 0 0 SCAN TABLE listings_listing'],
+            )
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class ListingFacetTests(CatalogTestData, TestCase):
+    """Facet counts ignore their own family's filter and are cached until listings change"""
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('listings:listing-facets')
+        ids = list(Listing.objects.order_by('id').values_list('id', flat=True))
+        Listing.objects.filter(id__in=ids[:5]).update(city='Ikoyi', bedrooms=4)
+        Listing.objects.filter(id__in=ids[5:7]).update(price=30000000)
+
+    def facets(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return data['total'], {
+            family: {str(row.get('value', row.get('label'))): row['count'] for row in rows}
+            for family, rows in data['facets'].items()
+        }
+
+    def test_disjunctive_counts(self):
+        total, facets = self.facets(city='Ikoyi')
+        self.assertEqual(total, 5)
+        # Other cities stay visible with the counts picking them would give
+        self.assertEqual(facets['city'], {'Lekki': 20, 'Ikoyi': 5})
+        self.assertEqual(facets['bedrooms'], {'4': 5})
+        self.assertEqual(sum(facets['category'].values()), 5)
+
+        total, facets = self.facets(city='Lekki', min_price=25000000)
+        self.assertEqual(total, 2)
+        self.assertEqual(facets['city'], {'Lekki': 2})
+        self.assertEqual(facets['price']['₦10M - ₦25M'], 18)
+        self.assertEqual(facets['price']['₦25M - ₦50M'], 2)
+
+    def test_cached_until_listings_change(self):
+        self.assertEqual(self.facets()[0], self.listing_count)
+        with CaptureQueriesContext(connection) as context:
+            self.facets(ordering='price', page=2)  # same filter set
+        self.assertEqual(len(context), 0)
+
+        listing = Listing.objects.get(id=Listing.objects.order_by('id').values_list('id', flat=True)[10])
+        listing.city = 'Ikoyi'
+        listing.save()
+        self.assertEqual(self.facets()[1]['city'], {'Lekki': 19, 'Ikoyi': 6})
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=300, LISTING_SNAPSHOT_ENABLED=False)
+class ResponseCacheTests(CatalogTestData, TestCase):
+    """Anonymous reads are cached under versioned keys and revalidate with ETags"""
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('listings:listing-list')
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'limit': 3}, **headers)
+        return response, len(context)
+
+    def test_etag_and_304(self):
+        first, _ = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        cached, queries = self.get()
+        self.assertEqual((cached.json(), cached['ETag'], queries), (first.json(), first['ETag'], 0))
+        not_modified, queries = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((not_modified.status_code, queries), (304, 0))
+
+    def test_bumps_invalidate(self):
+        etag = self.get()[0]['ETag']
+        bump_cache_version('listings')
+        response, queries = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Saving a listing or a realtor shown in the list bumps their namespace
+        etag = response['ETag']
+        listing = Listing.objects.order_by('-list_date').first()
+        listing.title = 'Renamed'
+        listing.save()
+        response, _ = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [row['title'] for row in response.json()['results']])
+        etag = response['ETag']
+        listing.realtor.name = 'Renamed realtor'
+        listing.realtor.save()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 200)
+
+    def test_versions(self):
+        cache.clear()
+        version = get_cache_version('things')
+        self.assertEqual(get_cache_version('things'), version)
+        self.assertEqual(bump_cache_version('things'), version + 1)
+        cache.clear()
+        # A lost counter is reseeded from the clock instead of failing
+        self.assertGreater(bump_cache_version('things'), 0)
+
+    def test_signed_in_users_bypass_the_cache(self):
+        self.client.force_login(self.admin)
+        response, _ = self.get()
+        self.assertFalse(response.has_header('ETag'))
+        self.assertGreater(self.get()[1], 0)
+
+
+class FeaturedSlateTests(CatalogTestData, TestCase):
+    """The slate ranks featured, then MVP realtors', then the latest listings, capped at FEATURED_SLATE_SIZE"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tier_ids(self, **filters):
+        return list(
+            Listing.objects.filter(is_published=True, **filters).order_by('-list_date', '-id').values_list('id', flat=True)
+        )
+
+    def test_tier_order_when_topping_up(self):
+        # Five featured listings are fewer than MIN_FEATURED, so MVP and latest ones follow
+        featured = self.tier_ids(is_featured=True)
+        self.assertLess(len(featured), MIN_FEATURED)
+        mvp = self.tier_ids(is_featured=False, realtor__is_mvp=True)
+        latest = self.tier_ids(is_featured=False, realtor__is_mvp=False)
+        self.assertEqual(compute_featured_slate(), featured + mvp + latest)
+
+    def test_featured_only_once_there_are_enough(self):
+        Listing.objects.filter(id=self.tier_ids(is_featured=False)[0]).update(is_featured=True)
+        self.assertEqual(compute_featured_slate(), self.tier_ids(is_featured=True))
+
+    def test_capped_at_sixty(self):
+        realtor = Realtor.objects.first()
+        Listing.objects.bulk_create([
+            Listing(
+                realtor=realtor, title=f'Extra {index}', address='1 Extra Road', city='Lekki', state='Lagos',
+                zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+            )
+            for index in range(50)
+        ])
+        slate = compute_featured_slate()
+        self.assertEqual(len(slate), 60)
+        self.assertEqual(slate[:5], self.tier_ids(is_featured=True))
+
+    def test_cached_until_a_realtor_changes(self):
+        slate = get_featured_slate()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(get_featured_slate(), slate)
+        self.assertEqual(len(context), 0)
+        realtor = Listing.objects.get(id=slate[-1]).realtor
+        realtor.is_mvp = True
+        realtor.save()
+        self.assertLess(get_featured_slate().index(slate[-1]), len(slate) - 1)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class ListingGeoTests(CatalogTestData, TestCase):
+    """bbox= and near= search filters and the clustered map markers"""
+    places = {
+        'lekki': (6.4474, 3.4723),
+        'admiralty': (6.4400, 3.4650),
+        'victoria_island': (6.4281, 3.4219),
+        'abuja': (9.0765, 7.3986),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.located = {}
+        for listing, (name, (latitude, longitude)) in zip(Listing.objects.order_by('id'), cls.places.items()):
+            listing.latitude, listing.longitude = latitude, longitude
+            listing.save()
+            cls.located[name] = listing
+
+    def search_ids(self, **params):
+        response = self.client.get(reverse('listings:search-listings-paginated'), params)
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['results']}
+
+    def ids(self, *names):
+        return {self.located[name].id for name in names}
+
+    def test_geohash_follows_the_coordinates(self):
+        listing = self.located['lekki']
+        self.assertEqual(listing.geohash, encode_geohash(*self.places['lekki']))
+        listing.latitude = listing.longitude = None
+        listing.save()
+        self.assertEqual(listing.geohash, '')
+
+    def test_prefix_bounds_stay_in_the_geohash_alphabet(self):
+        # A symbol bound such as 's14z{' sorts before letters under locale collations
+        self.assertEqual(next_cell('s14z'), 's150')
+        self.assertEqual(next_cell('s1zz'), 's200')
+        self.assertIsNone(next_cell('zzz'))
+        for cell in covering_cells(6.3, 3.3, 6.6, 3.6):
+            self.assertTrue(set(next_cell(cell)) <= set(BASE32), cell)
+        lekki = self.located['lekki']
+        Listing.objects.filter(id=lekki.id).update(geohash='s14zzzzzz')
+        matched = Listing.objects.filter(geohash_prefix_q(['s14z', 'zz'])).values_list('id', flat=True)
+        self.assertEqual(list(matched), [lekki.id])
+
+    def test_bbox(self):
+        self.assertEqual(self.search_ids(bbox='3.3,6.3,3.6,6.6'), self.ids('lekki', 'admiralty', 'victoria_island'))
+        self.assertEqual(self.search_ids(bbox='3.45,6.43,3.5,6.46'), self.ids('lekki', 'admiralty'))
+        self.assertEqual(self.search_ids(bbox='3.3,6.3,3.6,6.6', min_price='10100000'), self.ids('admiralty', 'victoria_island'))
+
+    def test_near(self):
+        lekki = '6.4474,3.4723'
+        self.assertEqual(self.search_ids(near=lekki, radius_km='2'), self.ids('lekki', 'admiralty'))
+        self.assertEqual(self.search_ids(near=lekki, radius_km='10'), self.ids('lekki', 'admiralty', 'victoria_island'))
+        # Abuja is ~520km away, beyond the largest radius
+        self.assertEqual(self.search_ids(near=lekki, radius_km='500'), self.ids('lekki', 'admiralty', 'victoria_island'))
+        self.assertEqual(self.search_ids(near='9.07,7.39', radius_km='5'), self.ids('abuja'))
+
+    def test_invalid_area_is_rejected(self):
+        url = reverse('listings:search-listings-paginated')
+        for params in ({'bbox': '3.6,6.3,3.3,6.6'}, {'bbox': '3.3,6.3'}, {'near': 'lekki'}, {'near': '6.4,3.4', 'radius_km': '0'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+    def test_clusters(self):
+        url = reverse('listings:listing-clusters')
+        data = self.client.get(url, {'zoom': 0}).json()
+        self.assertEqual(data['precision'], 1)
+        [cluster] = data['clusters']
+        self.assertEqual(cluster['count'], 4)
+        self.assertIsNone(cluster['listing_id'])
+        self.assertEqual(float(cluster['min_price']), float(self.located['lekki'].price))
+        self.assertEqual(float(cluster['max_price']), float(self.located['abuja'].price))
+
+        data = self.client.get(url, {'zoom': 18}).json()
+        self.assertEqual({row['listing_id'] for row in data['clusters']}, self.ids(*self.places))
+        self.assertTrue(all(row['count'] == 1 for row in data['clusters']))
+
+        data = self.client.get(url, {'zoom': 18, 'bbox': '3.3,6.3,3.6,6.6'}).json()
+        self.assertEqual({row['listing_id'] for row in data['clusters']}, self.ids('lekki', 'admiralty', 'victoria_island'))
+        self.assertEqual(self.client.get(url, {'zoom': 'far'}).status_code, 400)
+
+
+class ListingSnapshotTests(TestCase):
+    """The snapshot follows creates, edits, unpublishes and deletes through delta refreshes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('snapshot', 'snapshot@example.com', 'password')
+        cls.realtor = Realtor.objects.create(user=user, name='Snapshot', phone='0800000000', email=user.email)
+
+    def create(self, price, **fields):
+        return Listing.objects.create(
+            **{
+                'realtor': self.realtor, 'title': f'Snapshot {price}', 'address': '1 Column Road', 'city': 'Lekki',
+                'state': 'Lagos', 'zipcode': '105102', 'price': price, 'bedrooms': 2, 'bathrooms': 1, 'sqft': 1000,
+                **fields,
+            },
+        )
+
+    def ids(self, snapshot, **params):
+        return snapshot.select_ids({'ordering': 'price', **params}).tolist()
+
+    def test_empty_catalog_picks_up_new_listings(self):
+        snapshot = ListingSnapshot(refresh_interval=0)
+        self.assertEqual(self.ids(snapshot), [])
+        listing = self.create(100)
+        self.assertEqual(self.ids(snapshot), [listing.id])
+
+    def test_delta_refresh(self):
+        cheap, middle, dear = self.create(100), self.create(200), self.create(300)
+        snapshot = ListingSnapshot(refresh_interval=0)
+        self.assertEqual(self.ids(snapshot), [cheap.id, middle.id, dear.id])
+
+        dear.price = 50
+        dear.save()
+        middle.is_published = False
+        middle.save()
+        added = self.create(150, city='Ikoyi')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.ids(snapshot), [dear.id, cheap.id, added.id])
+        # Changed rows + published count, no rebuild
+        self.assertEqual(len(context), 2)
+        self.assertEqual(self.ids(snapshot, city='Ikoyi'), [added.id])
+        self.assertEqual(self.ids(snapshot, max_price='120'), [dear.id, cheap.id])
+
+    def test_deletes(self):
+        first, second, third = self.create(100), self.create(200), self.create(300)
+        snapshot = ListingSnapshot(refresh_interval=3600)
+        self.ids(snapshot)
+        # Deleted in this process: tombstoned at once, without a refresh
+        Listing.objects.filter(id=first.id).delete()
+        snapshot.listing_deleted(first.id)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.ids(snapshot), [second.id, third.id])
+        self.assertEqual(len(context), 0)
+        # Deleted elsewhere: the published count drifts and forces a rebuild
+        Listing.objects.filter(id=second.id).delete()
+        snapshot.mark_stale()
+        self.assertEqual(self.ids(snapshot), [third.id])
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0, LISTING_SNAPSHOT_ENABLED=False)
+class AsyncReadViewTests(CatalogTestData, TestCase):
+    """The async read views answer exactly like the DRF views they mirror, with the same queries"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def call(self, view, params=None, **kwargs):
+        request = self.factory.get('/', params or {}, **kwargs.pop('headers', {}))
+        with CaptureQueriesContext(connection) as context:
+            response = view(request, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = async_to_sync(lambda: response)()
+            else:
+                response.render()
+        return response, len(context)
+
+    def assertSameResponse(self, async_view_class, params=None, status=200, **kwargs):
+        sync_response, sync_queries = self.call(async_view_class.api_view_class.as_view(), params, **kwargs)
+        cache.clear()
+        async_response, async_queries = self.call(async_view_class.as_view(), params, **kwargs)
+        self.assertEqual(sync_response.status_code, status, sync_response.content)
+        self.assertEqual(async_response.status_code, status, async_response.content)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(async_queries, sync_queries)
+        return async_response
+
+    def test_listing_list(self):
+        self.assertSameResponse(async_views.ListingListView, {'limit': 5, 'page': 2, 'ordering': 'price'})
+        self.assertSameResponse(async_views.ListingListView, {'city': 'Lekki', 'min_price': 10500000})
+        self.assertSameResponse(async_views.ListingListView, {'page': 99}, status=404)
+
+    def test_listing_list_with_cursor(self):
+        first = self.assertSameResponse(async_views.ListingListView, {'cursor': '', 'limit': 4, 'with_count': 1})
+        cursor = json.loads(first.content)['pagination']['next_cursor']
+        self.assertSameResponse(async_views.ListingListView, {'cursor': cursor, 'limit': 4})
+
+    @override_settings(LISTING_SNAPSHOT_ENABLED=True)
+    def test_listing_list_from_snapshot(self):
+        reset_listing_snapshot()
+        self.addCleanup(reset_listing_snapshot)
+        self.client.get(reverse('listings:listing-list'))
+        self.assertSameResponse(async_views.ListingListView, {'ordering': '-price', 'limit': 6})
+
+    def test_listing_detail(self):
+        listing = Listing.objects.order_by('-id').first()
+        self.assertSameResponse(async_views.ListingDetailView, id=listing.id)
+        self.assertSameResponse(async_views.ListingDetailView, id=0, status=404)
+
+    def test_featured_and_search(self):
+        self.assertSameResponse(async_views.FeaturedListingsView, {'limit': 3})
+        self.assertSameResponse(async_views.SearchListingsView, {'ordering': 'sqft', 'bedrooms': 3})
+        self.assertSameResponse(async_views.SearchListingsView, {'bbox': 'nonsense'}, status=400)
+
+    def test_realtors(self):
+        self.assertSameResponse(realtor_async_views.RealtorListView, {'page': 2})
+        self.assertSameResponse(realtor_async_views.RealtorDetailView, id=Realtor.objects.first().id)
+
+    def test_invalid_token_is_rejected(self):
+        headers = {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}
+        self.assertSameResponse(async_views.ListingListView, status=401, headers=headers)
+
+    @override_settings(API_RESPONSE_CACHE_SECONDS=300)
+    def test_response_cache_is_shared(self):
+        # Filled by the DRF view, served by the async one without touching the database
+        sync_response, _ = self.call(views.ListingListAPIView.as_view(), {'limit': 3})
+        response, queries = self.call(async_views.ListingListView.as_view(), {'limit': 3})
+        self.assertEqual(queries, 0)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.assertEqual(json.loads(response.content), sync_response.data)
+        response, _ = self.call(
+            async_views.ListingListView.as_view(), {'limit': 3}, headers={'HTTP_IF_NONE_MATCH': response['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class FeedIngestTests(TestCase):
+    """Partner feeds only write records whose content changed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('partner', 'partner@example.com', 'password')
+        cls.realtor = Realtor.objects.create(user=user, name='Partner', phone='0800000000', email=user.email)
+
+    def record(self, index, **overrides):
+        return {
+            'external_id': f'P-{index}', 'title': f'Feed listing {index}', 'address': f'{index} Feed Road',
+            'city': 'Lekki', 'state': 'Lagos', 'zipcode': '105102', 'price': 20000000 + index,
+            'bedrooms': 3, 'bathrooms': '2', 'sqft': 1600, 'features': ['Pool', 'Solar'], **overrides,
+        }
+
+    def ingest(self, records, **kwargs):
+        stream = io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+        return ingest_feed(stream, 'jsonl', default_realtor_id=self.realtor.id, chunk_size=4, **kwargs)
+
+    def test_delta_sync(self):
+        records = [self.record(index) for index in range(10)]
+        report = self.ingest(records + [{'external_id': 'P-bad', 'price': 'n/a'}])
+        self.assertEqual((report.inserted, report.failed), (10, 1))
+        self.assertEqual(Listing.objects.filter(realtor=self.realtor).count(), 10)
+        self.assertEqual(PriceHistory.objects.filter(event_type='listed').count(), 10)
+
+        with CaptureQueriesContext(connection) as context:
+            report = self.ingest(records)
+        self.assertEqual((report.unchanged, report.updated, report.inserted), (10, 0, 0))
+        # one existing-row lookup plus the realtor check per chunk, no writes
+        self.assertFalse([query for query in context if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))])
+
+        records[3]['price'] -= 1
+        records[4]['features'] = ['Gym']
+        records[4]['photo_main'] = 'https://img.example.com/p4.jpg'
+        report = self.ingest(records)
+        self.assertEqual((report.updated, report.unchanged, report.price_changes), (2, 8, 1))
+        listing = Listing.objects.get(external_id='P-3')
+        self.assertEqual(listing.price_history.first().event_type, 'price_decrease')
+        self.assertEqual(
+            list(Listing.objects.get(external_id='P-4').features.values_list('name', flat=True)), ['Gym']
+        )
+        # Bulk-written links still leave consistent masks
+        self.assertEqual(refresh_feature_masks(), 0)
+        self.assertEqual(
+            list(ListingPhoto.objects.values_list('listing__external_id', 'url', 'is_main')),
+            [('P-4', 'https://img.example.com/p4.jpg', True)],
+        )
+
+    def test_dry_run_writes_nothing(self):
+        report = self.ingest([self.record(1)], dry_run=True)
+        self.assertEqual(report.inserted, 1)
+        self.assertFalse(Listing.objects.exists())
+
+    def test_chunks_commit_separately(self):
+        records = [self.record(index) for index in range(10)]
+        write_chunk = FeedIngestor._write_chunk
+        calls = []
+
+        def fail_second_chunk(ingestor, items, report):
+            calls.append(len(items))
+            if len(calls) == 2:
+                raise DatabaseError('chunk failed')
+            return write_chunk(ingestor, items, report)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with mock.patch.object(FeedIngestor, '_write_chunk', fail_second_chunk), self.assertRaises(DatabaseError):
+                self.ingest(records)
+        # The first chunk stays written and refreshes the caches; the failed one left nothing behind
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(sorted(Listing.objects.values_list('external_id', flat=True)), ['P-0', 'P-1', 'P-2', 'P-3'])
+
+        report = self.ingest(records)
+        self.assertEqual((report.unchanged, report.inserted), (4, 6))
+
+
+@override_settings(LISTING_VIEW_BACKGROUND_FLUSH=False)
+class ViewTrackingTests(TestCase):
+    """Views are deduplicated per viewer and written in batches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('viewer-realtor', 'viewer@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Viewer', phone='0800000000', email=user.email)
+        cls.viewer = User.objects.create_user('viewer', 'viewer2@example.com', 'password')
+        cls.listings = [
+            Listing.objects.create(
+                realtor=realtor, title=f'Viewed {index}', address=f'{index} View Road', city='Lekki',
+                state='Lagos', zipcode='105102', price=10000000, bedrooms=3, bathrooms=2, sqft=1500,
+            )
+            for index in range(3)
+        ]
+        ListingAnalytics.objects.create(listing=cls.listings[0], views=5)
+
+    def setUp(self):
+        reset_view_buffer()
+        self.addCleanup(reset_view_buffer)
+
+    def test_endpoint_buffers_without_queries(self):
+        url = reverse('listings:listing-view', kwargs={'id': self.listings[0].id})
+        with CaptureQueriesContext(connection) as context:
+            first = self.client.post(url, REMOTE_ADDR='10.0.0.1')
+            repeat = self.client.post(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual((first.json(), repeat.json()), ({'recorded': True}, {'recorded': False}))
+        self.assertEqual(len(context), 0)
+        self.assertEqual(get_view_buffer().pending(), 1)
+
+    def test_flush_batches_counters(self):
+        buffer = ViewBuffer(dedup_seconds=60, flush_seconds=3600, max_events=1000)
+        first, second, third = self.listings
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.1'):
+            buffer.record(first.id, None, ip)
+        buffer.record(first.id, self.viewer.id, '10.0.0.3')
+        buffer.record(second.id, None, '10.0.0.1')
+        buffer.record(0, None, '10.0.0.1')  # unknown listing, dropped at flush
+        self.assertEqual(buffer.pending(), 5)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(buffer.flush(), 5)
+        updates = [query for query in context if query['sql'].startswith('UPDATE')]
+        # one counter UPDATE for every listing plus the sketches' bulk_update
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(buffer.pending(), 0)
+
+        analytics = {row.listing_id: row for row in ListingAnalytics.objects.all()}
+        self.assertEqual((analytics[first.id].views, analytics[first.id].unique_viewers), (8, 3))
+        self.assertEqual((analytics[second.id].views, analytics[second.id].unique_viewers), (1, 1))
+        self.assertNotIn(third.id, analytics)
+        self.assertIsNotNone(analytics[second.id].last_viewed)
+        self.assertEqual(ListingView.objects.filter(listing=first).count(), 3)
+
+        # A later window re-inserts the same (listing, user) view; the conflict is ignored
+        buffer.dedup_seconds = 0
+        buffer.record(first.id, self.viewer.id, '10.0.0.3')
+        buffer.flush()
+        analytics = ListingAnalytics.objects.get(listing=first)
+        self.assertEqual((analytics.views, analytics.unique_viewers), (9, 3))
+        self.assertEqual(ListingView.objects.filter(listing=first).count(), 3)
+
+    def test_background_thread_flushes(self):
+        buffer = ViewBuffer(dedup_seconds=60, flush_seconds=3600, max_events=2, background=True)
+        self.addCleanup(setattr, buffer, '_stopped', True)
+        flushed = threading.Event()
+        written = []
+
+        def write(events):
+            written.extend(events)
+            flushed.set()
+
+        with mock.patch('listings.tracking.write_views', side_effect=write):
+            buffer.record(self.listings[0].id, None, '10.0.0.1')
+            self.assertEqual(buffer.pending(), 1)
+            # A full buffer wakes the thread; the recording call does not write
+            buffer.record(self.listings[1].id, None, '10.0.0.1')
+            self.assertTrue(flushed.wait(5))
+            buffer.record(self.listings[2].id, None, '10.0.0.1')
+            # Stopping flushes the rest
+            buffer.stop()
+        self.assertEqual([event[0] for event in written], [listing.id for listing in self.listings])
+        self.assertFalse(buffer._flusher.is_alive())
+
+    def test_process_buffer_without_a_thread_is_not_flushed_at_exit(self):
+        buffer = get_view_buffer()
+        self.assertFalse(buffer.background)
+        buffer.record(self.listings[0].id, None, '10.0.0.1')
+        reset_view_buffer()
+        self.assertIsNot(get_view_buffer(), buffer)
+
+    def test_unique_viewer_estimate(self):
+        sketches = [HyperLogLog(), HyperLogLog()]
+        for index in range(20000):
+            sketches[index % 2].add(f'ip:{index}')
+        merged = HyperLogLog(sketches[0].to_bytes())
+        merged.merge(sketches[1])
+        self.assertLess(abs(merged.count() - 20000) / 20000, 0.05)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+
+class AnalyticsRollupTests(TestCase):
+    """Rollups only read raw rows past the watermark; the series endpoint only reads rollups"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.realtor_user = User.objects.create_user('rollup-realtor', 'rollup@example.com', 'password')
+        realtor = Realtor.objects.create(
+            user=cls.realtor_user, name='Rollup', phone='0800000000', email=cls.realtor_user.email,
+        )
+        cls.visitor = User.objects.create_user('rollup-visitor', 'visitor@example.com', 'password')
+        cls.listing = Listing.objects.create(
+            realtor=realtor, title='Rolled up', address='1 Rollup Road', city='Lekki', state='Lagos',
+            zipcode='105102', price=10000000, bedrooms=3, bathrooms=2, sqft=1500,
+        )
+
+    def at(self, day, hour, minute=0):
+        return datetime(2026, 3, day, hour, minute, tzinfo=dt_timezone.utc)
+
+    def add_view(self, ip, moment):
+        view = ListingView.objects.create(listing=self.listing, ip_address=ip)
+        ListingView.objects.filter(pk=view.pk).update(viewed_at=moment)
+
+    def add_activity(self, activity_type, moment):
+        activity = UserActivity.objects.create(
+            user=self.visitor, activity_type=activity_type, description='test', listing=self.listing,
+        )
+        UserActivity.objects.filter(pk=activity.pk).update(created_at=moment)
+
+    def test_incremental_rollup(self):
+        self.add_view('10.0.0.1', self.at(1, 9, 5))
+        self.add_view('10.0.0.2', self.at(1, 9, 40))
+        self.add_view('10.0.0.3', self.at(1, 14))
+        self.add_activity('favorite_added', self.at(1, 9, 30))
+        self.add_activity('search_performed', self.at(1, 9, 30))
+        tour = Tour.objects.create(
+            user=self.visitor, listing=self.listing, realtor=self.listing.realtor, date=self.at(5, 10),
+        )
+        Tour.objects.filter(pk=tour.pk).update(created_at=self.at(2, 8))
+
+        report = rollup_listing_analytics(until=self.at(2, 0))
+        self.assertEqual(report['rows'], {'listing_views': 3, 'saves': 1, 'inquiries': 0, 'tours': 0})
+        hours = ListingAnalyticsBucket.objects.filter(granularity='hour')
+        self.assertEqual(
+            list(hours.values_list('bucket_start', 'views', 'saves')),
+            [(self.at(1, 9), 2, 1), (self.at(1, 14), 1, 0)],
+        )
+        day = ListingAnalyticsBucket.objects.get(granularity='day', bucket_start=self.at(1, 0))
+        self.assertEqual((day.views, day.saves, day.tours_scheduled), (3, 1, 0))
+
+        # Only rows after the watermark are read; late rows in an old hour add onto its bucket
+        self.add_view('10.0.0.4', self.at(2, 8, 30))
+        self.add_activity('message_sent', self.at(2, 8, 45))
+        with CaptureQueriesContext(connection) as context:
+            report = rollup_listing_analytics(until=self.at(3, 0))
+        self.assertEqual(report['rows'], {'listing_views': 1, 'saves': 0, 'inquiries': 1, 'tours': 1})
+        self.assertEqual((report['buckets_created'], report['buckets_updated']), (2, 0))
+        self.assertLessEqual(len(context), 14)
+        bucket = ListingAnalyticsBucket.objects.get(granularity='hour', bucket_start=self.at(2, 8))
+        self.assertEqual((bucket.views, bucket.inquiries, bucket.tours_scheduled), (1, 1, 1))
+
+        self.assertEqual(rollup_listing_analytics(until=self.at(3, 0))['rows'], {})
+        self.assertEqual(ListingAnalyticsBucket.objects.get(granularity='day', bucket_start=self.at(1, 0)).views, 3)
+
+    def test_time_series_endpoint(self):
+        self.add_view('10.0.0.1', self.at(1, 9))
+        self.add_view('10.0.0.2', self.at(3, 9))
+        call_command('rollup_listing_analytics', stdout=io.StringIO())
+        url = reverse('listings:listing-analytics-series', kwargs={'id': self.listing.id})
+
+        self.client.force_login(self.realtor_user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'start': '2026-03-01', 'end': '2026-03-04'})
+        self.assertEqual(response.status_code, 200, response.content)
+        # session, user, listing owner and one rollup range read; no raw activity tables
+        self.assertFalse([query for query in context if 'listingview' in query['sql'].lower()])
+        data = response.json()
+        self.assertEqual([point['views'] for point in data['series']], [1, 0, 1, 0])
+        self.assertEqual(data['totals']['views'], 2)
+
+        response = self.client.get(url, {'granularity': 'hour', 'start': '2026-03-01', 'end': '2026-03-01'})
+        series = response.json()['series']
+        self.assertEqual(len(series), 24)
+        self.assertEqual(series[9]['views'], 1)
+
+        self.assertEqual(self.client.get(url, {'granularity': 'minute'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2025-01-01', 'end': '2026-03-01'}).status_code, 400)
+        self.client.force_login(self.visitor)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class RealtorRatingTests(TestCase):
+    """Review changes update the realtor's totals by their delta, without saving the realtor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.realtors = []
+        for index in range(2):
+            user = User.objects.create_user(f'rated{index}', f'rated{index}@example.com', 'password')
+            cls.realtors.append(
+                Realtor.objects.create(user=user, name=f'Rated {index}', phone='0800000000', email=user.email)
+            )
+        cls.reviewers = [
+            User.objects.create_user(f'reviewer{index}', f'reviewer{index}@example.com', 'password')
+            for index in range(3)
+        ]
+
+    def review(self, reviewer, rating, realtor=None):
+        return RealtorReview.objects.create(
+            realtor=realtor or self.realtors[0], user=self.reviewers[reviewer], rating=rating,
+            title='Review', review_text='Text',
+        )
+
+    def assertRating(self, realtor, average, total, histogram):
+        realtor = Realtor.objects.get(pk=realtor.pk)
+        self.assertEqual((str(realtor.average_rating), realtor.total_reviews), (average, total))
+        self.assertEqual(realtor.rating_histogram, dict(zip('12345', histogram)))
+
+    def test_incremental_updates(self):
+        realtor, other = self.realtors
+        with CaptureQueriesContext(connection) as context:
+            first = self.review(0, 5)
+        # the review INSERT and one UPDATE of the realtor's totals
+        self.assertEqual(len(context), 2)
+        self.assertTrue(context[1]['sql'].startswith('UPDATE'))
+        self.review(1, 4)
+        self.review(2, 2)
+        self.assertRating(realtor, '3.67', 3, [0, 1, 0, 1, 1])
+
+        first = RealtorReview.objects.get(pk=first.pk)
+        first.rating = 3
+        first.save()
+        self.assertRating(realtor, '3.00', 3, [0, 1, 1, 1, 0])
+        with CaptureQueriesContext(connection) as context:
+            first.title = 'Edited'
+            first.save()
+        self.assertEqual(len(context), 1)  # rating unchanged, realtor untouched
+
+        first.realtor = other
+        first.save()
+        self.assertRating(realtor, '3.00', 2, [0, 1, 0, 1, 0])
+        self.assertRating(other, '3.00', 1, [0, 0, 1, 0, 0])
+
+        first.delete()
+        self.assertRating(other, '0.00', 0, [0, 0, 0, 0, 0])
+
+    def test_recompute(self):
+        self.review(0, 5)
+        self.review(1, 4)
+        RealtorReview.objects.filter(rating=4).update(rating=1)  # bypasses the signals
+        Realtor.objects.filter(pk=self.realtors[1].pk).update(total_reviews=7, average_rating=4)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(recompute_realtor_ratings(), 2)
+        # grouped review totals, realtors, one bulk UPDATE
+        self.assertEqual(len(context), 3)
+        self.assertRating(self.realtors[0], '3.00', 2, [1, 0, 0, 0, 1])
+        self.assertRating(self.realtors[1], '0.00', 0, [0, 0, 0, 0, 0])
+        self.assertEqual(recompute_realtor_ratings(), 0)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0)
+class SimilarListingsTests(TestCase):
+    """Neighbour lists come from the stored table and are only recomputed where they can change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('similar', 'similar@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Similar', phone='0800000000', email=user.email)
+        cls.features = [PropertyFeature.objects.create(name=name) for name in ('Pool', 'Gym', 'Garden', 'Solar')]
+        cls.listings = []
+        for index in range(30):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Similar {index}', address=f'{index} Similar Road',
+                city=('Lekki', 'Ikoyi', 'Yaba')[index % 3], state='Lagos', zipcode='105102',
+                price=10000000 * (1 + index % 7), bedrooms=1 + index % 5, bathrooms=1 + index % 3,
+                sqft=900 + 150 * (index % 6), property_type=('house', 'apartment')[index % 2],
+                listing_type='rent' if index >= 24 else 'sale',
+            )
+            listing.features.set(cls.features[:index % 4])
+            cls.listings.append(listing)
+
+    def neighbour_table(self):
+        return sorted(SimilarListing.objects.values_list('listing_id', 'rank', 'neighbour_id'))
+
+    def test_neighbours_and_endpoint(self):
+        report = compute_similar_listings(k=5)
+        self.assertEqual((report['listings'], report['recomputed'], report['full']), (30, 30, True))
+        twin = Listing.objects.get(pk=self.listings[0].pk)
+        twin.pk = None
+        twin.title = 'Twin'
+        twin.save()
+        twin.features.set(self.listings[0].features.all())
+        compute_similar_listings(k=5)
+
+        url = reverse('listings:listing-similar', kwargs={'id': self.listings[0].id})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context), 1)
+        results = response.json()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]['id'], twin.id)
+        # Only sales: rentals are never neighbours of a sale
+        self.assertEqual({result['listing_type'] for result in results}, {'sale'})
+        rental = reverse('listings:listing-similar', kwargs={'id': self.listings[25].id})
+        self.assertEqual(len(self.client.get(rental).json()), 5)
+
+    def test_incremental_matches_full(self):
+        compute_similar_listings(k=4)
+        changed = self.listings[3]
+        changed.price = 70000000
+        changed.save()
+        self.listings[8].features.set(self.features)
+        self.listings[11].is_published = False
+        self.listings[11].save()
+        self.listings[14].delete()
+
+        report = compute_similar_listings(k=4)
+        self.assertFalse(report['full'])
+        self.assertEqual(report['changed'], 2)
+        self.assertLess(report['recomputed'], report['listings'])
+        incremental = self.neighbour_table()
+        self.assertFalse(SimilarListing.objects.filter(listing_id=self.listings[11].id).exists())
+
+        compute_similar_listings(full=True, k=4)
+        self.assertEqual(incremental, self.neighbour_table())
+        self.assertEqual(compute_similar_listings(k=4)['recomputed'], 0)
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0)
+class MarketMetricsTests(TestCase):
+    """price_per_sqft and days_on_market filter and sort in the database and the snapshot alike"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('metrics', 'metrics@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Metrics', phone='0800000000', email=user.email)
+        now = datetime.now(dt_timezone.utc)
+        cls.listings = []
+        for index in range(12):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Metrics {index}', address=f'{index} Metrics Road', city='Lekki',
+                state='Lagos', zipcode='105102', price=1000000 + 250000 * (index % 5),
+                bedrooms=2, bathrooms=1, sqft=800 + 100 * (index % 4),
+            )
+            Listing.objects.filter(pk=listing.pk).update(list_date=now - timedelta(days=3 * index, hours=1))
+            cls.listings.append(listing)
+
+    def setUp(self):
+        reset_listing_snapshot()
+
+    def tearDown(self):
+        reset_listing_snapshot()
+
+    def ids(self, params, snapshot):
+        with self.settings(LISTING_SNAPSHOT_ENABLED=snapshot):
+            response = self.client.get(reverse('listings:listing-list'), {**params, 'limit': 50})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_stored_on_save(self):
+        listing = Listing.objects.get(pk=self.listings[1].pk)
+        self.assertEqual(listing.price_per_sqft, Decimal('1388.89'))  # 1250000 / 900
+        listing.sqft = 0
+        listing.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.price_per_sqft, Decimal('0'))
+
+    def test_filters_and_orderings(self):
+        rows = {listing.id: listing for listing in Listing.objects.all()}
+        for params in (
+            {'ordering': 'price_per_sqft'},
+            {'ordering': '-price_per_sqft', 'min_ppsf': '1200'},
+            {'ordering': 'days_on_market', 'max_days_on_market': '10'},
+            {'ordering': '-days_on_market', 'min_days_on_market': '6', 'max_ppsf': '1500.5'},
+        ):
+            expected = self.ids(params, snapshot=False)
+            self.assertEqual(self.ids(params, snapshot=True), expected, params)
+            for listing_id in expected:
+                listing = rows[listing_id]
+                self.assertGreaterEqual(listing.price_per_sqft, Decimal(params.get('min_ppsf', '0')))
+                self.assertLessEqual(listing.price_per_sqft, Decimal(params.get('max_ppsf', '1e9')))
+                self.assertLessEqual(listing.days_on_market, int(params.get('max_days_on_market', 999)))
+                self.assertGreaterEqual(listing.days_on_market, int(params.get('min_days_on_market', 0)))
+            field = 'price_per_sqft' if 'price_per_sqft' in params['ordering'] else 'days_on_market'
+            values = [getattr(rows[listing_id], field) for listing_id in expected]
+            self.assertEqual(values, sorted(values, reverse=params['ordering'].startswith('-')))
+        self.assertEqual(len(self.ids({'max_days_on_market': '10'}, snapshot=False)), 4)  # 0, 3, 6 and 9 days
+
+    def test_keyset_pages_by_price_per_sqft(self):
+        url = reverse('listings:listing-list')
+        with self.settings(LISTING_SNAPSHOT_ENABLED=False):
+            seen = []
+            params = {'ordering': 'price_per_sqft', 'cursor': '', 'limit': 5}
+            while True:
+                data = self.client.get(url, params).json()
+                seen.extend(row['id'] for row in data['results'])
+                if not data['pagination']['has_next']:
+                    break
+                params['cursor'] = data['pagination']['next_cursor']
+        self.assertEqual(seen, self.ids({'ordering': 'price_per_sqft'}, snapshot=False))
+
+    def test_invalid_values(self):
+        with self.settings(LISTING_SNAPSHOT_ENABLED=False):
+            for params in ({'min_ppsf': 'cheap'}, {'max_days_on_market': '-1'}):
+                response = self.client.get(reverse('listings:search-listings-paginated'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+@override_settings(API_RESPONSE_CACHE_SECONDS=0)
+class FeatureFilterTests(TestCase):
+    """features= matches listings having every feature, through the maintained bitmasks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('features', 'features@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Features', phone='0800000000', email=user.email)
+        cls.features = [PropertyFeature.objects.create(name=name) for name in ('Pool', 'Smart Home', 'Security', 'Gym')]
+        cls.listings = []
+        for index in range(16):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Features {index}', address=f'{index} Feature Close', city='Lekki',
+                state='Lagos', zipcode='105102', price=5000000 + index, bedrooms=2, bathrooms=1, sqft=900,
+            )
+            # Listing i has feature j when bit j of i is set
+            listing.features.set([feature for bit, feature in enumerate(cls.features) if index >> bit & 1])
+            cls.listings.append(listing)
+
+    def setUp(self):
+        reset_listing_snapshot()
+
+    def tearDown(self):
+        reset_listing_snapshot()
+
+    def ids(self, url_name, params, snapshot=False):
+        with self.settings(LISTING_SNAPSHOT_ENABLED=snapshot):
+            response = self.client.get(reverse(f'listings:{url_name}'), {**params, 'limit': 50})
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(row['id'] for row in response.json()['results'])
+
+    def expected(self, *features):
+        return sorted(
+            listing.id for listing in self.listings
+            if set(features) <= set(listing.features.all())
+        )
+
+    def test_masks_follow_feature_edits(self):
+        pool, smart, security, gym = self.features
+        self.assertEqual(Listing.objects.get(pk=self.listings[5].pk).feature_mask, 1 << pool.bit | 1 << security.bit)
+        listing = self.listings[0]
+        listing.features.add(gym, pool)
+        listing.features.remove(pool)
+        gym.listing_set.add(self.listings[1])
+        smart.listing_set.remove(self.listings[2])
+        security.listing_set.clear()
+        self.listings[3].features.clear()
+        self.assertEqual(refresh_feature_masks(), 0)
+        self.assertEqual(Listing.objects.get(pk=listing.pk).feature_mask, 1 << gym.bit)
+
+        pool.delete()
+        masks = Listing.objects.values_list('feature_mask', flat=True)
+        self.assertFalse([mask for mask in masks if mask >> pool.bit & 1])
+        self.assertEqual(refresh_feature_masks(), 0)
+        # The freed bit goes to the next new feature
+        self.assertEqual(PropertyFeature.objects.create(name='Solar').bit, pool.bit)
+
+    def test_filters_match_joins(self):
+        pool, smart, security, gym = self.features
+        for params, features in (
+            ({'features': 'pool'}, [pool]),
+            ({'features': f'{pool.id},Security'}, [pool, security]),
+            ({'features': ['Smart Home', 'Gym,Security']}, [smart, gym, security]),
+        ):
+            expected = self.expected(*features)
+            self.assertTrue(expected)
+            self.assertEqual(self.ids('search-listings-paginated', params), expected, params)
+            self.assertEqual(self.ids('listing-list', params), expected, params)
+            self.assertEqual(self.ids('listing-list', params, snapshot=True), expected, params)
+        self.assertEqual(self.ids('listing-list', {'features': 'Pool,Helipad'}, snapshot=True), [])
+        self.assertEqual(self.ids('search-listings-paginated', {'features': 'Helipad'}), [])
+
+    def test_features_without_a_bit_fall_back_to_joins(self):
+        PropertyFeature.objects.filter(pk=self.features[3].pk).update(bit=None)
+        params = {'features': 'Pool,Gym'}
+        expected = self.expected(self.features[0], self.features[3])
+        self.assertEqual(self.ids('listing-list', params, snapshot=True), expected)
+        self.assertEqual(self.ids('search-listings-paginated', params), expected)
+
+    def test_bits_run_out(self):
+        PropertyFeature.objects.bulk_create([
+            PropertyFeature(name=f'Extra {index}', bit=bit)
+            for index, bit in enumerate(range(len(self.features), MASK_BITS))
+        ])
+        self.assertIsNone(PropertyFeature.objects.create(name='One too many').bit)
+
+
+class MarketStatsTests(TestCase):
+    """Grouped market stats match NumPy's percentiles and are cached until a listing changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('market', 'market@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Market', phone='0800000000', email=user.email)
+        now = datetime.now(dt_timezone.utc)
+        for index in range(23):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Market {index}', address=f'{index} Market Street',
+                city=('Lekki', 'Ikoyi')[index % 2], neighborhood=('Phase 1', '')[index % 3 == 0], state='Lagos',
+                zipcode='105102', price=1000000 * (1 + index * 7 % 11), bedrooms=2, bathrooms=1,
+                sqft=0 if index == 4 else 500 + 50 * (index % 5), property_type=('house', 'apartment')[index % 3 == 1],
+                listing_type='rent' if index == 22 else 'sale',
+            )
+            Listing.objects.filter(pk=listing.pk).update(list_date=now - timedelta(days=index))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_per_group(self):
+        data = compute_market_stats(('city', 'property_type'), {'listing_type': 'sale'})
+        listings = list(Listing.objects.filter(listing_type='sale'))
+        self.assertEqual(data['overall']['count'], 22)
+        self.assertEqual(sum(group['count'] for group in data['groups']), 22)
+        for group in data['groups']:
+            members = [
+                listing for listing in listings
+                if (listing.city, listing.property_type) == (group['city'], group['property_type'])
+            ]
+            prices = [listing.price for listing in members]
+            self.assertEqual(group['count'], len(members))
+            for key, percentile in (('p10', 10), ('median', 50), ('p90', 90)):
+                self.assertAlmostEqual(group['price'][key], np.percentile(prices, percentile), places=2)
+            self.assertEqual((group['price']['min'], group['price']['max']), (min(prices), max(prices)))
+            sized = [float(listing.price_per_sqft) for listing in members if listing.sqft]
+            self.assertEqual(group['price_per_sqft']['count'], len(sized))
+            self.assertAlmostEqual(group['price_per_sqft']['median'], np.median(sized), delta=0.01)
+            self.assertAlmostEqual(
+                group['avg_days_on_market'], np.mean([listing.days_on_market for listing in members]), places=1,
+            )
+        neighbourhoods = compute_market_stats(('neighborhood',))['groups']
+        self.assertEqual({group['neighborhood'] for group in neighbourhoods}, {'Phase 1', None})
+
+    def test_endpoint_caches_until_listings_change(self):
+        url = reverse('listings:market-stats')
+        params = {'group_by': 'city', 'listing_type': 'sale'}
+        first = self.client.get(url, params).json()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url, params).json(), first)
+        self.assertEqual(len(context), 0)
+
+        listing = Listing.objects.filter(city='Lekki', listing_type='sale').first()
+        listing.price = 99000000
+        listing.save()
+        lekki = next(group for group in self.client.get(url, params).json()['groups'] if group['city'] == 'Lekki')
+        self.assertEqual(lekki['price']['max'], 99000000)
+        self.assertEqual(self.client.get(url, {'group_by': 'bedrooms'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'city': 'Nowhere'}).json()['groups'], [])
+
+
+class ModerationQueueTests(TestCase):
+    """The queue sorts by priority rank and age, and claims never hand one item to two moderators"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admins = [
+            User.objects.create_user(f'moderator{index}', f'moderator{index}@example.com', 'password', is_staff=True)
+            for index in range(2)
+        ]
+        user = User.objects.create_user('queued', 'queued@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Queued', phone='0800000000', email=user.email)
+        now = datetime.now(dt_timezone.utc)
+        cls.moderations = []
+        for index, priority in enumerate(['low', 'urgent', 'medium', 'high', 'urgent', 'medium']):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Queued {index}', address=f'{index} Queue Road', city='Lekki',
+                state='Lagos', zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+            )
+            moderation = PropertyModeration.objects.create(listing=listing, priority=priority)
+            PropertyModeration.objects.filter(pk=moderation.pk).update(submitted_date=now - timedelta(days=index * 2))
+            cls.moderations.append(moderation)
+
+    def list_ids(self, params):
+        self.client.force_login(self.admins[0])
+        response = self.client.get(reverse('listings:moderation-list'), {**params, 'page_size': 50})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def claim(self, admin, count):
+        self.client.force_login(admin)
+        response = self.client.post(reverse('listings:moderation-claim'), {'count': count})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_priority_and_age(self):
+        ids = [moderation.id for moderation in self.moderations]
+        # urgent, high, medium, low; newest first within a priority
+        self.assertEqual(self.list_ids({}), [ids[1], ids[4], ids[3], ids[2], ids[5], ids[0]])
+        self.assertEqual(self.list_ids({'ordering': 'priority'})[0], ids[0])
+        self.assertEqual(self.list_ids({'min_days_pending': 4, 'ordering': 'days_pending'}), ids[2:])
+        self.client.force_login(self.admins[0])
+        detail = self.client.get(reverse('listings:moderation-detail', kwargs={'id': ids[3]})).json()
+        self.assertEqual((detail['days_pending'], detail['priority_rank']), (6, 2))
+        self.assertEqual(self.client.get(reverse('listings:moderation-list'), {'max_days_pending': 'x'}).status_code, 400)
+
+    def test_claims_are_exclusive_and_expire(self):
+        ids = [moderation.id for moderation in self.moderations]
+        first, second = self.admins
+        # Most urgent first, oldest first within a priority
+        self.assertEqual(self.claim(first, 2), [ids[4], ids[1]])
+        self.assertEqual(self.claim(second, 3), [ids[3], ids[5], ids[2]])
+        # Your own leases are renewed, other moderators' are skipped
+        self.assertEqual(self.claim(first, 3), [ids[4], ids[1], ids[0]])
+        self.assertEqual(self.claim(second, 5), [ids[3], ids[5], ids[2]])
+
+        PropertyModeration.objects.filter(id=ids[4]).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.claim(second, 4), [ids[4], ids[3], ids[5], ids[2]])
+        self.client.force_login(second)
+        self.client.post(reverse('listings:approve-property', kwargs={'moderation_id': ids[4]}))
+        approved = PropertyModeration.objects.get(id=ids[4])
+        self.assertEqual((approved.status, approved.claimed_by_id), ('approved', None))
+        self.assertEqual(self.claim(second, 4), [ids[3], ids[5], ids[2]])
+
+        listed = {row['id']: row for row in self.client.get(reverse('listings:moderation-list')).json()['results']}
+        self.assertEqual(listed[ids[1]]['claimed_by'], first.id)
+        response = self.client.post(reverse('listings:moderation-claim'), {'count': 0})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkModerationTests(TestCase):
+    """Bulk actions match the per-item endpoints and cost the same queries for any number of items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('bulkadmin', 'bulkadmin@example.com', 'password', is_staff=True)
+        user = User.objects.create_user('bulkowner', 'bulkowner@example.com', 'password')
+        realtor = Realtor.objects.create(user=user, name='Bulk', phone='0800000000', email=user.email)
+        cls.moderations = []
+        for index in range(12):
+            listing = Listing.objects.create(
+                realtor=realtor, title=f'Bulk {index}', address=f'{index} Bulk Road', city='Lekki',
+                state='Lagos', zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+                is_published=index % 2 == 0,
+            )
+            cls.moderations.append(PropertyModeration.objects.create(listing=listing, priority='low'))
+
+    def bulk(self, ids, action, reason=''):
+        self.client.force_login(self.admin)
+        return self.client.post(
+            reverse('listings:moderation-bulk'), {'ids': ids, 'action': action, 'reason': reason},
+            content_type='application/json',
+        )
+
+    def test_actions_and_outcomes(self):
+        ids = [moderation.id for moderation in self.moderations]
+        response = self.bulk([ids[1], 999999, ids[3]], 'approve')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(
+            [(row['id'], row['status']) for row in response.json()['results']],
+            [(ids[1], 'updated'), (999999, 'not_found'), (ids[3], 'updated')],
+        )
+        approved = PropertyModeration.objects.select_related('listing').get(id=ids[1])
+        self.assertEqual((approved.status, approved.reviewed_by_id), ('approved', self.admin.id))
+        self.assertTrue(approved.listing.is_published)
+
+        self.bulk(ids[:2], 'reject', 'Blurry photos')
+        rejected = PropertyModeration.objects.select_related('listing').get(id=ids[0])
+        self.assertEqual((rejected.status, rejected.reason), ('rejected', 'Blurry photos'))
+        self.assertFalse(rejected.listing.is_published)
+
+        self.bulk([ids[4]], 'flag', 'Duplicate')
+        flagged = PropertyModeration.objects.select_related('listing').get(id=ids[4])
+        self.assertEqual((flagged.status, flagged.priority, flagged.priority_rank), ('flagged', 'high', 2))
+        self.assertTrue(flagged.listing.is_published)
+
+        self.assertEqual(self.bulk([], 'approve').status_code, 400)
+        self.assertEqual(self.bulk(['x'], 'approve').status_code, 400)
+        self.assertEqual(self.bulk([ids[0]], 'publish').status_code, 400)
+        with override_settings(MODERATION_BULK_MAX=2):
+            self.assertEqual(self.bulk(ids[:3], 'approve').status_code, 400)
+
+    def test_query_count_does_not_grow(self):
+        ids = [moderation.id for moderation in self.moderations]
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.bulk(ids[:2], 'reject').status_code, 200)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.bulk(ids, 'approve').status_code, 200)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(Listing.objects.filter(moderation__id__in=ids, is_published=True).count(), len(ids))
+
+
+class ListingPhotoTests(TestCase):
+    """Photo fields and uploads land in one ordered table, paged with one query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('photos', 'photos@example.com', 'password')
+        realtor = Realtor.objects.create(user=cls.user, name='Photos', phone='0800000000', email=cls.user.email)
+        cls.listing = Listing.objects.create(
+            realtor=realtor, title='Pictured', address='1 Photo Road', city='Lekki', state='Lagos',
+            zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+            photo_main='https://img.example.com/main.jpg', photo_2='https://img.example.com/2.jpg',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self, name, **fields):
+        return FileUpload.objects.create(
+            user=self.user, file_name=name, original_name=name, file_type='property-image', mime_type='image/jpeg',
+            file_size=1000, blob_url=f'https://blob.example.com/{name}', blob_key=name, **fields,
+        )
+
+    def images(self, params):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('accounts:property-images', kwargs={'property_id': self.listing.id}), params,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def urls(self):
+        return list(ListingPhoto.objects.filter(listing=self.listing).values_list('url', flat=True))
+
+    def test_photos_follow_fields_and_uploads(self):
+        self.upload('a.jpg', property_id=str(self.listing.id))
+        self.upload('b.jpg', listing=self.listing)
+        self.upload('doc.pdf', listing=self.listing, upload_status='pending')
+        self.assertEqual(self.urls(), [
+            'https://img.example.com/main.jpg', 'https://img.example.com/2.jpg',
+            'https://blob.example.com/a.jpg', 'https://blob.example.com/b.jpg',
+        ])
+
+        self.listing.photo_main = ''
+        self.listing.photo_1 = 'https://img.example.com/1.jpg'
+        self.listing.save()
+        removed = FileUpload.objects.get(file_name='a.jpg')
+        removed.upload_status = 'deleted'
+        removed.save()
+        self.assertEqual(self.urls(), [
+            'https://img.example.com/1.jpg', 'https://img.example.com/2.jpg', 'https://blob.example.com/b.jpg',
+        ])
+        FileUpload.objects.filter(file_name='b.jpg').delete()
+        self.assertEqual(len(self.urls()), 2)
+
+    def test_deleting_an_upload_removes_its_photo(self):
+        upload = self.upload('gone.jpg', listing=self.listing)
+        self.assertEqual(self.images({})['pagination']['total_images'], 3)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(reverse('accounts:delete-user-file', args=[upload.id]))
+        self.assertEqual(response.status_code, 200)
+        # One write to the upload row
+        writes = [query for query in context if query['sql'].startswith(f'UPDATE "{FileUpload._meta.db_table}"')]
+        self.assertEqual(len(writes), 1)
+        self.assertNotIn('https://blob.example.com/gone.jpg', self.urls())
+        self.assertEqual(self.images({})['pagination']['total_images'], 2)
+
+    def test_keyset_pages_and_cached_manifest(self):
+        for index in range(5):
+            self.upload(f'{index}.jpg', listing=self.listing)
+        first = self.images({'page': 1, 'limit': 3})
+        self.assertEqual(first['pagination']['total_images'], 7)
+        self.assertEqual(first['main_photo']['url'], 'https://img.example.com/main.jpg')
+        self.assertTrue(first['photos'][0]['is_main'])
+
+        seen, cursor = [], ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.images({'cursor': cursor, 'limit': 3})
+            # One photo query per page; the manifest comes from the cache
+            self.assertEqual(len([q for q in queries if 'listings_listingphoto' in q['sql']]), 1)
+            seen.extend(photo['url'] for photo in data['photos'])
+            cursor = data['pagination']['next_cursor']
+        self.assertEqual(seen, self.urls())
+        self.assertEqual(seen[:3], [photo['url'] for photo in first['photos']])
+
+        self.upload('late.jpg', listing=self.listing)
+        self.assertEqual(self.images({'page': 3, 'limit': 3})['pagination']['total_images'], 8)
+
+
+class ImageDerivativeTests(TestCase):
+    """Photos and uploads get WebP variants once, exposed as srcset maps"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('variants', 'variants@example.com', 'password')
+        realtor = Realtor.objects.create(user=cls.user, name='Variants', phone='0800000000', email=cls.user.email)
+        cls.listing = Listing.objects.create(
+            realtor=realtor, title='Resized', address='1 Resize Road', city='Lekki', state='Lagos',
+            zipcode='105102', price=1000000, bedrooms=1, bathrooms=1, sqft=500,
+            photo_main='https://img.example.com/wide.jpg', photo_1='https://img.example.com/missing.jpg',
+        )
+        cls.avatar = FileUpload.objects.create(
+            user=cls.user, file_name='me.png', original_name='me.png', file_type='avatar', mime_type='image/png',
+            file_size=1000, blob_url='https://blob.example.com/me.png', blob_key='me.png',
+        )
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        settings_override = override_settings(IMAGE_STORAGE_ROOT=root.name, IMAGE_STORAGE_URL='/media/images/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_image_storage()
+        self.addCleanup(reset_image_storage)
+        cache.clear()
+        self.save_original(root.name, 'img.example.com/wide.jpg', Image.new('RGB', (2000, 1000), 'navy'), 'JPEG')
+        self.save_original(root.name, 'blob.example.com/me.png', Image.new('RGBA', (200, 100)), 'PNG')
+
+    def save_original(self, root, path, image, image_format):
+        path = os.path.join(root, 'originals', path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path, image_format)
+
+    def test_variants_are_generated_once(self):
+        report = generate_derivatives(workers=2, batch_size=2)
+        self.assertEqual((report['images'], report['failed'], report['variants']), (3, 1, 6))
+
+        main = ListingPhoto.objects.get(listing=self.listing, is_main=True)
+        self.assertEqual((main.width, main.height), (2000, 1000))
+        self.assertEqual(
+            {name: (variant['width'], variant['height']) for name, variant in main.variants.items() if name != 'original'},
+            {'large': (1600, 800), 'medium': (768, 384), 'thumbnail': (320, 160)},
+        )
+        stored = os.path.join(self.root, main.variants['thumbnail']['url'][len('/media/images/'):])
+        with Image.open(stored) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (320, 160)))
+        self.assertIn('error', ListingPhoto.objects.get(listing=self.listing, slot='photo_1').variants)
+        # Smaller than every variant: not upscaled, one srcset entry
+        self.avatar.refresh_from_db()
+        self.assertEqual(list(srcset(self.avatar.variants)), ['200w'])
+
+        listed = self.client.get(reverse('listings:listing-list')).json()['results'][0]
+        self.assertEqual(list(listed['photo_main_srcset']), ['320w', '768w', '1600w'])
+
+        # Nothing left to do; failures only come back on request
+        self.assertEqual(generate_derivatives(workers=0)['images'], 0)
+        self.assertEqual(generate_derivatives(workers=0, retry_failed=True)['images'], 1)
@@ -0,0 +1,290 @@
+"""
+Buffered listing view tracking.
+
+Recording every view synchronously would cost an insert that can collide with
+``ListingView``'s unique constraint plus a row-locking update of the listing's
+``ListingAnalytics`` row, which is hot for popular listings. Instead each
+worker keeps a ``ViewBuffer``:
+
+* views from the same viewer (user, or IP for anonymous visitors) of the same
+  listing within ``LISTING_VIEW_DEDUP_SECONDS`` count once;
+* accepted views wait in memory and are flushed every
+  ``LISTING_VIEW_FLUSH_SECONDS`` (or as soon as ``LISTING_VIEW_BUFFER_MAX``
+  events are waiting) in one transaction: one
+  ``bulk_create(ignore_conflicts=True)`` of ``ListingView`` rows, one
+  ``UPDATE`` adding each listing's count with ``F()``, and a merge into each
+  listing's HyperLogLog sketch of distinct viewers, from which
+  ``unique_viewers`` is estimated.
+
+Flushes run on a background thread per worker, so recording a view never
+touches the database. With ``LISTING_VIEW_BACKGROUND_FLUSH`` off there is
+no thread and the ``record()`` call that finds a flush due writes the batch
+itself. Events still buffered when a worker is killed are
+lost, so the counters are best effort; the thread flushes once more at
+interpreter exit.
+"""
+import atexit
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 12  # 4096 one-byte registers, ~1.6% standard error
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch with 2**precision one-byte registers.
+    Sketches merge with an element-wise max, so workers can fold their
+    batches into the stored sketch in any order.
+    """
+
+    def __init__(self, registers=b'', precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers and len(registers) == self.size:
+            self.registers = np.frombuffer(bytes(registers), dtype=np.uint8).copy()
+        else:
+            self.registers = np.zeros(self.size, dtype=np.uint8)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        remainder = (hashed << self.precision) & 0xFFFFFFFFFFFFFFFF
+        # Position of the first 1 bit in the remaining 64 - precision bits
+        rank = min(64 - remainder.bit_length(), 64 - self.precision) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+
+def client_ip(request):
+    """
+    The client's address: ``REMOTE_ADDR``, or the entry ``TRUSTED_PROXY_COUNT``
+    hops from the right of ``X-Forwarded-For`` when behind that many proxies.
+    """
+    address = request.META.get('REMOTE_ADDR') or '0.0.0.0'
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+    if proxies and len(forwarded) >= proxies:
+        candidate = forwarded[-proxies]
+        try:
+            return str(ipaddress.ip_address(candidate))
+        except ValueError:
+            pass
+    return address
+
+
+class ViewBuffer:
+    """Per-process buffer of deduplicated view events, flushed in batches"""
+
+    def __init__(self, dedup_seconds=None, flush_seconds=None, max_events=None, background=None):
+        self.dedup_seconds = (
+            dedup_seconds if dedup_seconds is not None
+            else getattr(settings, 'LISTING_VIEW_DEDUP_SECONDS', 1800)
+        )
+        self.flush_seconds = (
+            flush_seconds if flush_seconds is not None
+            else getattr(settings, 'LISTING_VIEW_FLUSH_SECONDS', 10)
+        )
+        self.max_events = max_events if max_events is not None else getattr(settings, 'LISTING_VIEW_BUFFER_MAX', 1000)
+        self.background = (
+            background if background is not None
+            else getattr(settings, 'LISTING_VIEW_BACKGROUND_FLUSH', True)
+        )
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._seen = {}  # (listing_id, viewer) -> monotonic time of the last counted view
+        self._pending = []  # (listing_id, user_id, ip_address, viewer, viewed_at)
+        self._flushed_at = time.monotonic()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._flusher = None
+
+    def record(self, listing_id, user_id, ip_address):
+        """Buffer a view; False when the viewer was already counted within the window"""
+        viewer = f'user:{user_id}' if user_id else f'ip:{ip_address}'
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.get((listing_id, viewer))
+            if last is not None and now - last < self.dedup_seconds:
+                return False
+            self._seen[(listing_id, viewer)] = now
+            self._pending.append((listing_id, user_id, ip_address, viewer, timezone.now()))
+            full = len(self._pending) >= self.max_events
+            if self.background:
+                if self._flusher is None or not self._flusher.is_alive():
+                    # Started lazily, so forked workers each get their own
+                    self._flusher = threading.Thread(target=self._run, name='listing-view-flusher', daemon=True)
+                    self._flusher.start()
+                if full:
+                    self._wake.set()
+                return True
+            due = full or now - self._flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+        return True
+
+    def _run(self):
+        """Background loop: flush every ``flush_seconds`` or when woken by a full buffer"""
+        while not self._stopped:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connections.close_all()
+
+    def stop(self):
+        """Stop the background thread and flush what is left (run at interpreter exit)"""
+        self._stopped = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_seconds)
+        return self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write buffered views; returns the number of events flushed"""
+        # One flush at a time per process; concurrent callers leave it to the running one
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                events, self._pending = self._pending, []
+                self._flushed_at = now = time.monotonic()
+                self._seen = {key: seen for key, seen in self._seen.items() if now - seen < self.dedup_seconds}
+            if events:
+                try:
+                    write_views(events)
+                except DatabaseError:
+                    # Counters are best effort; never fail the flusher or the request that triggered the flush
+                    logger.exception('Dropped %d buffered listing views', len(events))
+                    return 0
+            return len(events)
+        finally:
+            self._flush_lock.release()
+
+
+def write_views(events):
+    """Apply a batch of ``(listing_id, user_id, ip_address, viewer, viewed_at)`` events"""
+    from django.contrib.auth.models import User
+
+    from .models import Listing, ListingAnalytics, ListingView
+
+    # Listings or users deleted since the view would fail the batch's foreign keys
+    listing_ids = set(
+        Listing.objects.filter(id__in={event[0] for event in events}).values_list('id', flat=True)
+    )
+    events = [event for event in events if event[0] in listing_ids]
+    if not events:
+        return
+    user_ids = {event[1] for event in events if event[1]}
+    if user_ids:
+        user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    counts, last_viewed, viewers, rows = {}, {}, {}, set()
+    for listing_id, user_id, ip_address, viewer, viewed_at in events:
+        counts[listing_id] = counts.get(listing_id, 0) + 1
+        last_viewed[listing_id] = max(viewed_at, last_viewed.get(listing_id, viewed_at))
+        viewers.setdefault(listing_id, set()).add(viewer)
+        if not user_id or user_id in user_ids:
+            rows.add((listing_id, user_id, ip_address))
+
+    with transaction.atomic():
+        # viewed_at is auto_now_add, so rows carry the flush time
+        ListingView.objects.bulk_create(
+            [
+                ListingView(listing_id=listing_id, user_id=user_id, ip_address=ip_address)
+                for listing_id, user_id, ip_address in rows
+            ],
+            ignore_conflicts=True,
+        )
+        ListingAnalytics.objects.bulk_create(
+            [ListingAnalytics(listing_id=listing_id) for listing_id in counts], ignore_conflicts=True,
+        )
+        # Another worker may have flushed a later view already
+        latest = Case(
+            *[When(listing_id=listing_id, then=Value(viewed_at)) for listing_id, viewed_at in last_viewed.items()],
+        )
+        ListingAnalytics.objects.filter(listing_id__in=counts).update(
+            views=F('views') + Case(
+                *[When(listing_id=listing_id, then=Value(count)) for listing_id, count in counts.items()],
+                output_field=IntegerField(),
+            ),
+            last_viewed=Greatest(
+                Coalesce(F('last_viewed'), latest), latest,
+            ),
+        )
+
+        # Sketches are read-modify-write; lock the rows so workers don't lose each other's merges
+        analytics = list(
+            ListingAnalytics.objects.select_for_update()
+            .filter(listing_id__in=viewers)
+            .only('id', 'listing_id', 'viewer_sketch', 'unique_viewers')
+        )
+        for row in analytics:
+            sketch = HyperLogLog(row.viewer_sketch)
+            batch = HyperLogLog()
+            for viewer in viewers[row.listing_id]:
+                batch.add(viewer)
+            sketch.merge(batch)
+            row.viewer_sketch = sketch.to_bytes()
+            row.unique_viewers = sketch.count()
+        ListingAnalytics.objects.bulk_update(analytics, ['viewer_sketch', 'unique_viewers'])
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ViewBuffer()
+                if _buffer.background:
+                    atexit.register(_buffer.stop)
+    return _buffer
+
+
+def reset_view_buffer():
+    """Drop the process buffer and its pending events (tests)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            atexit.unregister(_buffer.stop)
+            _buffer._stopped = True
+            _buffer._wake.set()
+        _buffer = None
@@ -1,22 +1,33 @@
 from django.urls import path
-from . import views
+from . import async_views, views
+from .async_views import as_read_view
 
 app_name = 'listings'
 
 urlpatterns = [
-    # API Endpoints
-    path('', views.ListingListAPIView.as_view(), name='listing-list'),
-    path('<int:id>/', views.ListingDetailAPIView.as_view(), name='listing-detail'),
+    # API Endpoints (read endpoints are async under ASGI, see listings.async_views)
+    path('', as_read_view(async_views.ListingListView), name='listing-list'),
+    path('<int:id>/', as_read_view(async_views.ListingDetailView), name='listing-detail'),
     path('create/', views.ListingCreateAPIView.as_view(), name='listing-create'),
     path('<int:id>/update/', views.ListingUpdateAPIView.as_view(), name='listing-update'),
     path('<int:id>/delete/', views.ListingDeleteAPIView.as_view(), name='listing-delete'),
-    path('featured/', views.FeaturedListingsAPIView.as_view(), name='featured-listings-paginated'),
+    path('<int:id>/similar/', views.SimilarListingsAPIView.as_view(), name='listing-similar'),
+    path('<int:id>/view/', views.record_listing_view, name='listing-view'),
+    path('<int:id>/analytics/', views.listing_analytics_series, name='listing-analytics-series'),
+    path('featured/', as_read_view(async_views.FeaturedListingsView), name='featured-listings-paginated'),
     path('featured/legacy/', views.featured_listings, name='featured-listings-legacy'),
-    path('search/', views.SearchListingsAPIView.as_view(), name='search-listings-paginated'),
+    path('search/', as_read_view(async_views.SearchListingsView), name='search-listings-paginated'),
     path('search/legacy/', views.search_listings, name='search-listings-legacy'),
+    path('facets/', views.ListingFacetsAPIView.as_view(), name='listing-facets'),
+    path('market-stats/', views.market_stats, name='market-stats'),
+    path('clusters/', views.ListingClustersAPIView.as_view(), name='listing-clusters'),
+    path('export/', views.ListingExportAPIView.as_view(), name='listing-export'),
+    path('ingest/', views.ingest_listings, name='listing-ingest'),
     
     # Admin Moderation Endpoints
     path('admin/moderation/', views.PropertyModerationListAPIView.as_view(), name='moderation-list'),
+    path('admin/moderation/claim/', views.claim_moderations_view, name='moderation-claim'),
+    path('admin/moderation/bulk/', views.bulk_moderate_view, name='moderation-bulk'),
     path('admin/moderation/<int:id>/', views.PropertyModerationDetailAPIView.as_view(), name='moderation-detail'),
     path('admin/moderation/<int:moderation_id>/approve/', views.approve_property, name='approve-property'),
     path('admin/moderation/<int:moderation_id>/reject/', views.reject_property, name='reject-property'),
@@ -1,12 +1,36 @@
+import copy
+
 from rest_framework import generics, filters, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Q
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
 from django.utils import timezone
+from .cache import CachedResponseMixin
+from .export import EXPORT_FORMATS, aexport_lines, export_lines
+from .facets import get_facets
+from .featurebits import filter_features
+from .featured import MIN_FEATURED, featured_queryset, get_featured_slate
+from .geo import cluster_markers, filter_geo, zoom_precision
+from .ingest import FEED_FORMATS, guess_format, ingest_feed, open_feed
+from .market import get_market_stats
+from .metrics import ListingOrderingFilter, filter_market_metrics
 from .models import Listing, PropertyModeration
+from .moderation import (
+    BULK_ACTIONS, ModerationOrderingFilter, bulk_moderate, claim_moderations, filter_days_pending, release_claim,
+    with_days_pending,
+)
+from .pagination import ListingPagination
+from .rollups import listing_time_series, parse_range
+from .search import ListingSearchFilter, get_search_backend
+from .snapshot import get_listing_snapshot
+from .tracking import client_ip, get_view_buffer
 from .serializers import (
     ListingSerializer, 
     ListingListSerializer, 
@@ -17,99 +41,46 @@ from .serializers import (
 )
 
 
-class CustomPagination(PageNumberPagination):
+class CustomPagination(ListingPagination):
     """
     Custom pagination class for property listings
     """
     page_size = 12  # Default listings per page
-    page_size_query_param = 'limit'
     max_page_size = 100
-    page_query_param = 'page'
 
-    def get_paginated_response(self, data):
-        return Response({
-            'results': data,
-            'count': self.page.paginator.count,
-            'pagination': {
-                'page': self.page.number,
-                'limit': self.page_size,
-                'total': self.page.paginator.count,
-                'pages': self.page.paginator.num_pages,
-                'has_next': self.page.has_next(),
-                'has_previous': self.page.has_previous(),
-                'next_page': self.page.next_page_number() if self.page.has_next() else None,
-                'previous_page': self.page.previous_page_number() if self.page.has_previous() else None,
-            }
-        })
 
-
-class FeaturedListingsPagination(PageNumberPagination):
+class FeaturedListingsPagination(ListingPagination):
     """
     Custom pagination class for featured listings
     """
     page_size = 6  # Default 6 featured listings per page
-    page_size_query_param = 'limit'
     max_page_size = 20
-    page_query_param = 'page'
 
-    def get_paginated_response(self, data):
-        return Response({
-            'results': data,
-            'count': self.page.paginator.count,
-            'pagination': {
-                'page': self.page.number,
-                'limit': self.page_size,
-                'total': self.page.paginator.count,
-                'pages': self.page.paginator.num_pages,
-                'has_next': self.page.has_next(),
-                'has_previous': self.page.has_previous(),
-                'next_page': self.page.next_page_number() if self.page.has_next() else None,
-                'previous_page': self.page.previous_page_number() if self.page.has_previous() else None,
-            }
-        })
 
-
-class SearchListingsPagination(PageNumberPagination):
+class SearchListingsPagination(ListingPagination):
     """
     Custom pagination class for search results
     """
     page_size = 15  # Default 15 search results per page
-    page_size_query_param = 'limit'
     max_page_size = 50
-    page_query_param = 'page'
-
-    def get_paginated_response(self, data):
-        return Response({
-            'results': data,
-            'count': self.page.paginator.count,
-            'pagination': {
-                'page': self.page.number,
-                'limit': self.page_size,
-                'total': self.page.paginator.count,
-                'pages': self.page.paginator.num_pages,
-                'has_next': self.page.has_next(),
-                'has_previous': self.page.has_previous(),
-                'next_page': self.page.next_page_number() if self.page.has_next() else None,
-                'previous_page': self.page.previous_page_number() if self.page.has_previous() else None,
-            }
-        })
 
 
-class ListingListAPIView(generics.ListAPIView):
+class ListingListAPIView(CachedResponseMixin, generics.ListAPIView):
     """
     List all published listings with search, filter, and pagination capabilities
     """
     queryset = Listing.objects.filter(is_published=True).order_by('-list_date')
     serializer_class = ListingListSerializer
     pagination_class = CustomPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    cache_namespaces = ('listings', 'realtors')
+    filter_backends = [DjangoFilterBackend, ListingOrderingFilter, ListingSearchFilter]
     filterset_fields = ['city', 'state', 'bedrooms', 'bathrooms', 'realtor', 'is_featured']
     search_fields = ['title', 'description', 'address', 'city', 'state']
-    ordering_fields = ['price', 'list_date', 'sqft']
+    ordering_fields = ['price', 'list_date', 'sqft', 'price_per_sqft', 'days_on_market']
     ordering = ['-list_date']
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = ListingListSerializer.setup_eager_loading(super().get_queryset())
         
         # Custom filters
         min_price = self.request.query_params.get('min_price')
@@ -131,17 +102,49 @@ class ListingListAPIView(generics.ListAPIView):
             queryset = queryset.filter(property_type=property_type)
         if listing_type:
             queryset = queryset.filter(listing_type=listing_type)
+
+        # min_ppsf/max_ppsf and min_/max_days_on_market
+        queryset = filter_market_metrics(queryset, self.request.query_params)
+        # features=Pool,Gym: listings having all of them
+        queryset = filter_features(queryset, self.request.query_params)
             
         return queryset
 
+    def filter_queryset(self, queryset):
+        # Plain filter/sort requests are answered from the columnar snapshot;
+        # only the requested page is then loaded from the database
+        snapshot = get_listing_snapshot()
+        if snapshot is not None:
+            selection = snapshot.select(self.request.query_params, queryset)
+            if selection is not None:
+                return selection
+        return super().filter_queryset(queryset)
+
 
-class ListingDetailAPIView(generics.RetrieveAPIView):
+class ListingDetailAPIView(CachedResponseMixin, generics.RetrieveAPIView):
     """
     Retrieve a specific listing by ID
     """
-    queryset = Listing.objects.filter(is_published=True)
+    queryset = ListingSerializer.setup_eager_loading(Listing.objects.filter(is_published=True))
     serializer_class = ListingSerializer
     lookup_field = 'id'
+    cache_namespaces = ('listings', 'realtors')
+
+
+class SimilarListingsAPIView(CachedResponseMixin, generics.ListAPIView):
+    """
+    Listings most similar to a listing, best first, from the neighbour table
+    that ``compute_similar_listings`` maintains
+    """
+    serializer_class = ListingListSerializer
+    pagination_class = None
+    cache_namespaces = ('listings', 'realtors', 'similar')
+
+    def get_queryset(self):
+        return ListingListSerializer.setup_eager_loading(
+            Listing.objects.filter(is_published=True, similar_to__listing_id=self.kwargs['id'])
+            .order_by('similar_to__rank')
+        )
 
 
 class ListingCreateAPIView(generics.CreateAPIView):
@@ -176,43 +179,17 @@ class ListingDeleteAPIView(generics.DestroyAPIView):
     lookup_field = 'id'
 
 
-class FeaturedListingsAPIView(generics.ListAPIView):
+class FeaturedListingsAPIView(CachedResponseMixin, generics.ListAPIView):
     """
     Get featured listings with pagination
     """
     serializer_class = ListingListSerializer
     pagination_class = FeaturedListingsPagination
+    cache_namespaces = ('listings', 'realtors')
     
     def get_queryset(self):
-        # Get listings marked as featured first, then MVP realtors, then latest
-        featured_queryset = Listing.objects.filter(
-            is_published=True,
-            is_featured=True
-        ).order_by('-list_date')
-        
-        if featured_queryset.count() < 6:
-            # If not enough featured listings, add MVP realtor listings
-            mvp_queryset = Listing.objects.filter(
-                is_published=True,
-                realtor__is_mvp=True
-            ).exclude(is_featured=True).order_by('-list_date')
-            
-            # Combine querysets
-            combined_ids = list(featured_queryset.values_list('id', flat=True)) + \
-                          list(mvp_queryset.values_list('id', flat=True))
-            
-            if len(combined_ids) < 6:
-                # If still not enough, add latest listings
-                latest_queryset = Listing.objects.filter(
-                    is_published=True
-                ).exclude(id__in=combined_ids).order_by('-list_date')
-                
-                combined_ids.extend(list(latest_queryset.values_list('id', flat=True)))
-            
-            # Return queryset preserving order
-            return Listing.objects.filter(id__in=combined_ids).order_by('-list_date')
-        
-        return featured_queryset
+        # Featured first, then MVP realtors, then latest (see listings.featured)
+        return ListingListSerializer.setup_eager_loading(featured_queryset())
 
 
 @api_view(['GET'])
@@ -221,36 +198,10 @@ def featured_listings(request):
     Legacy featured listings endpoint - kept for backward compatibility
     """
     try:
-        # Get listings from MVP realtors or latest 6 listings
-        featured = Listing.objects.filter(
-            is_published=True,
-            is_featured=True
-        ).order_by('-list_date')[:6]
-        
-        if featured.count() < 6:
-            # If not enough featured listings, get MVP listings
-            mvp_featured = Listing.objects.filter(
-                is_published=True,
-                realtor__is_mvp=True
-            ).exclude(is_featured=True).order_by('-list_date')[:6-featured.count()]
-            
-            # Combine results
-            all_featured = list(featured) + list(mvp_featured)
-            
-            if len(all_featured) < 6:
-                # If still not enough, get latest listings
-                latest = Listing.objects.filter(
-                    is_published=True
-                ).exclude(
-                    id__in=[listing.id for listing in all_featured]
-                ).order_by('-list_date')[:6-len(all_featured)]
-                
-                all_featured.extend(list(latest))
-            
-            serializer = ListingListSerializer(all_featured, many=True)
-        else:
-            serializer = ListingListSerializer(featured, many=True)
-            
+        featured = ListingListSerializer.setup_eager_loading(
+            featured_queryset(get_featured_slate()[:MIN_FEATURED])
+        )
+        serializer = ListingListSerializer(featured, many=True)
         return Response({
             'results': serializer.data,
             'count': len(serializer.data)
@@ -268,14 +219,17 @@ class SearchListingsAPIView(generics.ListAPIView):
     """
     serializer_class = ListingListSerializer
     pagination_class = SearchListingsPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ListingOrderingFilter, ListingSearchFilter]
     filterset_fields = ['city', 'state', 'bedrooms', 'bathrooms', 'realtor', 'is_featured', 'property_type', 'listing_type']
     search_fields = ['title', 'description', 'address', 'city', 'state']
-    ordering_fields = ['price', 'list_date', 'sqft']
+    ordering_fields = ['price', 'list_date', 'sqft', 'price_per_sqft', 'days_on_market']
     ordering = ['-list_date']
 
+    def get_base_queryset(self):
+        return ListingListSerializer.setup_eager_loading(Listing.objects.filter(is_published=True))
+
     def get_queryset(self):
-        queryset = Listing.objects.filter(is_published=True)
+        queryset = self.get_base_queryset()
         
         # Custom filters
         min_price = self.request.query_params.get('min_price')
@@ -291,10 +245,161 @@ class SearchListingsAPIView(generics.ListAPIView):
             queryset = queryset.filter(sqft__gte=min_sqft)
         if max_sqft:
             queryset = queryset.filter(sqft__lte=max_sqft)
+
+        # min_ppsf/max_ppsf and min_/max_days_on_market
+        queryset = filter_market_metrics(queryset, self.request.query_params)
+        # features=Pool,Gym: listings having all of them
+        queryset = filter_features(queryset, self.request.query_params)
+
+        # Map search: bbox= and near=/radius_km=
+        queryset = filter_geo(queryset, self.request.query_params)
             
         return queryset.order_by('-list_date')
 
 
+class ListingFacetsAPIView(SearchListingsAPIView):
+    """
+    Facet counts for the search form. Accepts the same filters as the search
+    endpoint and returns per-value counts for each filter family.
+    """
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_facets(request.query_params, self.queryset_for))
+
+    def queryset_for(self, query_params):
+        """Run the search filter pipeline for an arbitrary set of query params"""
+        http_request = copy.copy(self.request._request)
+        http_request.GET = query_params
+        view = SearchListingsAPIView(request=Request(http_request), args=(), kwargs={}, format_kwarg=None)
+        return view.filter_queryset(view.get_queryset())
+
+
+class ListingClustersAPIView(SearchListingsAPIView):
+    """
+    Map markers: listings matching the search filters grouped per geohash
+    cell, with the cell size picked from the map ``zoom`` level.
+    """
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        precision = zoom_precision(request.query_params.get('zoom', 10))
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({'precision': precision, 'clusters': cluster_markers(queryset, precision)})
+
+
+def view_queryset(view_class, params):
+    """
+    Run a listing view's queryset and filter pipeline for a dict of query
+    params outside a request (management commands), as an anonymous GET
+    """
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    http_request.GET.update(params)
+    view = view_class(request=Request(http_request), args=(), kwargs={}, format_kwarg=None)
+    return view.filter_queryset(view.get_queryset())
+
+
+class ListingExportAPIView(SearchListingsAPIView):
+    """
+    Stream the catalog as CSV or JSON Lines (staff only). Accepts the search
+    filters; ``?output=csv|jsonl`` picks the format and ``?include_unpublished=1``
+    exports unpublished listings too.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = None
+
+    def get_base_queryset(self):
+        if self.request.query_params.get('include_unpublished', '').lower() in ('1', 'true', 'yes'):
+            return Listing.objects.all()
+        return Listing.objects.filter(is_published=True)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'output': f'Expected one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        # ASGI would buffer a sync iterator whole (see listings.export)
+        stream = aexport_lines if isinstance(request._request, ASGIRequest) else export_lines
+        response = StreamingHttpResponse(
+            stream(queryset, export_format), content_type=EXPORT_FORMATS[export_format]
+        )
+        filename = f'listings-{timezone.now():%Y%m%d-%H%M%S}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def ingest_listings(request):
+    """
+    Delta-sync a partner feed (staff only). Multipart ``feed`` file (CSV or
+    JSON Lines), optional ``format``, default ``realtor`` ID and ``dry_run``.
+    """
+    feed = request.FILES.get('feed')
+    if feed is None:
+        return Response({'feed': 'A feed file is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    feed_format = request.data.get('format') or guess_format(feed.name)
+    if feed_format not in FEED_FORMATS:
+        return Response(
+            {'format': f'Expected one of: {", ".join(FEED_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    report = ingest_feed(
+        open_feed(feed, feed_format), feed_format,
+        default_realtor_id=request.data.get('realtor') or None, dry_run=dry_run,
+    )
+    return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def record_listing_view(request, id):
+    """
+    Count a view of a listing. Views are deduplicated per viewer and buffered;
+    a background thread writes them in batches (see listings.tracking), so
+    this does not touch the database. Unknown listings are dropped when the
+    buffer is flushed.
+    """
+    user_id = request.user.id if request.user.is_authenticated else None
+    recorded = get_view_buffer().record(id, user_id, client_ip(request))
+    return Response({'recorded': recorded}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def listing_analytics_series(request, id):
+    """
+    Hourly or daily activity of a listing (its realtor or staff only), read
+    from the analytics rollups. ``granularity`` is ``hour`` or ``day``;
+    ``start``/``end`` are inclusive dates.
+    """
+    listing = generics.get_object_or_404(Listing.objects.select_related('realtor').only('id', 'realtor__user'), id=id)
+    if not (request.user.is_staff or listing.realtor.user_id == request.user.id):
+        raise PermissionDenied('Only the listing\'s realtor can view its analytics.')
+    granularity, start_date, end_date = parse_range(
+        request.query_params.get('granularity'), request.query_params.get('start'), request.query_params.get('end'),
+    )
+    return Response(listing_time_series(listing.id, granularity, start_date, end_date))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def market_stats(request):
+    """
+    Price percentiles, median price per sqft, inventory and average days on
+    market of published listings per ``group_by`` (``city``, ``neighborhood``
+    and/or ``property_type``), optionally filtered by ``listing_type``,
+    ``city``, ``state`` or ``property_type``. Cached, see listings.market.
+    """
+    return Response(get_market_stats(request.query_params))
+
+
 @api_view(['GET'])
 def search_listings(request):
     """
@@ -307,16 +412,10 @@ def search_listings(request):
         bedrooms = request.GET.get('bedrooms', '')
         price_max = request.GET.get('price_max', '')
         
-        listings = Listing.objects.filter(is_published=True)
+        listings = ListingListSerializer.setup_eager_loading(Listing.objects.filter(is_published=True))
         
         if query:
-            listings = listings.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(address__icontains=query) |
-                Q(city__icontains=query) |
-                Q(state__icontains=query)
-            )
+            listings = get_search_backend().search(listings, query)
         
         if city:
             listings = listings.filter(city__iexact=city)
@@ -330,7 +429,10 @@ def search_listings(request):
         if price_max:
             listings = listings.filter(price__lte=price_max)
         
-        listings = listings.order_by('-list_date')
+        if query:
+            listings = listings.order_by('-search_rank', '-list_date')
+        else:
+            listings = listings.order_by('-list_date')
         serializer = ListingListSerializer(listings, many=True)
         return Response({
             'results': serializer.data,
@@ -349,23 +451,33 @@ class PropertyModerationListAPIView(generics.ListAPIView):
     """
     List all properties pending moderation (Admin only)
     """
-    queryset = PropertyModeration.objects.all().order_by('-priority', '-submitted_date')
+    queryset = PropertyModerationSerializer.setup_eager_loading(
+        PropertyModeration.objects.all().order_by('-priority_rank', '-submitted_date')
+    )
     serializer_class = PropertyModerationSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, ModerationOrderingFilter]
     filterset_fields = ['status', 'priority']
     search_fields = ['listing__title', 'listing__address', 'listing__city']
-    ordering_fields = ['submitted_date', 'priority', 'status']
-    ordering = ['-priority', '-submitted_date']
+    # priority sorts by rank (see listings.moderation)
+    ordering_fields = ['submitted_date', 'priority', 'priority_rank', 'status', 'days_pending']
+    ordering = ['-priority_rank', '-submitted_date']
+
+    def get_queryset(self):
+        # min_days_pending/max_days_pending filter on the annotated age
+        return filter_days_pending(with_days_pending(super().get_queryset()), self.request.query_params)
 
 
 class PropertyModerationDetailAPIView(generics.RetrieveUpdateAPIView):
     """
     Retrieve and update property moderation status (Admin only)
     """
-    queryset = PropertyModeration.objects.all()
+    queryset = PropertyModerationSerializer.setup_eager_loading(PropertyModeration.objects.all())
     permission_classes = [IsAuthenticated, IsAdminUser]
     lookup_field = 'id'
+
+    def get_queryset(self):
+        return with_days_pending(super().get_queryset())
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -377,6 +489,63 @@ class PropertyModerationDetailAPIView(generics.RetrieveUpdateAPIView):
         serializer.save(reviewed_by=self.request.user)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def claim_moderations_view(request):
+    """
+    Lease the next ``count`` open items of the moderation queue (most urgent,
+    then oldest) to the requesting admin for ``MODERATION_LEASE_SECONDS``.
+    Items leased to other admins are skipped; the caller's own are renewed.
+    """
+    limit = getattr(settings, 'MODERATION_CLAIM_MAX', 25)
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= limit:
+        raise ValidationError({'count': f'Expected a whole number between 1 and {limit}.'})
+
+    claimed_ids, expires = claim_moderations(request.user, count)
+    moderations = {
+        moderation.id: moderation
+        for moderation in with_days_pending(
+            PropertyModerationSerializer.setup_eager_loading(PropertyModeration.objects.filter(id__in=claimed_ids))
+        )
+    }
+    serializer = PropertyModerationSerializer([moderations[pk] for pk in claimed_ids], many=True)
+    return Response({'lease_expires_at': expires, 'results': serializer.data})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def bulk_moderate_view(request):
+    """
+    Approve, reject or flag up to ``MODERATION_BULK_MAX`` items at once, in one
+    transaction. Body: ``{"ids": [...], "action": "approve", "reason": ""}``.
+    Responds with the outcome per ID: ``updated`` or ``not_found``.
+    """
+    limit = getattr(settings, 'MODERATION_BULK_MAX', 500)
+    ids = request.data.get('ids')
+    if (
+        not isinstance(ids, list) or not 1 <= len(ids) <= limit
+        or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+    ):
+        raise ValidationError({'ids': f'Expected a list of 1 to {limit} moderation IDs.'})
+    action = request.data.get('action')
+    if action not in BULK_ACTIONS:
+        raise ValidationError({'action': f'Expected one of: {", ".join(BULK_ACTIONS)}'})
+    reason = request.data.get('reason') or ''
+    if not isinstance(reason, str):
+        raise ValidationError({'reason': 'Expected a string.'})
+
+    outcomes = bulk_moderate(request.user, list(dict.fromkeys(ids)), action, reason)
+    return Response({
+        'action': action,
+        'updated': sum(outcome == 'updated' for outcome in outcomes.values()),
+        'results': [{'id': pk, 'status': outcome} for pk, outcome in outcomes.items()],
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def approve_property(request, moderation_id):
@@ -386,6 +555,7 @@ def approve_property(request, moderation_id):
     try:
         moderation = PropertyModeration.objects.get(id=moderation_id)
         moderation.status = 'approved'
+        release_claim(moderation)
         moderation.reviewed_by = request.user
         moderation.reviewed_date = timezone.now()
         moderation.save()
@@ -409,6 +579,7 @@ def reject_property(request, moderation_id):
         reason = request.data.get('reason', '')
         
         moderation.status = 'rejected'
+        release_claim(moderation)
         moderation.reason = reason
         moderation.reviewed_by = request.user
         moderation.reviewed_date = timezone.now()
@@ -433,6 +604,7 @@ def flag_property(request, moderation_id):
         reason = request.data.get('reason', '')
         
         moderation.status = 'flagged'
+        release_claim(moderation)
         moderation.reason = reason
         moderation.reviewed_by = request.user
         moderation.reviewed_date = timezone.now()
@@ -25,7 +25,7 @@ class RealtorAdmin(admin.ModelAdmin):
             'fields': ('website', 'linkedin_url', 'facebook_url', 'instagram_url')
         }),
         ('Ratings & Reviews', {
-            'fields': ('average_rating', 'total_reviews'),
+            'fields': ('average_rating', 'total_reviews', 'rating_histogram'),
             'classes': ('collapse',)
         }),
         ('System', {
@@ -34,6 +34,6 @@ class RealtorAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ('average_rating', 'total_reviews', 'updated_at')
+    readonly_fields = ('average_rating', 'total_reviews', 'rating_histogram', 'updated_at')
 
 admin.site.register(Realtor, RealtorAdmin)
\ No newline at end of file
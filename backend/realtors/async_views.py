@@ -0,0 +1,12 @@
+"""Async (ASGI) counterparts of the realtor read endpoints, see ``listings.async_views``"""
+from listings.async_views import AsyncDetailView, AsyncListView
+
+from . import views
+
+
+class RealtorListView(AsyncListView):
+    api_view_class = views.RealtorListAPIView
+
+
+class RealtorDetailView(AsyncDetailView):
+    api_view_class = views.RealtorDetailAPIView
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-17 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realtors", "0004_realtor_average_rating_realtor_bio_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_count_1",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_count_2",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_count_3",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_count_4",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_count_5",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="realtor",
+            name="rating_sum",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -28,9 +28,15 @@ class Realtor(models.Model):
     facebook_url = models.URLField(blank=True)
     instagram_url = models.URLField(blank=True)
     
-    # Ratings and Reviews
+    # Ratings and Reviews (maintained from RealtorReview, see listings.ratings)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     total_reviews = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count_1 = models.IntegerField(default=0)
+    rating_count_2 = models.IntegerField(default=0)
+    rating_count_3 = models.IntegerField(default=0)
+    rating_count_4 = models.IntegerField(default=0)
+    rating_count_5 = models.IntegerField(default=0)
     
     # Languages Spoken
     languages = models.CharField(max_length=200, default='English')
@@ -84,5 +90,10 @@ class Realtor(models.Model):
 
         super(Realtor, self).save(*args, **kwargs)  # Save the Realtor instance
 
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating"""
+        return {str(stars): getattr(self, f'rating_count_{stars}') for stars in range(1, 6)}
+
     def __str__(self):
         return self.name
@@ -20,6 +20,7 @@ class RealtorSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     experience_display = serializers.SerializerMethodField()
     total_sales_display = serializers.SerializerMethodField()
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Realtor
@@ -28,10 +29,10 @@ class RealtorSerializer(serializers.ModelSerializer):
             'phone', 'email', 'license_number', 'years_experience', 
             'total_sales_count', 'total_sales_volume', 'website', 
             'linkedin_url', 'facebook_url', 'instagram_url', 'average_rating',
-            'total_reviews', 'languages', 'specializations', 'is_mvp', 
+            'total_reviews', 'rating_histogram', 'languages', 'specializations', 'is_mvp', 
             'is_active', 'hire_date', 'experience_display', 'total_sales_display'
         ]
-        read_only_fields = ('id', 'hire_date', 'average_rating', 'total_reviews', 
+        read_only_fields = ('id', 'hire_date', 'average_rating', 'total_reviews', 'rating_histogram',
                            'experience_display', 'total_sales_display')
     
     def get_experience_display(self, obj):
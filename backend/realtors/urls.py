@@ -1,12 +1,13 @@
 from django.urls import path
-from . import views
+from listings.async_views import as_read_view
+from . import async_views, views
 
 app_name = 'realtors'
 
 urlpatterns = [
-    # API Endpoints
-    path('', views.RealtorListAPIView.as_view(), name='realtor-list'),
-    path('<int:id>/', views.RealtorDetailAPIView.as_view(), name='realtor-detail'),
+    # API Endpoints (read endpoints are async under ASGI, see listings.async_views)
+    path('', as_read_view(async_views.RealtorListView), name='realtor-list'),
+    path('<int:id>/', as_read_view(async_views.RealtorDetailView), name='realtor-detail'),
     path('create/', views.RealtorCreateAPIView.as_view(), name='realtor-create'),
     path('<int:id>/update/', views.RealtorUpdateAPIView.as_view(), name='realtor-update'),
     path('<int:id>/delete/', views.RealtorDeleteAPIView.as_view(), name='realtor-delete'),
@@ -2,23 +2,25 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from listings.cache import CachedResponseMixin
 from .models import Realtor
 from .serializers import RealtorSerializer, RealtorListSerializer, RealtorCreateSerializer
 
 
-class RealtorListAPIView(generics.ListAPIView):
+class RealtorListAPIView(CachedResponseMixin, generics.ListAPIView):
     """
     List all realtors
     """
-    queryset = Realtor.objects.all().order_by('-hire_date')
+    queryset = Realtor.objects.select_related('user').order_by('-hire_date')
     serializer_class = RealtorListSerializer
+    cache_namespaces = ('realtors',)
 
 
 class RealtorDetailAPIView(generics.RetrieveAPIView):
     """
     Retrieve a specific realtor by ID
     """
-    queryset = Realtor.objects.all()
+    queryset = Realtor.objects.select_related('user')
     serializer_class = RealtorSerializer
     lookup_field = 'id'
 
@@ -57,7 +59,7 @@ def mvp_realtors(request):
     Get MVP realtors
     """
     try:
-        mvp_realtors = Realtor.objects.filter(is_mvp=True).order_by('-hire_date')
+        mvp_realtors = Realtor.objects.filter(is_mvp=True).select_related('user').order_by('-hire_date')
         serializer = RealtorListSerializer(mvp_realtors, many=True)
         return Response(serializer.data)
     except Exception as e:
@@ -1,13 +1,17 @@
 import { useState, useEffect } from 'react';
 
 interface PropertyImage {
-  id?: string;
+  id?: string | number;
   file_name?: string;
   blob_url?: string;
   url?: string;
   type?: string;
   is_main?: boolean;
   uploaded_at?: string;
+  position?: number;
+  width?: number | null;
+  height?: number | null;
+  source?: 'slot' | 'upload';
 }
 
 interface PaginationInfo {
@@ -21,11 +25,13 @@ interface PaginationInfo {
   has_previous: boolean;
   next_page: number | null;
   previous_page: number | null;
+  next_cursor: string | null;
+  previous_cursor: string | null;
 }
 
 interface PropertyImagesData {
-  uploaded_images: PropertyImage[];
-  traditional_photos: PropertyImage[];
+  photos: PropertyImage[];
+  main_photo: PropertyImage | null;
   pagination: PaginationInfo;
   property_id: string;
 }
@@ -77,18 +83,12 @@ export function usePropertyImages(
 
       const data: PropertyImagesData = await response.json();
       
-      // Combine uploaded images and traditional photos
-      const allImages: PropertyImage[] = [
-        ...data.uploaded_images.map(img => ({
-          ...img,
-          url: img.blob_url,
-          type: 'uploaded'
-        })),
-        ...data.traditional_photos.map(img => ({
-          ...img,
-          type: 'traditional'
-        }))
-      ];
+      // Photo fields and uploaded images arrive as one ordered list
+      const allImages: PropertyImage[] = data.photos.map(img => ({
+        ...img,
+        blob_url: img.url,
+        type: img.source === 'upload' ? 'uploaded' : 'traditional'
+      }));
 
       setImages(allImages);
       setPagination(data.pagination);